@@ -1,13 +1,23 @@
-from typing import Any, List, Optional
-from uuid import UUID
+import asyncio
+from typing import Any, AsyncIterator, List, Optional
+from uuid import UUID, uuid4
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 from app.core.database import supabase
 from app.core.dependencies import check_role
-from app.services.classification_service import classification_service
+from app.services.classification_service import classification_service, MAX_BATCH_SIZE, PROMPT_VERSION
+from app.services.classification_telemetry import classification_telemetry
+from app.services.local_classifier import local_classifier
+from app.services.reclassification_service import reclassification_service, run_channel, FINISHED_STATUSES
+from app.services.progress_broker import progress_broker, format_sse
+from app.services.reclassification_queue import reclassification_queue
+from app.core.config import settings
 from app.models.classification import ClassificationStatus
 
 router = APIRouter()
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 @router.post("/manual/{listing_id}")
 async def classify_listing_manual(
     listing_id: UUID,
@@ -31,28 +41,12 @@ async def classify_listing_manual(
     
     try:
         # Classify listing
-        status_val, confidence, reason = await classification_service.classify_listing(
-            description,
-            price_text
-        )
-        
-        # Check if classification already exists
-        existing = supabase.table("classifications").select("*").eq("listing_id", str(listing_id)).execute()
+        # Manual re-classification always asks the AI model (no local first pass)
+        outcome = await classification_service.classify(description, price_text, listing_id=str(listing_id), use_local=False)
+        status_val, confidence, reason = outcome.status, outcome.confidence_score, outcome.reason
         
-        classification_data = {
-            "listing_id": str(listing_id),
-            "status": status_val,
-            "confidence_score": confidence,
-            "classification_reason": reason,
-            "ai_model_used": "gpt-4o"
-        }
-        
-        if existing.data and isinstance(existing.data, list) and len(existing.data) > 0:
-            # Update existing classification
-            supabase.table("classifications").update(classification_data).eq("listing_id", str(listing_id)).execute()
-        else:
-            # Create new classification
-            supabase.table("classifications").insert(classification_data).execute()
+        # Insert or replace the listing's classification
+        classification_service.save_outcomes({str(listing_id): outcome}, [listing])
         
         return {
             "message": "Listing classified successfully",
@@ -74,51 +68,19 @@ async def classify_listings_batch(
     listing_ids: Optional[List[UUID]] = None,
     limit: int = Query(10, ge=1, le=50, description="Maximum number of listings to classify"),
     only_unclassified: bool = Query(True, description="Only classify listings without existing classifications"),
+    batch_size: int = Query(1, ge=1, le=MAX_BATCH_SIZE, description="Listings packed into each model call (1 = one call per listing)"),
     current_user: dict = Depends(check_role(["admin"]))
 ) -> Any:
     """
     Batch classify multiple listings. (Admin only)
     Processes listings with rate limiting and retry logic.
+    With batch_size > 1 several listings share one prompt; the response includes a
+    performance report (throughput, tokens and cost per listing) to compare modes.
     """
     try:
-        # Get listings to classify
-        query = supabase.table("listings").select("id, description, price_raw, is_active").eq("is_active", True)
-        
-        if listing_ids:
-            # Classify specific listings
-            ids_str = [str(id) for id in listing_ids]
-            query = query.in_("id", ids_str)
-        
-        if only_unclassified:
-            # Get listings without classifications
-            all_listings = query.execute()
-            if not all_listings.data:
-                return {
-                    "message": "No listings found",
-                    "processed": 0,
-                    "successful": 0,
-                    "failed": 0,
-                    "results": []
-                }
-            
-            # Filter out listings that already have classifications
-            listings_to_classify = []
-            for listing in all_listings.data:
-                if not isinstance(listing, dict):
-                    continue
-                listing_id = listing.get("id")
-                if not listing_id:
-                    continue
-                
-                existing = supabase.table("classifications").select("id").eq("listing_id", str(listing_id)).execute()
-                if not existing.data or len(existing.data) == 0:
-                    listings_to_classify.append(listing)
-                    if len(listings_to_classify) >= limit:
-                        break
-        else:
-            # Get all active listings (up to limit)
-            response = query.limit(limit).execute()
-            listings_to_classify = response.data if response.data else []
+        # Next unclassified (or any active) listings in a single query
+        ids_str = [str(id) for id in listing_ids] if listing_ids else None
+        listings_to_classify = classification_service.fetch_listings_to_classify(limit, only_unclassified, ids_str)
         
         if not listings_to_classify:
             return {
@@ -129,69 +91,12 @@ async def classify_listings_batch(
                 "results": []
             }
         
-        # Process classifications with rate limiting
-        results = []
-        successful = 0
-        failed = 0
-        
-        for listing in listings_to_classify:
-            if not isinstance(listing, dict):
-                continue
-            
-            listing_id = listing.get("id")
-            description = str(listing.get("description", ""))
-            price_text = str(listing.get("price_raw", ""))
-            
-            if not listing_id:
-                continue
-            
-            try:
-                # Classify with retry logic (handled in service)
-                status_val, confidence, reason = await classification_service.classify_listing(
-                    description,
-                    price_text
-                )
-                
-                # Save classification
-                classification_data = {
-                    "listing_id": str(listing_id),
-                    "status": status_val,
-                    "confidence_score": confidence,
-                    "classification_reason": reason,
-                    "ai_model_used": "gpt-4o"
-                }
-                
-                # Check if exists and update or insert
-                existing = supabase.table("classifications").select("id").eq("listing_id", str(listing_id)).execute()
-                if existing.data and len(existing.data) > 0:
-                    supabase.table("classifications").update(classification_data).eq("listing_id", str(listing_id)).execute()
-                else:
-                    supabase.table("classifications").insert(classification_data).execute()
-                
-                results.append({
-                    "listing_id": str(listing_id),
-                    "status": "success",
-                    "classification": {
-                        "status": status_val,
-                        "confidence_score": confidence
-                    }
-                })
-                successful += 1
-                
-            except Exception as e:
-                results.append({
-                    "listing_id": str(listing_id),
-                    "status": "failed",
-                    "error": str(e)
-                })
-                failed += 1
+        # Classify (single or multi-listing prompts) and save all results in one upsert
+        batch = await classification_service.classify_and_store(listings_to_classify, batch_size)
         
         return {
             "message": f"Batch classification completed",
-            "processed": len(listings_to_classify),
-            "successful": successful,
-            "failed": failed,
-            "results": results
+            **batch
         }
         
     except Exception as e:
@@ -200,62 +105,298 @@ async def classify_listings_batch(
             detail=f"Batch classification failed: {str(e)}"
         )
 
+@router.post("/batch/stream")
+async def classify_listings_batch_stream(
+    listing_ids: Optional[List[UUID]] = None,
+    limit: int = Query(200, ge=1, le=1000, description="Maximum number of listings to classify"),
+    only_unclassified: bool = Query(True, description="Only classify listings without existing classifications"),
+    batch_size: int = Query(1, ge=1, le=MAX_BATCH_SIZE, description="Listings packed into each model call"),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Batch classify with live progress as Server-Sent Events. (Admin only)
+    Streams "start", one "result" per listing, "progress" (running counts, throughput, ETA)
+    after each saved chunk and a final "end". Results are saved as the job goes, and the
+    job finishes even if the client disconnects.
+    """
+    try:
+        ids_str = [str(id) for id in listing_ids] if listing_ids else None
+        listings_to_classify = classification_service.fetch_listings_to_classify(limit, only_unclassified, ids_str)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Batch classification failed: {str(e)}"
+        )
+
+    channel = f"batch:{uuid4()}"
+    queue = progress_broker.subscribe(channel)
+    progress_broker.run(
+        channel,
+        classification_service.stream_classify_and_store(
+            listings_to_classify, batch_size, channel, settings.RECLASSIFICATION_CHUNK_SIZE
+        )
+    )
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for message in progress_broker.listen(channel, queue):
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(message["event"], message["data"])
+        finally:
+            progress_broker.unsubscribe(channel, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.get("/stats")
 async def get_classification_stats(
     current_user: dict = Depends(check_role(["admin"]))
 ) -> Any:
     """
     Get classification statistics. (Admin only)
+    Counts, average confidence and the confidence distribution come from a rollup
+    maintained in the database, so the cost does not grow with the number of classifications.
+    """
+    try:
+        return classification_service.get_stats()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get classification stats: {str(e)}"
+        )
+
+@router.get("/telemetry")
+async def get_classification_telemetry(
+    days: int = Query(7, ge=1, le=90, description="Number of days to aggregate"),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Classification call telemetry for the last N days. (Admin only)
+    Returns call counts, p50/p95 latency, retries, token usage, prompt cache hit rate,
+    estimated cost per model and per day.
+    """
+    try:
+        # Include calls still waiting in the write buffer
+        await classification_telemetry.flush()
+        return classification_telemetry.get_stats(days)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get classification telemetry: {str(e)}"
+        )
+
+@router.get("/circuit")
+async def get_classification_circuit(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Get the AI classification circuit breaker state. (Admin only)
+    While the circuit is open, classifications are answered by the rule-based fallback.
+    """
+    return classification_service.circuit_breaker.snapshot()
+
+@router.post("/circuit/reset")
+async def reset_classification_circuit(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Force the AI classification circuit closed, e.g. after an OpenAI incident is resolved. (Admin only)
+    """
+    classification_service.circuit_breaker.reset()
+    return {
+        "message": "Classification circuit reset",
+        "circuit": classification_service.circuit_breaker.snapshot()
+    }
+
+@router.get("/local-model")
+async def get_local_model(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Local classifier status and its held-out accuracy report against AI labels. (Admin only)
+    """
+    loaded = local_classifier.load()
+    return {
+        "loaded": loaded,
+        "model": local_classifier.model_name if loaded else None,
+        "path": local_classifier.path,
+        "terms": len(local_classifier.terms),
+        "min_probability": settings.LOCAL_CLASSIFIER_MIN_PROBABILITY,
+        "report": local_classifier.report
+    }
+
+
+@router.post("/local-model/reload")
+async def reload_local_model(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Pick up a newly trained local classifier file without restarting. (Admin only)
+    """
+    if not local_classifier.load():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No local classifier model at {local_classifier.path}"
+        )
+    return {"model": local_classifier.model_name, "terms": len(local_classifier.terms)}
+
+@router.get("/versions")
+async def get_classification_versions(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Classification counts per prompt version and model, with the current ones flagged. (Admin only)
     """
     try:
-        # Get total listings
-        listings_response = supabase.table("listings").select("id", count="exact").eq("is_active", True).execute()
-        total_listings = listings_response.count if listings_response.count else 0
-        
-        # Get classified listings
-        classifications_response = supabase.table("classifications").select("status", count="exact").execute()
-        total_classified = classifications_response.count if classifications_response.count else 0
-        
-        # Get breakdown by status
-        explicit_response = supabase.table("classifications").select("id", count="exact").eq("status", "explicit").execute()
-        likely_response = supabase.table("classifications").select("id", count="exact").eq("status", "likely").execute()
-        competitive_response = supabase.table("classifications").select("id", count="exact").eq("status", "competitive").execute()
-        
-        explicit_count = explicit_response.count if explicit_response.count else 0
-        likely_count = likely_response.count if likely_response.count else 0
-        competitive_count = competitive_response.count if competitive_response.count else 0
-        
-        # Get average confidence scores
-        all_classifications = supabase.table("classifications").select("confidence_score").execute()
-        confidence_scores = []
-        if all_classifications.data:
-            for cls in all_classifications.data:
-                if isinstance(cls, dict):
-                    score = cls.get("confidence_score")
-                    if score is not None:
-                        confidence_scores.append(float(score))
-        
-        avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
-        
         return {
-            "total_listings": total_listings,
-            "total_classified": total_classified,
-            "unclassified": total_listings - total_classified,
-            "classification_rate": round((total_classified / total_listings * 100) if total_listings > 0 else 0, 2),
-            "breakdown": {
-                "explicit": explicit_count,
-                "likely": likely_count,
-                "competitive": competitive_count
-            },
-            "average_confidence_score": round(avg_confidence, 2),
-            "confidence_distribution": {
-                "high_confidence": len([s for s in confidence_scores if s >= 70]),
-                "medium_confidence": len([s for s in confidence_scores if 50 <= s < 70]),
-                "low_confidence": len([s for s in confidence_scores if s < 50])
-            }
+            "current_prompt_version": PROMPT_VERSION,
+            "current_model": classification_service.model,
+            "versions": classification_service.get_version_counts()
         }
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to get classification stats: {str(e)}"
+            detail=f"Failed to get classification versions: {str(e)}"
+        )
+
+@router.post("/versions/compare")
+async def compare_classification_versions(
+    sample_size: int = Query(25, ge=1, le=200, description="Stale classifications to re-run"),
+    from_prompt_version: Optional[str] = Query(None, description="Only sample rows from this prompt version"),
+    apply: bool = Query(False, description="Save the new results over the old ones"),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Re-classify a random sample of rows produced by an older prompt version or model and
+    return old vs new side by side (agreement rate, status transitions, cost). (Admin only)
+    Use it to check a prompt/model upgrade before starting a stale_prompt run.
+    """
+    try:
+        return await classification_service.compare_versions(sample_size, from_prompt_version, apply)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Version comparison failed: {str(e)}"
+        )
+
+@router.get("/update-queue")
+async def get_reclassification_queue(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Counters for reclassification triggered by listing edits (enqueued, coalesced,
+    skipped because the classified text is unchanged, reclassified). (Admin only)
+    """
+    return reclassification_queue.snapshot()
+
+@router.post("/runs")
+async def create_reclassification_run(
+    filter: str = Query("unclassified", pattern="^(all|unclassified|low_confidence|stale_prompt)$", description="Which listings to classify"),
+    min_confidence: int = Query(70, ge=1, le=100, description="low_confidence: reclassify listings scored below this"),
+    batch_size: int = Query(1, ge=1, le=MAX_BATCH_SIZE, description="Listings packed into each model call"),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Start a background (re)classification run over every matching active listing. (Admin only)
+    Progress is checkpointed after each chunk; the run can be paused, resumed and cancelled,
+    and continues after a restart. stale_prompt selects listings classified with an older prompt
+    version or another model (OPENAI_CLASSIFICATION_MODEL).
+    """
+    try:
+        return reclassification_service.create_run(filter, batch_size, min_confidence, current_user.get("id"))
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to start reclassification run: {str(e)}"
+        )
+
+@router.get("/runs")
+async def list_reclassification_runs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Recent reclassification runs with progress. (Admin only)
+    """
+    return reclassification_service.list_runs(limit)
+
+@router.get("/runs/{run_id}")
+async def get_reclassification_run(
+    run_id: UUID,
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Progress of a reclassification run: processed/total, throughput and ETA. (Admin only)
+    """
+    run = reclassification_service.get_progress(str(run_id))
+    if not run:
+        raise HTTPException(status_code=404, detail="Reclassification run not found")
+    return run
+
+@router.get("/runs/{run_id}/events")
+async def stream_reclassification_run(
+    run_id: UUID,
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Live progress of a reclassification run as Server-Sent Events. (Admin only)
+    Streams a "result" per listing and "progress" per chunk while this worker processes
+    the run; a run on another worker is followed by polling its checkpoint. Ends with
+    an "end" event once the run is paused, cancelled, completed or failed.
+    """
+    run = reclassification_service.get_progress(str(run_id))
+    if not run:
+        raise HTTPException(status_code=404, detail="Reclassification run not found")
+
+    channel = run_channel(str(run_id))
+    queue = progress_broker.subscribe(channel)
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield format_sse("progress", run)
+            if run.get("status") in FINISHED_STATUSES:
+                yield format_sse("end", run)
+                return
+            async for message in progress_broker.listen(channel, queue):
+                if message is not None:
+                    yield format_sse(message["event"], message["data"])
+                    continue
+                # Quiet period: the run may be processed by another worker, so poll its row
+                latest = await asyncio.to_thread(reclassification_service.get_progress, str(run_id))
+                if not latest:
+                    yield format_sse("end", None)
+                    return
+                yield format_sse("progress", latest)
+                if latest.get("status") in FINISHED_STATUSES:
+                    yield format_sse("end", latest)
+                    return
+        finally:
+            progress_broker.unsubscribe(channel, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/runs/{run_id}/{action}")
+async def control_reclassification_run(
+    run_id: UUID,
+    action: str,
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Pause, resume or cancel a reclassification run. (Admin only)
+    Pause and cancel take effect after the chunk in progress.
+    """
+    actions = {
+        "pause": reclassification_service.pause,
+        "resume": reclassification_service.resume,
+        "cancel": reclassification_service.cancel,
+    }
+    if action not in actions:
+        raise HTTPException(status_code=404, detail=f"Unknown action '{action}'")
+    run = actions[action](str(run_id))
+    if not run:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Cannot {action} run {run_id}: not found or not in a state that allows it"
         )
+    return reclassification_service.get_progress(str(run_id))
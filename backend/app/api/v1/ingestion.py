@@ -1,9 +1,17 @@
+import asyncio
+import os
 from typing import Any, Optional, List
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from app.core.config import settings
 from app.core.dependencies import check_role
+from app.core.idempotency import REPLAYED_HEADER, idempotency_key_header, idempotency_store
 from app.services.ingestion_service import ingestion_service
-from app.services.classification_service import classification_service
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.feed_parsers import FEED_FORMATS, iter_feed_rows
+from app.services.freshness_service import freshness_service
+from app.services.reclassification_queue import reclassification_queue
+from app.services.classification_service import classification_service, MAX_BATCH_SIZE
 from app.core.database import supabase
 from app.models.ingestion import ManualListingInput, PostcodeStatsInput
 
@@ -12,6 +20,8 @@ router = APIRouter()
 @router.post("/manual")
 async def ingest_manual_listing(
     listing_data: ManualListingInput,
+    response: Response,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
     current_user: dict = Depends(check_role(["admin", "agent"]))
 ) -> Any:
     """
@@ -34,10 +44,22 @@ async def ingest_manual_listing(
     **Optional fields:**
     - postcode, city, region, description, agent_name, agent_url
     - price_numeric: Will be auto-parsed from price_raw if not provided
+
+    **Retries:** send an `Idempotency-Key` header; repeats of a successful request
+    within the TTL return the first response (header `Idempotent-Replayed: true`)
+    without ingesting or classifying again.
     """
     # Convert Pydantic model to dict
     listing_dict = listing_data.model_dump()
-    
+    result, replayed = await idempotency_store.run(
+        "ingestion.manual", current_user.get("id"), idempotency_key, listing_dict,
+        lambda: _ingest_manual_listing(dict(listing_dict))
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+async def _ingest_manual_listing(listing_dict: dict) -> Any:
     # 1. Basic Ingestion with validation
     result = await ingestion_service.add_manual_listing(listing_dict)
     
@@ -57,27 +79,21 @@ async def ingest_manual_listing(
     if not listing_id:
         raise HTTPException(status_code=500, detail="Failed to create listing")
     
-    # 2. Trigger AI Classification
+    # 2. Classify (or copy the classification of the same advert on another portal) and save
     try:
-        status_val, confidence, reason = await classification_service.classify_listing(
-            str(result.get("description", "")),
-            str(result.get("price_raw", ""))
-        )
-        
-        # 3. Save Classification
-        supabase.table("classifications").insert({
-            "listing_id": str(listing_id),
-            "status": status_val,
-            "confidence_score": confidence,
-            "classification_reason": reason,
-            "ai_model_used": "gpt-4o"
-        }).execute()
-        
-        classification_result = {
-            "status": status_val,
-            "confidence": confidence,
-            "reason": reason
-        }
+        outcome = await reclassification_queue.classify_new(result)
+        if outcome.error:
+            # Not saved; the listing is queued to be classified again
+            classification_result = {
+                "status": "failed",
+                "error": outcome.reason
+            }
+        else:
+            classification_result = {
+                "status": outcome.status,
+                "confidence": outcome.confidence_score,
+                "reason": outcome.reason
+            }
     except Exception as e:
         # Classification failed, but listing was created
         classification_result = {
@@ -91,44 +107,148 @@ async def ingest_manual_listing(
         "classification": classification_result
     }
 
+BULK_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+@router.post("/bulk")
+async def ingest_bulk_listings(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", description="csv or jsonl (default: from the file extension)"),
+    classify: bool = Query(True, description="Classify new and materially changed listings"),
+    alerts: bool = Query(True, description="Send saved-search alerts for new listings"),
+    update_existing: bool = Query(True, description="Update listings already stored for the same URL (otherwise report them as duplicates)"),
+    current_user: dict = Depends(check_role(["admin", "agent"]))
+) -> Any:
+    """
+    Ingest many listings from one CSV (with header row) or JSONL file.
+
+    Columns/keys are the same as for `/ingestion/manual`. The file is parsed as a
+    stream into the staged ingestion pipeline (validate, dedupe, write, alert) whose
+    bounded queues keep memory flat: rows are matched to stored listings one batch per
+    query, inserted one batch per statement, and re-ingested listings only have their
+    changed fields written. New and materially changed listings are queued for
+    classification, which runs after the response is sent (`classification_queued`).
+
+    Returns totals, a per-row report (`created`, `updated`, `unchanged`, `duplicate`,
+    `invalid`, `failed`) and per-stage pipeline metrics.
+    """
+    fmt = (file_format or BULK_FORMATS.get(os.path.splitext(file.filename or "")[1].lower(), "")).lower()
+    if fmt not in ("csv", "jsonl"):
+        raise HTTPException(status_code=400, detail="Unsupported file format. Upload a .csv or .jsonl file or pass format=csv|jsonl")
+
+    pipeline = IngestionPipeline(
+        created_by=current_user.get("id"),
+        update_existing=update_existing,
+        classify=classify,
+        alerts=alerts
+    )
+    try:
+        report = await pipeline.run(
+            ingestion_service.iter_upload_rows(file.file, fmt), max_rows=settings.INGESTION_BULK_MAX_ROWS
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Bulk ingestion failed: {str(e)}")
+
+    return {
+        "message": f"Processed {report['total_rows']} rows: {report['created']} created, {report['updated']} updated",
+        **report
+    }
+
+@router.post("/feed")
+async def ingest_listing_feed(
+    file: UploadFile = File(...),
+    file_format: Optional[str] = Query(None, alias="format", description="blm or xml (default: from the file extension)"),
+    source: str = Query("agent", description="Source recorded for the feed's listings"),
+    agent_name: Optional[str] = Query(None, description="Agent name for listings whose feed record has none"),
+    listing_url_template: Optional[str] = Query(
+        None, description="Listing URL for properties without one, with {ref} for the agent's property reference"
+    ),
+    encoding: str = Query("utf-8", description="Text encoding of BLM files (e.g. cp1252)"),
+    classify: bool = Query(True, description="Classify new and materially changed listings"),
+    alerts: bool = Query(True, description="Send saved-search alerts for new listings"),
+    update_existing: bool = Query(True, description="Update listings already stored for the same URL (otherwise report them as duplicates)"),
+    current_user: dict = Depends(check_role(["admin", "agent"]))
+) -> Any:
+    """
+    Import an agent or portal data feed: a Rightmove BLM file or an XML feed.
+
+    The file is stream-parsed (buffered BLM records, XML iterparse) into rows shaped
+    like `/ingestion/manual` input and fed to the same staged pipeline as
+    `/ingestion/bulk`, so large feeds import with bounded memory. Lettings and
+    properties without a listing URL (see `listing_url_template`) are reported as
+    `invalid`.
+    """
+    fmt = (file_format or os.path.splitext(file.filename or "")[1].lstrip(".")).lower()
+    if fmt not in FEED_FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported feed format. Upload a .blm or .xml file or pass format=blm|xml")
+    if listing_url_template and "{ref}" not in listing_url_template:
+        raise HTTPException(status_code=400, detail="listing_url_template must contain {ref}")
+    try:
+        "".encode(encoding)
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Unknown encoding: {encoding}")
+
+    rows = iter_feed_rows(
+        file.file, fmt, source=source.lower(), agent_name=agent_name,
+        listing_url_template=listing_url_template, encoding=encoding
+    )
+    pipeline = IngestionPipeline(
+        created_by=current_user.get("id"),
+        update_existing=update_existing,
+        classify=classify,
+        alerts=alerts
+    )
+    try:
+        report = await pipeline.run(rows, max_rows=settings.INGESTION_FEED_MAX_ROWS)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Feed ingestion failed: {str(e)}")
+
+    return {
+        "message": f"Processed {report['total_rows']} properties: {report['created']} created, {report['updated']} updated",
+        **report
+    }
+
 @router.get("/stats")
 async def get_ingestion_stats(
     current_user: dict = Depends(check_role(["admin"]))
 ) -> Any:
     """
     Get comprehensive stats about ingested listings.
+    Counts by source, active flag and classification state come from a rollup
+    maintained in the database, read in one round trip whatever the table size.
+    """
+    try:
+        return await asyncio.to_thread(ingestion_service.get_stats)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get ingestion stats: {str(e)}")
+
+@router.get("/freshness")
+async def get_freshness_status(
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Result of the last freshness check on this worker (None before the first one).
     """
-    # Total listings
-    listings_count = supabase.table("listings").select("id", count="exact").execute()  # type: ignore
-    total_listings = listings_count.count if listings_count.count is not None else 0
-    
-    # Active listings
-    active_listings = supabase.table("listings").select("id", count="exact").eq("is_active", True).execute()  # type: ignore
-    active_count = active_listings.count if active_listings.count is not None else 0
-    
-    # Classified listings
-    class_count = supabase.table("classifications").select("id", count="exact").execute()  # type: ignore
-    total_classified = class_count.count if class_count.count is not None else 0
-    
-    # Listings by source
-    sources_response = supabase.table("listings").select("source").execute()
-    source_counts = {}
-    if sources_response.data:
-        for listing in sources_response.data:
-            if isinstance(listing, dict):
-                source = listing.get("source", "unknown")
-                source_counts[source] = source_counts.get(source, 0) + 1
-    
     return {
-        "total_listings": total_listings,
-        "active_listings": active_count,
-        "inactive_listings": total_listings - active_count,
-        "total_classified": total_classified,
-        "unclassified": total_listings - total_classified,
-        "classification_rate": round((total_classified / total_listings * 100) if total_listings > 0 else 0, 2),
-        "listings_by_source": source_counts
+        "enabled": settings.FRESHNESS_CHECK_ENABLED,
+        "interval_seconds": settings.FRESHNESS_CHECK_INTERVAL_SECONDS,
+        "max_age_hours": settings.FRESHNESS_MAX_AGE_HOURS,
+        "last_run": freshness_service.last_run
     }
 
+@router.post("/freshness/run")
+async def run_freshness_check(
+    max_batches: int = Query(1, ge=1, le=100, description="Batches of FRESHNESS_BATCH_SIZE listings to check"),
+    current_user: dict = Depends(check_role(["admin"]))
+) -> Any:
+    """
+    Revalidate the least recently checked active listings now and deactivate the ones
+    that are gone. The same check runs on a schedule; this is for a manual catch-up.
+    """
+    try:
+        return await freshness_service.run(max_batches=max_batches)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Freshness check failed: {str(e)}")
+
 @router.post("/postcode-stats")
 async def add_postcode_stats(
     stats_data: PostcodeStatsInput,
@@ -214,6 +334,7 @@ async def list_postcode_stats(
 async def batch_classify_listings(
     only_unclassified: bool = True,
     limit: int = 50,
+    batch_size: int = Query(1, ge=1, le=MAX_BATCH_SIZE),
     current_user: dict = Depends(check_role(["admin"]))
 ) -> Any:
     """
@@ -229,45 +350,15 @@ async def batch_classify_listings(
     **Parameters:**
     - only_unclassified: Only classify listings without existing classifications (default: True)
     - limit: Maximum number of listings to classify (default: 50, max: 50)
+    - batch_size: Listings packed into each model call (default: 1 = one call per listing)
     
     **Note**: This endpoint uses the same logic as `/classifications/batch` but is
     specifically designed for the initial data population workflow.
     """
     # Use the same implementation pattern as /classifications/batch
     try:
-        # Get listings to classify
-        query = supabase.table("listings").select("id, description, price_raw, is_active").eq("is_active", True)
-        
-        if only_unclassified:
-            # Get listings without classifications
-            all_listings = query.execute()
-            if not all_listings.data:
-                return {
-                    "message": "No listings found",
-                    "processed": 0,
-                    "successful": 0,
-                    "failed": 0,
-                    "results": []
-                }
-            
-            # Filter out listings that already have classifications
-            listings_to_classify = []
-            for listing in all_listings.data:
-                if not isinstance(listing, dict):
-                    continue
-                listing_id = listing.get("id")
-                if not listing_id:
-                    continue
-                
-                existing = supabase.table("classifications").select("id").eq("listing_id", str(listing_id)).execute()
-                if not existing.data or len(existing.data) == 0:
-                    listings_to_classify.append(listing)
-                    if len(listings_to_classify) >= min(limit, 50):
-                        break
-        else:
-            # Get all active listings (up to limit)
-            response = query.limit(min(limit, 50)).execute()
-            listings_to_classify = response.data if response.data else []
+        # Next unclassified (or any active) listings in a single query
+        listings_to_classify = classification_service.fetch_listings_to_classify(min(limit, 50), only_unclassified)
         
         if not listings_to_classify:
             return {
@@ -278,69 +369,12 @@ async def batch_classify_listings(
                 "results": []
             }
         
-        # Process classifications
-        results = []
-        successful = 0
-        failed = 0
-        
-        for listing in listings_to_classify:
-            if not isinstance(listing, dict):
-                continue
-            
-            listing_id = listing.get("id")
-            description = str(listing.get("description", ""))
-            price_text = str(listing.get("price_raw", ""))
-            
-            if not listing_id:
-                continue
-            
-            try:
-                # Classify with retry logic (handled in service)
-                status_val, confidence, reason = await classification_service.classify_listing(
-                    description,
-                    price_text
-                )
-                
-                # Save classification
-                classification_data = {
-                    "listing_id": str(listing_id),
-                    "status": status_val,
-                    "confidence_score": confidence,
-                    "classification_reason": reason,
-                    "ai_model_used": "gpt-4o"
-                }
-                
-                # Check if exists and update or insert
-                existing = supabase.table("classifications").select("id").eq("listing_id", str(listing_id)).execute()
-                if existing.data and len(existing.data) > 0:
-                    supabase.table("classifications").update(classification_data).eq("listing_id", str(listing_id)).execute()
-                else:
-                    supabase.table("classifications").insert(classification_data).execute()
-                
-                results.append({
-                    "listing_id": str(listing_id),
-                    "status": "success",
-                    "classification": {
-                        "status": status_val,
-                        "confidence_score": confidence
-                    }
-                })
-                successful += 1
-                
-            except Exception as e:
-                results.append({
-                    "listing_id": str(listing_id),
-                    "status": "failed",
-                    "error": str(e)
-                })
-                failed += 1
+        # Classify (single or multi-listing prompts) and save all results in one upsert
+        batch = await classification_service.classify_and_store(listings_to_classify, batch_size)
         
         return {
             "message": f"Batch classification completed for initial data population",
-            "processed": len(listings_to_classify),
-            "successful": successful,
-            "failed": failed,
-            "results": results
+            **batch
         }
         
     except Exception as e:
@@ -1,22 +1,28 @@
+import asyncio
 import uuid
 from datetime import datetime, timezone, timedelta
 from types import SimpleNamespace
 from typing import Any, List, Optional
 from uuid import UUID
-from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
 from pydantic import ValidationError
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.core.database import supabase
 from app.core.dependencies import get_current_user, check_role, get_optional_user, get_current_user_with_role
+from app.core.idempotency import REPLAYED_HEADER, idempotency_key_header, idempotency_store
 from app.core.logging_config import get_logger
 from app.models.listing import Listing, ListingCreate, ListingUpdate
 from app.models.classification import Classification, ClassificationStatus
 from app.models.filters import ListingFilters
-from app.services.classification_service import classification_service
+from app.services.classification_service import classification_input_hash
+from app.services.ingestion_service import ingestion_service
+from app.services.property_matcher import property_matcher
+from app.services.reclassification_queue import reclassification_queue
 from app.services.postcode_service import postcode_service
 from app.services.email_service import EmailService
 from app.services.alert_service import alert_service
+from app.services.image_pipeline import image_pipeline, variant_path, InvalidImageError, VARIANT_CONTENT_TYPE
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -221,6 +227,62 @@ ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/webp"}
 MAX_FILE_SIZE_BYTES = 5 * 1024 * 1024  # 5MB
 MAX_FILES = 10
 LISTING_PHOTOS_BUCKET = "listing-photos"
+UPLOAD_READ_CHUNK_BYTES = 256 * 1024
+# Storage uploads (originals and variants) in flight per request
+MAX_CONCURRENT_UPLOADS = 10
+
+# Set once the bucket is known to exist; checked at most once per process after that
+_photos_bucket_ready = False
+_photos_bucket_lock = asyncio.Lock()
+
+
+def _create_photos_bucket_if_missing() -> None:
+    buckets_resp = supabase.storage.list_buckets()
+    buckets = getattr(buckets_resp, "data", None) or buckets_resp or []
+    bucket_ids = [b.get("id") if isinstance(b, dict) else getattr(b, "id", None) for b in buckets]
+    if LISTING_PHOTOS_BUCKET not in bucket_ids:
+        supabase.storage.create_bucket(
+            LISTING_PHOTOS_BUCKET,
+            options={
+                "public": True,
+                "allowed_mime_types": ["image/jpeg", "image/png", "image/webp"],
+                "file_size_limit": MAX_FILE_SIZE_BYTES,
+            },
+        )
+        logger.info("Created storage bucket: %s", LISTING_PHOTOS_BUCKET)
+
+
+async def _ensure_photos_bucket() -> None:
+    """Create the photos bucket if missing; after one success the check is skipped for the process lifetime."""
+    global _photos_bucket_ready
+    if _photos_bucket_ready:
+        return
+    async with _photos_bucket_lock:
+        if _photos_bucket_ready:
+            return
+        try:
+            await asyncio.to_thread(_create_photos_bucket_if_missing)
+            _photos_bucket_ready = True
+        except Exception as bucket_err:
+            # Not cached: the next upload checks again
+            logger.warning("Bucket check/create skipped: %s", bucket_err)
+
+
+async def _read_capped(f: UploadFile) -> bytes:
+    """Read an upload in chunks, rejecting it as soon as it exceeds MAX_FILE_SIZE_BYTES."""
+    too_large = HTTPException(status_code=400, detail=f"File too large: {f.filename}. Max size is 5MB")
+    if f.size is not None and f.size > MAX_FILE_SIZE_BYTES:
+        raise too_large
+    chunks: List[bytes] = []
+    total = 0
+    while True:
+        chunk = await f.read(UPLOAD_READ_CHUNK_BYTES)
+        if not chunk:
+            return b"".join(chunks)
+        total += len(chunk)
+        if total > MAX_FILE_SIZE_BYTES:
+            raise too_large
+        chunks.append(chunk)
 
 
 @router.post("/upload-photos")
@@ -233,6 +295,10 @@ async def upload_listing_photos(
     """
     Upload listing photos. Returns public URLs. Admin or Agent only.
     Validation: JPEG/PNG/WebP, max 5MB per file, max 10 files.
+
+    Each original is stored with WebP variants next to it (`<id>_thumb.webp` for
+    search cards, `<id>_medium.webp` for the listing page), resized in a process pool
+    and stripped of metadata. `images` gives each photo's variant URLs and a `srcset`.
     """
     if len(files) > MAX_FILES:
         raise HTTPException(
@@ -240,25 +306,11 @@ async def upload_listing_photos(
             detail=f"Maximum {MAX_FILES} files allowed per upload",
         )
     urls: List[str] = []
+    images: List[dict] = []
     try:
-        # Ensure bucket exists (create if missing)
-        try:
-            buckets_resp = supabase.storage.list_buckets()
-            buckets = getattr(buckets_resp, "data", None) or buckets_resp or []
-            bucket_ids = [b.get("id") if isinstance(b, dict) else getattr(b, "id", None) for b in buckets]
-            if LISTING_PHOTOS_BUCKET not in bucket_ids:
-                supabase.storage.create_bucket(
-                    LISTING_PHOTOS_BUCKET,
-                    options={
-                        "public": True,
-                        "allowed_mime_types": ["image/jpeg", "image/png", "image/webp"],
-                        "file_size_limit": MAX_FILE_SIZE_BYTES,
-                    },
-                )
-                logger.info("Created storage bucket: %s", LISTING_PHOTOS_BUCKET)
-        except Exception as bucket_err:
-            logger.warning("Bucket check/create skipped: %s", bucket_err)
+        await _ensure_photos_bucket()
 
+        uploads = []
         for f in files:
             if not f.filename:
                 continue
@@ -268,22 +320,58 @@ async def upload_listing_photos(
                     status_code=400,
                     detail=f"Invalid file type: {f.filename}. Allowed: JPEG, PNG, WebP",
                 )
-            body = await f.read()
-            if len(body) > MAX_FILE_SIZE_BYTES:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File too large: {f.filename}. Max size is 5MB",
+            body = await _read_capped(f)
+            uploads.append((f.filename, content_type, body))
+
+        # Variants of all files are rendered in parallel in the image process pool
+        rendered = await asyncio.gather(
+            *(image_pipeline.render(body) for _, _, body in uploads), return_exceptions=True
+        )
+        for (filename, _, _), result in zip(uploads, rendered):
+            if isinstance(result, InvalidImageError):
+                raise HTTPException(status_code=400, detail=f"Invalid image: {filename}")
+            if isinstance(result, BaseException):
+                raise result
+
+        # Originals and variants are uploaded concurrently (blocking storage calls off the event loop)
+        bucket = supabase.storage.from_(LISTING_PHOTOS_BUCKET)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        async def upload(path: str, data: bytes, content_type: str) -> None:
+            async with semaphore:
+                await asyncio.to_thread(
+                    bucket.upload, path, data, file_options={"content-type": content_type, "upsert": "true"}
                 )
+
+        stored = []
+        pending = []
+        for (_, content_type, body), (variants, size) in zip(uploads, rendered):
             ext = "jpg" if "jpeg" in content_type else "png" if "png" in content_type else "webp"
             path = f"{uuid.uuid4()}.{ext}"
-            supabase.storage.from_(LISTING_PHOTOS_BUCKET).upload(
-                path,
-                body,
-                file_options={"content-type": content_type, "upsert": "true"},
+            stored.append((path, variants, size))
+            pending.append(upload(path, body, content_type))
+            pending.extend(
+                upload(variant_path(path, name), data, VARIANT_CONTENT_TYPE) for name, (data, _) in variants.items()
             )
-            public_url = supabase.storage.from_(LISTING_PHOTOS_BUCKET).get_public_url(path)
+        await asyncio.gather(*pending)
+
+        for path, variants, (width, height) in stored:
+            public_url = bucket.get_public_url(path)
+            variant_urls = {}
+            candidates = {}
+            for name, (_, variant_width) in variants.items():
+                variant_urls[name] = bucket.get_public_url(variant_path(path, name))
+                candidates[variant_urls[name]] = variant_width
+            candidates.setdefault(public_url, width)
             urls.append(public_url)
-        return {"urls": urls}
+            images.append({
+                "url": public_url,
+                "width": width,
+                "height": height,
+                "variants": variant_urls,
+                "srcset": image_pipeline.srcset(candidates),
+            })
+        return {"urls": urls, "images": images}
     except HTTPException:
         raise
     except Exception as e:
@@ -321,7 +409,9 @@ async def get_listing(
 @limiter.limit("10/minute")  # Rate limit: 10 listing creations per minute
 async def create_listing(
     request: Request,
+    response: Response,
     listing_in: ListingCreate,
+    idempotency_key: Optional[str] = Depends(idempotency_key_header),
     current_user: dict = Depends(check_role(["admin", "agent"]))
 ) -> Any:
     """
@@ -329,11 +419,22 @@ async def create_listing(
     Automatically triggers AI classification and sends confirmation email.
     Agents' listings are tracked via created_by_user_id so they can only edit/delete their own.
     Unverified agents (without active Verified Agent subscription) can only create 1 listing per week.
+    Retries with the same `Idempotency-Key` header return the first response (header
+    `Idempotent-Replayed: true`) without creating, classifying or emailing again.
     """
     user_id = current_user.get("id")
     if not user_id:
         raise HTTPException(status_code=401, detail="User ID not found")
-    
+
+    new_listing, replayed = await idempotency_store.run(
+        "listings.create", str(user_id), idempotency_key, listing_in.model_dump(),
+        lambda: _create_listing(listing_in, str(user_id))
+    )
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return new_listing
+
+async def _create_listing(listing_in: ListingCreate, user_id: str) -> Any:
     # Check if user is an agent (not admin)
     user_profile_response = supabase.table("user_profiles").select("role").eq("id", str(user_id)).single().execute()
     user_role = None
@@ -384,7 +485,9 @@ async def create_listing(
                 )
     
     listing_data = listing_in.model_dump()
+    listing_data["listing_url"] = ingestion_service.canonical_url(listing_data["listing_url"])
     listing_data["created_by_user_id"] = str(user_id)
+    property_matcher.assign_safely([listing_data])
     response = supabase.table("listings").insert(listing_data).execute()
     
     if not response.data:
@@ -394,20 +497,8 @@ async def create_listing(
     if not isinstance(new_listing, dict):
         raise HTTPException(status_code=500, detail="Unexpected response format from database")
     
-    # Trigger classification
-    status_val, confidence, reason = await classification_service.classify_listing(
-        str(new_listing.get("description", "")),
-        str(new_listing.get("price_raw", ""))
-    )
-    
-    # Save classification
-    supabase.table("classifications").insert({
-        "listing_id": str(new_listing.get("id")),
-        "status": status_val,
-        "confidence_score": confidence,
-        "classification_reason": reason,
-        "ai_model_used": "gpt-4o"
-    }).execute()
+    # Classify (or copy the classification of the same advert on another portal) and save
+    await reclassification_queue.classify_new(new_listing)
 
     # Send confirmation email
     if user_id:
@@ -450,7 +541,12 @@ async def update_listing(
     """
     Update an existing listing. Admin can update any; agent only their own (created_by_user_id).
     """
-    existing = supabase.table("listings").select("id, created_by_user_id").eq("id", str(listing_id)).execute()
+    existing = (
+        supabase.table("listings")
+        .select("id, created_by_user_id, price_raw, description, address, postcode, price_numeric")
+        .eq("id", str(listing_id))
+        .execute()
+    )
     if not existing.data or not isinstance(existing.data, list) or len(existing.data) == 0:
         raise HTTPException(status_code=404, detail="Listing not found")
     row = existing.data[0]
@@ -465,11 +561,26 @@ async def update_listing(
         update_data["price_raw"] = listing_in.price_raw if listing_in.price_raw is not None else ""
     if "price_numeric" in listing_in.model_fields_set:
         update_data["price_numeric"] = listing_in.price_numeric
+    if update_data.get("listing_url"):
+        update_data["listing_url"] = ingestion_service.canonical_url(update_data["listing_url"])
+    if "address" in update_data or "postcode" in update_data:
+        # Address changed: re-match against other portals' listings of the same property
+        merged = {**row, **update_data}
+        property_matcher.assign_safely([merged])
+        if "property_id" in merged:
+            update_data["block_key"] = merged["block_key"]
+            update_data["property_id"] = merged["property_id"]
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     response = supabase.table("listings").update(update_data).eq("id", str(listing_id)).execute()
     if not response.data or not isinstance(response.data, list):
         raise HTTPException(status_code=404, detail="Listing not found")
-    return response.data[0]
+    updated = response.data[0]
+    # Reclassify only when the text the classifier reads materially changed (not photo/agent edits)
+    if isinstance(updated, dict) and classification_input_hash(
+        updated.get("description"), updated.get("price_raw")
+    ) != classification_input_hash(row.get("description"), row.get("price_raw")):
+        reclassification_queue.enqueue(str(listing_id))
+    return updated
 
 
 @router.delete("/{listing_id}", status_code=status.HTTP_204_NO_CONTENT)
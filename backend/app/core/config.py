@@ -28,6 +28,68 @@ class Settings(BaseSettings):
     
     # OpenAI
     OPENAI_API_KEY: str
+    # Model used for classification; stamped on every classification as ai_model_used
+    OPENAI_CLASSIFICATION_MODEL: str = "gpt-4o"
+    # Alternative OpenAI-compatible endpoint, e.g. the benchmark mock server (empty = api.openai.com)
+    OPENAI_BASE_URL: str = ""
+    # Proactive pacing of classification calls (0 disables a budget).
+    # Shared by all workers on the host through a SQLite file.
+    OPENAI_RPM_LIMIT: int = 500
+    OPENAI_TPM_LIMIT: int = 30000
+    OPENAI_RATE_LIMIT_DB_PATH: str = ".cache/openai_rate_limit.db"
+    # USD per 1M tokens, used for cost estimates in classification reports
+    OPENAI_INPUT_COST_PER_1M_TOKENS: float = 2.50
+    OPENAI_CACHED_INPUT_COST_PER_1M_TOKENS: float = 1.25
+    OPENAI_OUTPUT_COST_PER_1M_TOKENS: float = 10.00
+    # Hard timeout per OpenAI attempt; optional hedge request after OPENAI_HEDGE_AFTER_SECONDS (0 disables)
+    OPENAI_REQUEST_TIMEOUT_SECONDS: float = 20.0
+    OPENAI_HEDGE_AFTER_SECONDS: float = 0.0
+    # Circuit breaker: open after N consecutive service failures, probe again after the recovery period
+    CLASSIFICATION_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CLASSIFICATION_CIRCUIT_RECOVERY_SECONDS: float = 30.0
+    # Local TF-IDF classifier (train with backend/train_local_classifier.py); predictions at or
+    # above the probability threshold skip the LLM, and it backs the fallback while the circuit is open
+    LOCAL_CLASSIFIER_ENABLED: bool = True
+    LOCAL_CLASSIFIER_PATH: str = "data/local_classifier.json"
+    LOCAL_CLASSIFIER_MIN_PROBABILITY: float = 0.9
+    # Descriptions longer than this (estimated tokens) are cut to their pricing-relevant sentences
+    CLASSIFICATION_DESCRIPTION_TOKEN_BUDGET: int = 300
+    # Background reclassification runs: listings fetched and checkpointed per chunk, and how long
+    # a worker's lease on a run lasts without a heartbeat before another worker may take it over
+    RECLASSIFICATION_CHUNK_SIZE: int = 50
+    RECLASSIFICATION_LEASE_SECONDS: int = 300
+    # Listing edits that change price/description are reclassified after this delay (edits coalesce)
+    RECLASSIFY_ON_UPDATE_DELAY_SECONDS: float = 5.0
+    # Listings loaded and classified per drain round (bulk imports enqueue thousands at once)
+    RECLASSIFY_DRAIN_BATCH_SIZE: int = 200
+    # Attempts per listing before a failing reclassification is dropped (retried one drain later)
+    RECLASSIFY_MAX_ATTEMPTS: int = 3
+    # Bulk CSV/JSONL ingestion: rows de-duplicated and inserted per chunk, and rows accepted per file
+    INGESTION_BULK_CHUNK_SIZE: int = 200
+    INGESTION_BULK_MAX_ROWS: int = 5000
+    # Agent BLM/XML feeds: properties accepted per feed file
+    INGESTION_FEED_MAX_ROWS: int = 20000
+    # Staged ingestion pipeline: queue bound between stages and workers per stage, so the DB
+    # stages and alerts run concurrently, each throttled only by its own limits
+    INGESTION_PIPELINE_QUEUE_SIZE: int = 500
+    INGESTION_WRITE_WORKERS: int = 2
+    INGESTION_ALERT_WORKERS: int = 2
+    # Freshness checks: active listings not checked for FRESHNESS_MAX_AGE_HOURS are revalidated
+    # against their source every interval, in batches with bounded concurrency
+    FRESHNESS_CHECK_ENABLED: bool = True
+    FRESHNESS_CHECK_INTERVAL_SECONDS: int = 900
+    FRESHNESS_MAX_AGE_HOURS: int = 24
+    FRESHNESS_BATCH_SIZE: int = 100
+    FRESHNESS_MAX_BATCHES_PER_RUN: int = 20
+    FRESHNESS_CONCURRENCY: int = 10
+    FRESHNESS_REQUEST_TIMEOUT_SECONDS: float = 15.0
+    # Processes rendering WebP variants of uploaded listing photos
+    IMAGE_PROCESS_WORKERS: int = 2
+    # Idempotency-Key responses kept per process for replaying client retries
+    IDEMPOTENCY_TTL_SECONDS: int = 86400
+    IDEMPOTENCY_MAX_KEYS: int = 10000
+    # Listings in the same block (postcode + street number) scoring at least this are one property
+    PROPERTY_MATCH_THRESHOLD: float = 0.75
     
     # Stripe (optional for now)
     STRIPE_SECRET_KEY: str = ""
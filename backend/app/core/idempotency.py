@@ -0,0 +1,126 @@
+"""
+Idempotency-Key support for endpoints that create listings.
+
+Clients retrying a request (flaky uploads, timeouts) send the same
+Idempotency-Key header. The first request runs and its response is kept for
+IDEMPOTENCY_TTL_SECONDS; repeats get the stored response without running the
+handler again (no second insert, classification or alert email). A repeat that
+arrives while the first is still running waits for its result. Keys are scoped
+per endpoint and user, and reusing a key with a different request body is
+rejected. Failed requests are not stored, so they can be retried.
+
+The store lives in process memory: with several workers, a retry that lands on
+another worker runs as a new request (and meets the endpoint's own duplicate
+checks where it has them).
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from fastapi import Header, HTTPException
+from app.core.config import settings
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(payload: Any) -> str:
+    """Stable hash of a request body, to tell a retry from a different request reusing the key."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+async def idempotency_key_header(
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER)
+) -> Optional[str]:
+    """Dependency: the request's Idempotency-Key, if any."""
+    if idempotency_key is None or not idempotency_key.strip():
+        return None
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+    return idempotency_key.strip()
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "future")
+
+    def __init__(self, fingerprint: str, expires_at: float, future: "asyncio.Future[Any]"):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.future = future
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        # Oldest first: entries are (re)appended when their response is stored
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+
+    def _evict(self, now: float) -> None:
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now and len(self._entries) < self.max_entries:
+                return
+            del self._entries[key]
+
+    async def run(
+        self,
+        scope: str,
+        user_id: Optional[str],
+        key: Optional[str],
+        payload: Any,
+        handler: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """
+        Run handler once per (scope, user, key) within the TTL. Returns (response, replayed).
+        Without a key the handler simply runs. Raises HTTPException 422 when the key was
+        used for a different payload.
+        """
+        if not key:
+            return await handler(), False
+
+        store_key = (scope, str(user_id or ""), key)
+        fingerprint = request_fingerprint(payload)
+        now = time.monotonic()
+        entry = self._entries.get(store_key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[store_key]
+            entry = None
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"{IDEMPOTENCY_HEADER} was already used with a different request body"
+                )
+            # Shielded: a waiter giving up must not cancel the first request's result for others
+            return await asyncio.shield(entry.future), True
+
+        self._evict(now)
+        entry = _Entry(fingerprint, now + self.ttl_seconds, asyncio.get_running_loop().create_future())
+        self._entries[store_key] = entry
+        try:
+            response = await handler()
+        except BaseException as e:
+            # Not stored: the client may retry a failed request with the same key
+            if self._entries.get(store_key) is entry:
+                del self._entries[store_key]
+            if isinstance(e, asyncio.CancelledError):
+                entry.future.cancel()
+            else:
+                entry.future.set_exception(e)
+                entry.future.exception()  # retrieved here; concurrent waiters re-raise it
+            raise
+        entry.future.set_result(response)
+        if self._entries.get(store_key) is entry:
+            entry.expires_at = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(store_key)
+        return response, False
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_KEYS
+)
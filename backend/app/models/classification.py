@@ -19,6 +19,15 @@ class ClassificationBase(BaseModel):
 class ClassificationCreate(ClassificationBase):
     pass
 
+class ClassificationOutcome(BaseModel):
+    """Result of classifying one listing, including which model produced it."""
+    status: ClassificationStatus
+    confidence_score: int = Field(0, ge=0, le=100)
+    reason: str = ""
+    model: str
+    # The call failed: reason holds the error, status/confidence are placeholders (never stored)
+    error: bool = False
+
 class Classification(ClassificationBase):
     id: UUID
     classified_at: datetime
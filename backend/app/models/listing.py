@@ -90,6 +90,8 @@ class ListingUpdate(BaseModel):
 
 class Listing(ListingBase):
     id: UUID
+    # Shared by listings of the same property on different portals
+    property_id: Optional[UUID] = None
     first_seen_at: datetime
     last_checked_at: datetime
     updated_at: datetime
@@ -0,0 +1,23 @@
+"""
+The price parser IngestionService used before app/services/price_parser.py.
+
+Not used for ingestion. backfill_price_numeric.py uses it to recognise prices it
+produced, and benchmarks/run_price_parser_benchmark.py compares against it.
+"""
+import re
+from typing import Optional
+
+
+def legacy_parse_price(price_text: str) -> Optional[float]:
+    if not price_text:
+        return None
+    cleaned = price_text.lower().replace(',', '').replace('£', '').strip()
+    match = re.search(r'(\d+(?:\.\d+)?)', cleaned)
+    if not match:
+        return None
+    value = float(match.group(1))
+    if 'k' in cleaned:
+        value *= 1000
+    elif 'm' in cleaned:
+        value *= 1000000
+    return value
@@ -1,6 +1,7 @@
 from typing import List, Dict, Any
 from app.core.database import supabase
 from app.services.email_service import EmailService
+from app.services.property_matcher import property_matcher
 
 class AlertService:
     @staticmethod
@@ -16,6 +17,10 @@ class AlertService:
         
         listing = listing_response.data
         
+        # Same property listed earlier on another portal: its users were alerted then
+        if property_matcher.has_other_listings(listing):
+            return
+        
         # Get all active saved searches with user info
         searches_response = supabase.table("user_saved_searches").select("*").eq("is_active", True).execute()
         
@@ -0,0 +1,120 @@
+"""
+Circuit breaker for calls to external services (currently OpenAI classification).
+
+After `failure_threshold` consecutive failures the circuit opens and callers fail
+fast instead of burning retries and sleeps against a degraded dependency. Once
+`recovery_timeout` seconds have passed a single probe call is let through
+(half-open); its outcome closes or re-opens the circuit.
+"""
+import time
+from typing import Any, Dict, Optional
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit is open."""
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._last_error: Optional[str] = None
+        self._total_failures = 0
+        self._total_rejections = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and self._opened_at is not None:
+            if time.monotonic() - self._opened_at >= self.recovery_timeout:
+                return self.HALF_OPEN
+        return self._state
+
+    def before_call(self) -> bool:
+        """
+        Check whether a call may proceed. Raises CircuitOpenError when it may not.
+        In half-open state only one probe call is allowed at a time. Returns True when
+        the call is that probe: the caller must then end it with record_success,
+        record_failure or release_probe, whatever the outcome.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return False
+        if state == self.HALF_OPEN and not self._probe_in_flight:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+        self._total_rejections += 1
+        elapsed = time.monotonic() - (self._opened_at or time.monotonic())
+        raise CircuitOpenError(self.name, max(0.0, self.recovery_timeout - elapsed))
+
+    def record_success(self) -> None:
+        if self._state != self.CLOSED:
+            logger.info(f"Circuit '{self.name}' closed after successful probe")
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        self._consecutive_failures += 1
+        self._total_failures += 1
+        self._last_error = str(error) if error else None
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self._times_opened += 1
+                logger.error(
+                    f"Circuit '{self.name}' opened after {self._consecutive_failures} consecutive failures: {error}"
+                )
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """
+        End a probe that neither succeeded nor failed as a service failure (a 4xx, a
+        cancelled call): the circuit stays half-open and the next call probes again.
+        No-op once record_success/record_failure has ended the probe.
+        """
+        self._probe_in_flight = False
+
+    def reset(self) -> None:
+        """Force the circuit closed (admin action)."""
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state
+        retry_after = None
+        if state == self.OPEN and self._opened_at is not None:
+            retry_after = round(max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at)), 1)
+        return {
+            "name": self.name,
+            "state": state,
+            "consecutive_failures": self._consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "recovery_timeout_seconds": self.recovery_timeout,
+            "retry_after_seconds": retry_after,
+            "last_error": self._last_error,
+            "total_failures": self._total_failures,
+            "total_rejections": self._total_rejections,
+            "times_opened": self._times_opened,
+        }
@@ -1,35 +1,35 @@
+import re
 import json
+import hashlib
+import unicodedata
+import time
 import asyncio
-from typing import Optional, Tuple
-from openai import OpenAI, RateLimitError, APIError
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from openai import AsyncOpenAI, RateLimitError, APIError, APIConnectionError, APIStatusError
 from app.core.config import settings
+from app.core.database import supabase
 from app.core.logging_config import get_logger
-from app.models.classification import ClassificationStatus
+from app.models.classification import ClassificationStatus, ClassificationOutcome
+from app.services.rate_limiter import llm_rate_limiter, estimate_tokens
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.fallback_classifier import classify_with_rules, FALLBACK_MODEL_NAME, MAX_FALLBACK_CONFIDENCE
+from app.services.local_classifier import local_classifier
+from app.services.classification_telemetry import classification_telemetry
+from app.services.progress_broker import progress_broker
 
 logger = get_logger(__name__)
 
-class ClassificationService:
-    def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        self.model = "gpt-4o" # Recommended model for 2026
-        self.max_retries = 3
-        self.retry_delay = 2  # seconds
-        self.rate_limit_delay = 5  # seconds for rate limit errors
+SYSTEM_MESSAGE = "You are a helpful assistant specialized in Scottish property market analysis."
 
-    async def classify_listing(self, description: str, price_text: str) -> Tuple[ClassificationStatus, int, str]:
-        """
-        Classifies a property listing as 'explicit' fixed price, 'likely' fixed price, or 'competitive'.
-        Uses a refined prompt with comprehensive classification patterns for accurate categorization.
-        Returns: (status, confidence_score, reason)
-        """
-        prompt = f"""
-You are an expert in the Scottish property market specializing in analyzing property listings to determine pricing strategies. Your task is to classify listings into three distinct categories based on pricing language and seller intent.
-
-LISTING TO ANALYZE:
-Price: {price_text}
-Description: {description}
+PROMPT_INTRO = (
+    "You are an expert in the Scottish property market specializing in analyzing property listings "
+    "to determine pricing strategies. Your task is to classify listings into three distinct categories "
+    "based on pricing language and seller intent."
+)
 
-CLASSIFICATION CATEGORIES:
+# Static instruction block shared by single and multi-listing prompts
+CLASSIFICATION_GUIDE = """CLASSIFICATION CATEGORIES:
 
 1. EXPLICIT FIXED PRICE ("explicit"):
    The listing CLEARLY and UNAMBIGUOUSLY states a fixed price with no competitive bidding language.
@@ -112,29 +112,368 @@ CONFIDENCE SCORING:
 - 50-69: Moderate indicators, some ambiguity
 - 30-49: Weak indicators, significant ambiguity
 - 0-29: Very unclear, minimal indicators
+"""
 
-Respond ONLY in valid JSON format with these exact fields:
-{{
+SINGLE_RESPONSE_FORMAT = """Respond ONLY in valid JSON format with these exact fields:
+{
   "status": "explicit" | "likely" | "competitive",
   "confidence_score": <integer 0-100>,
   "reason": "<concise explanation (max 2 sentences) of classification decision>"
-}}
+}
+
+JSON:"""
+
+BATCH_RESPONSE_FORMAT = """Classify EVERY listing above independently. Respond ONLY in valid JSON format with one
+entry per listing, using the listing id exactly as given (e.g. "L1"):
+{
+  "results": [
+    {
+      "id": "<listing id>",
+      "status": "explicit" | "likely" | "competitive",
+      "confidence_score": <integer 0-100>,
+      "reason": "<concise explanation (max 2 sentences) of classification decision>"
+    }
+  ]
+}
+
+JSON:"""
+
+# Fixed system prefix: identical bytes on every call so the provider can cache it.
+# Only the listing data and the answer format follow in the user message.
+CLASSIFICATION_SYSTEM_PROMPT = f"""{SYSTEM_MESSAGE}
+
+{PROMPT_INTRO}
+
+{CLASSIFICATION_GUIDE}"""
+
+# Short hash identifying the prompt wording; stamped on telemetry so results can be traced to a prompt
+PROMPT_VERSION = hashlib.sha256(
+    (CLASSIFICATION_SYSTEM_PROMPT + SINGLE_RESPONSE_FORMAT + BATCH_RESPONSE_FORMAT).encode("utf-8")
+).hexdigest()[:12]
+
+# Sentences carrying pricing intent; everything else is dropped when a description is over budget
+PRICING_SENTENCE_PATTERN = re.compile(
+    r"£|\d{2,3},\d{3}|\bprice[ds]?\b|\boffers?\b|closing date|\bfixed\b|asking|guide|valuation|"
+    r"quick sale|motivated|relocat|negotiable|flexib|no chain|\bbid",
+    re.IGNORECASE
+)
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+
+STATUS_MAP = {
+    "explicit": ClassificationStatus.EXPLICIT,
+    "likely": ClassificationStatus.LIKELY,
+    "competitive": ClassificationStatus.COMPETITIVE
+}
+
+# Upper bound on listings packed into one request; keeps the answer well inside output limits
+MAX_BATCH_SIZE = 20
+
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def classification_input_hash(description: Optional[str], price_text: Optional[str]) -> str:
+    """
+    Hash of the fields the classifier reads, normalised (case, whitespace) so cosmetic
+    edits do not count as changes. Stored on classifications as input_hash.
+    """
+    def normalise(value: Optional[str]) -> str:
+        return WHITESPACE_PATTERN.sub(" ", unicodedata.normalize("NFKC", value or "")).strip().lower()
+
+    payload = f"{normalise(price_text)}\x1f{normalise(description)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def estimate_cost(prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call; cached prompt tokens are billed at the cached rate."""
+    return (
+        (prompt_tokens - cached_tokens) * settings.OPENAI_INPUT_COST_PER_1M_TOKENS
+        + cached_tokens * settings.OPENAI_CACHED_INPUT_COST_PER_1M_TOKENS
+        + completion_tokens * settings.OPENAI_OUTPUT_COST_PER_1M_TOKENS
+    ) / 1_000_000
+
+
+def _cached_tokens(usage: Any) -> int:
+    """Prompt tokens served from the provider's prefix cache (0 when not reported)."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0
+
+
+class ClassificationUsage:
+    """
+    Accumulates model calls and token usage across one or more classification calls,
+    so batch endpoints can report throughput and cost per listing.
+    """
 
-JSON:
+    def __init__(self):
+        self.model_calls = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.single_fallbacks = 0
+        self.local_predictions = 0
+
+    def add(self, usage: Any) -> None:
+        self.model_calls += 1
+        if usage is not None:
+            self.prompt_tokens += int(getattr(usage, "prompt_tokens", 0) or 0)
+            self.cached_prompt_tokens += _cached_tokens(usage)
+            self.completion_tokens += int(getattr(usage, "completion_tokens", 0) or 0)
+
+    def estimated_cost(self) -> float:
+        return estimate_cost(self.prompt_tokens, self.cached_prompt_tokens, self.completion_tokens)
+
+
+def _is_service_failure(error: BaseException) -> bool:
+    """Errors that indicate the AI service is degraded (as opposed to a bad request or bad output)."""
+    if isinstance(error, (RateLimitError, APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class ClassificationService:
+    def __init__(self):
+        # SDK retries disabled: retries, timeouts and hedging are handled here
+        self.client = AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            max_retries=0
+        )
+        self.model = settings.OPENAI_CLASSIFICATION_MODEL
+        self.max_retries = 3
+        self.retry_delay = 2  # seconds
+        self.rate_limit_delay = 5  # seconds for rate limit errors
+        self.expected_completion_tokens = 120  # JSON answer is ~60-100 tokens
+        self.request_timeout = settings.OPENAI_REQUEST_TIMEOUT_SECONDS
+        self.hedge_after = settings.OPENAI_HEDGE_AFTER_SECONDS
+        self.circuit_breaker = CircuitBreaker(
+            "openai-classification",
+            failure_threshold=settings.CLASSIFICATION_CIRCUIT_FAILURE_THRESHOLD,
+            recovery_timeout=settings.CLASSIFICATION_CIRCUIT_RECOVERY_SECONDS,
+        )
+
+    def trim_description(self, description: str) -> str:
         """
+        Keep descriptions within the configured token budget. Over-budget descriptions
+        are reduced to their pricing-relevant sentences (price, offers, closing date,
+        seller urgency), in original order; if none match, the opening text is kept.
+        """
+        budget = settings.CLASSIFICATION_DESCRIPTION_TOKEN_BUDGET
+        if not description or budget <= 0 or estimate_tokens(description) <= budget:
+            return description
+
+        kept: List[str] = []
+        used = 0
+        for sentence in SENTENCE_SPLIT_PATTERN.split(description):
+            sentence = sentence.strip()
+            if not sentence or not PRICING_SENTENCE_PATTERN.search(sentence):
+                continue
+            cost = estimate_tokens(sentence)
+            if used + cost > budget:
+                break
+            kept.append(sentence)
+            used += cost
+        if kept:
+            return " ".join(kept)
+        return description[:budget * 4].rsplit(" ", 1)[0]
+
+    def _build_single_prompt(self, description: str, price_text: str) -> str:
+        return f"""LISTING TO ANALYZE:
+Price: {price_text}
+Description: {self.trim_description(description)}
+
+{SINGLE_RESPONSE_FORMAT}"""
+
+    def _build_batch_prompt(self, keyed_listings: Dict[str, Dict[str, Any]]) -> str:
+        blocks = []
+        for key, listing in keyed_listings.items():
+            blocks.append(
+                f"[{key}]\n"
+                f"Price: {listing.get('price_raw') or ''}\n"
+                f"Description: {self.trim_description(str(listing.get('description') or ''))}"
+            )
+        listings_text = "\n\n".join(blocks)
+        return f"""LISTINGS TO ANALYZE ({len(keyed_listings)}):
+{listings_text}
+
+{BATCH_RESPONSE_FORMAT}"""
+
+    def _parse_result(self, result: Dict[str, Any]) -> ClassificationOutcome:
+        status = STATUS_MAP.get(result.get("status"), ClassificationStatus.COMPETITIVE)  # type: ignore[arg-type]
+        try:
+            confidence = max(0, min(100, int(round(float(result.get("confidence_score", 0))))))
+        except (TypeError, ValueError):
+            confidence = 0
+        reason = result.get("reason", "No reason provided.")
+        return ClassificationOutcome(status=status, confidence_score=confidence, reason=str(reason), model=self.model)
+
+    async def _create_completion(
+        self,
+        prompt: str,
+        estimated_tokens: int,
+        hedge_usages: Optional[List[Any]] = None
+    ) -> Any:
+        """
+        One attempt with a hard timeout. If hedging is enabled and the first request
+        has not answered after `hedge_after` seconds, an identical request is sent and
+        whichever answers first wins; the other is settled by _settle_hedge_losers.
+        """
+        def send():
+            return self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": CLASSIFICATION_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                response_format={"type": "json_object"}
+            )
+
+        if self.hedge_after <= 0 or self.hedge_after >= self.request_timeout:
+            try:
+                return await asyncio.wait_for(send(), timeout=self.request_timeout)
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"OpenAI request timed out after {self.request_timeout}s")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout
+        primary = asyncio.ensure_future(send())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                logger.warning(f"OpenAI request slower than {self.hedge_after}s, sending hedge request")
+                await llm_rate_limiter.acquire(estimated_tokens)
+                tasks.add(asyncio.ensure_future(send()))
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        await self._settle_hedge_losers(tasks - {task}, estimated_tokens, hedge_usages)
+                        return task.result()
+                    last_error = task.exception()
+            if last_error is not None and not pending:
+                raise last_error
+            raise asyncio.TimeoutError(f"OpenAI request timed out after {self.request_timeout}s")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _settle_hedge_losers(
+        self,
+        losers: Set["asyncio.Future[Any]"],
+        estimated_tokens: int,
+        hedge_usages: Optional[List[Any]]
+    ) -> None:
+        """
+        Reconcile the rate limiter reservation of the request that lost a hedge race.
+        One still in flight is cancelled and its reservation released; one that also
+        answered is reconciled with its reported usage, which goes to hedge_usages so
+        the caller can account for the extra call.
+        """
+        for task in losers:
+            if not task.done():
+                task.cancel()
+                await llm_rate_limiter.record_usage(estimated_tokens, 0)
+            elif not task.cancelled() and task.exception() is None:
+                loser_usage = getattr(task.result(), "usage", None)
+                await llm_rate_limiter.record_usage(
+                    estimated_tokens, getattr(loser_usage, "total_tokens", None) if loser_usage else None
+                )
+                if hedge_usages is not None:
+                    hedge_usages.append(loser_usage)
+
+    def _record_run(
+        self,
+        started: float,
+        queue_seconds: float,
+        attempt: int,
+        listing_id: Optional[str],
+        listings_count: int,
+        response_usage: Any = None,
+        error: Optional[BaseException] = None
+    ) -> None:
+        prompt_tokens = int(getattr(response_usage, "prompt_tokens", 0) or 0) if response_usage else 0
+        completion_tokens = int(getattr(response_usage, "completion_tokens", 0) or 0) if response_usage else 0
+        cached_tokens = _cached_tokens(response_usage) if response_usage else 0
+        classification_telemetry.record({
+            "listing_id": listing_id,
+            "listings_count": listings_count,
+            "model": self.model,
+            "prompt_version": PROMPT_VERSION,
+            "mode": "batched" if listings_count > 1 else "single",
+            "success": error is None,
+            "error": str(error)[:500] if error else None,
+            "latency_ms": int((time.perf_counter() - started) * 1000),
+            "queue_ms": int(queue_seconds * 1000),
+            "retries": attempt,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "cache_hit": cached_tokens > 0,
+            "estimated_cost_usd": round(estimate_cost(prompt_tokens, cached_tokens, completion_tokens), 6),
+        })
+
+    async def _request_json(
+        self,
+        prompt: str,
+        completion_tokens: int,
+        usage: Optional[ClassificationUsage] = None,
+        listing_id: Optional[str] = None,
+        listings_count: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Send one JSON-mode chat completion with pacing, per-attempt timeouts and retries.
+        Rate limit and API errors are retried with backoff; the last error is re-raised.
+        Parsing errors are raised immediately (retrying would not help).
+        Raises CircuitOpenError without calling the API while the circuit is open.
+        Every call that reaches the API is recorded in classification telemetry.
+        """
+        estimated_tokens = estimate_tokens(CLASSIFICATION_SYSTEM_PROMPT) + estimate_tokens(prompt) + completion_tokens
+        started = time.perf_counter()
+        queue_seconds = 0.0
+        response_usage = None
 
         # Retry logic with exponential backoff
-        last_exception = None
+        last_exception: Optional[Exception] = None
         for attempt in range(self.max_retries):
+            # Fail fast while the service is known to be degraded
+            try:
+                is_probe = self.circuit_breaker.before_call()
+            except CircuitOpenError as e:
+                if attempt > 0:
+                    self._record_run(started, queue_seconds, attempt, listing_id, listings_count, error=e)
+                raise
             try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant specialized in Scottish property market analysis."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"}
+                # Pace against the shared RPM/TPM budget before sending
+                queue_seconds += await llm_rate_limiter.acquire(estimated_tokens)
+                hedge_usages: List[Any] = []
+                response = await self._create_completion(prompt, estimated_tokens, hedge_usages)
+                self.circuit_breaker.record_success()
+                response_usage = getattr(response, "usage", None)
+                await llm_rate_limiter.record_usage(
+                    estimated_tokens, getattr(response_usage, "total_tokens", None) if response_usage else None
                 )
+                if usage is not None:
+                    usage.add(response_usage)
+                    for hedge_usage in hedge_usages:
+                        usage.add(hedge_usage)
+                for hedge_usage in hedge_usages:
+                    # The other hedged request answered too: a billed call of its own
+                    self._record_run(started, queue_seconds, attempt, listing_id, listings_count, hedge_usage)
+                if response_usage is not None:
+                    logger.info(
+                        f"OpenAI classification call: prompt_tokens={getattr(response_usage, 'prompt_tokens', None)} "
+                        f"cached_tokens={_cached_tokens(response_usage)} "
+                        f"completion_tokens={getattr(response_usage, 'completion_tokens', None)}"
+                    )
                 
                 content = response.choices[0].message.content
                 if not content:
@@ -142,55 +481,536 @@ JSON:
                 
                 # Type assertion: content is guaranteed to be str after None check
                 result = json.loads(content)  # type: ignore[arg-type]
-                
-                status_map = {
-                    "explicit": ClassificationStatus.EXPLICIT,
-                    "likely": ClassificationStatus.LIKELY,
-                    "competitive": ClassificationStatus.COMPETITIVE
-                }
-                
-                status = status_map.get(result.get("status"), ClassificationStatus.COMPETITIVE)
-                confidence = result.get("confidence_score", 0)
-                reason = result.get("reason", "No reason provided.")
-                
-                return status, confidence, reason
+                if not isinstance(result, dict):
+                    raise ValueError("Expected a JSON object from OpenAI API")
+                self._record_run(started, queue_seconds, attempt, listing_id, listings_count, response_usage)
+                return result
 
             except RateLimitError as e:
                 last_exception = e
+                self.circuit_breaker.record_failure(e)
                 if attempt < self.max_retries - 1:
                     wait_time = self.rate_limit_delay * (attempt + 1)
                     logger.warning(f"Rate limit hit, waiting {wait_time}s before retry {attempt + 1}/{self.max_retries}")
                     await asyncio.sleep(wait_time)
                 else:
                     logger.error(f"Rate limit error after {self.max_retries} attempts: {e}")
-                    return ClassificationStatus.COMPETITIVE, 0, f"Rate limit error: {str(e)}"
+                    self._record_run(started, queue_seconds, attempt, listing_id, listings_count, error=e)
+                    raise
             
             except APIError as e:
                 last_exception = e
+                if _is_service_failure(e):
+                    self.circuit_breaker.record_failure(e)
                 if attempt < self.max_retries - 1:
                     wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
                     logger.warning(f"API error, waiting {wait_time}s before retry {attempt + 1}/{self.max_retries}: {e}")
                     await asyncio.sleep(wait_time)
                 else:
                     logger.error(f"API error after {self.max_retries} attempts: {e}")
-                    return ClassificationStatus.COMPETITIVE, 0, f"API error: {str(e)}"
+                    self._record_run(started, queue_seconds, attempt, listing_id, listings_count, error=e)
+                    raise
             
             except (ValueError, json.JSONDecodeError) as e:
                 # Don't retry for these errors
                 logger.error(f"Error parsing classification response: {e}")
-                return ClassificationStatus.COMPETITIVE, 0, f"Error parsing response: {str(e)}"
+                self._record_run(started, queue_seconds, attempt, listing_id, listings_count, response_usage, error=e)
+                raise
             
             except Exception as e:
                 last_exception = e
+                if _is_service_failure(e):
+                    self.circuit_breaker.record_failure(e)
                 if attempt < self.max_retries - 1:
                     wait_time = self.retry_delay * (2 ** attempt)  # Exponential backoff
-                    logger.warning(f"Unexpected error, waiting {wait_time}s before retry {attempt + 1}/{self.max_retries}: {e}")
+                    logger.warning(f"Unexpected error, waiting {wait_time}s before retry {attempt + 1}/{self.max_retries}: {e!r}")
                     await asyncio.sleep(wait_time)
                 else:
-                    logger.error(f"Error in AI classification after {self.max_retries} attempts: {e}")
-                    return ClassificationStatus.COMPETITIVE, 0, f"Error processing: {str(e)}"
+                    logger.error(f"Error in AI classification after {self.max_retries} attempts: {e!r}")
+                    self._record_run(started, queue_seconds, attempt, listing_id, listings_count, error=e)
+                    raise
+
+            finally:
+                # A probe that ended without a success/failure verdict (4xx, parse error,
+                # cancellation) must not leave the circuit refusing every call
+                if is_probe:
+                    self.circuit_breaker.release_probe()
         
         # Should not reach here, but just in case
-        return ClassificationStatus.COMPETITIVE, 0, f"Classification failed after {self.max_retries} attempts: {str(last_exception) if last_exception else 'Unknown error'}"
+        raise RuntimeError(f"Classification failed after {self.max_retries} attempts: {str(last_exception) if last_exception else 'Unknown error'}")
+
+    def _local_first_pass(self, description: str, price_text: str) -> Optional[ClassificationOutcome]:
+        """Confident local model prediction, or None if the LLM should decide."""
+        if not local_classifier.load():
+            return None
+        prediction = local_classifier.predict(description, price_text)
+        if prediction is None or prediction[1] < settings.LOCAL_CLASSIFIER_MIN_PROBABILITY:
+            return None
+        status, probability = prediction
+        return ClassificationOutcome(
+            status=status,
+            confidence_score=int(round(probability * 100)),
+            reason=f"Local model prediction ({probability:.0%} probability).",
+            model=local_classifier.model_name
+        )
+
+    def _fallback_outcome(self, description: str, price_text: str) -> ClassificationOutcome:
+        """
+        Answer without the AI service: the local model if one is trained, else the rules.
+        Confidence is capped so these rows are reclassified once the AI service recovers.
+        """
+        prediction = local_classifier.predict(description, price_text) if local_classifier.load() else None
+        if prediction is not None:
+            status, probability = prediction
+            return ClassificationOutcome(
+                status=status,
+                confidence_score=min(MAX_FALLBACK_CONFIDENCE, int(round(probability * 100))),
+                reason=f"Fallback: local model prediction ({probability:.0%} probability), AI unavailable.",
+                model=local_classifier.model_name
+            )
+        status, confidence, reason = classify_with_rules(description, price_text)
+        return ClassificationOutcome(status=status, confidence_score=confidence, reason=reason, model=FALLBACK_MODEL_NAME)
+
+    def _error_outcome(self, reason: str) -> ClassificationOutcome:
+        return ClassificationOutcome(
+            status=ClassificationStatus.COMPETITIVE, confidence_score=0, reason=reason, model=self.model, error=True
+        )
+
+    async def classify(
+        self,
+        description: str,
+        price_text: str,
+        usage: Optional[ClassificationUsage] = None,
+        listing_id: Optional[str] = None,
+        use_local: bool = True
+    ) -> ClassificationOutcome:
+        """
+        Classifies a property listing as 'explicit' fixed price, 'likely' fixed price, or 'competitive'.
+        Uses a refined prompt with comprehensive classification patterns for accurate categorization.
+        A confident local model prediction (use_local) skips the LLM; while the circuit
+        breaker is open the local model or the rule-based classifier answers instead.
+        The outcome names the model that produced it (store it as ai_model_used).
+        """
+        if use_local:
+            local = self._local_first_pass(description, price_text)
+            if local is not None:
+                if usage is not None:
+                    usage.local_predictions += 1
+                return local
+
+        prompt = self._build_single_prompt(description, price_text)
+        try:
+            result = await self._request_json(prompt, self.expected_completion_tokens, usage, listing_id)
+            return self._parse_result(result)
+        except CircuitOpenError as e:
+            # AI service degraded: answer locally instead of waiting on it
+            logger.warning(f"{e}; using fallback classifier")
+            return self._fallback_outcome(description, price_text)
+        except RateLimitError as e:
+            return self._error_outcome(f"Rate limit error: {str(e)}")
+        except APIError as e:
+            return self._error_outcome(f"API error: {str(e)}")
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._error_outcome(f"Error parsing response: {str(e)}")
+        except Exception as e:
+            return self._error_outcome(f"Error processing: {str(e)}")
+
+    async def classify_listing(
+        self,
+        description: str,
+        price_text: str,
+        usage: Optional[ClassificationUsage] = None
+    ) -> Tuple[ClassificationStatus, int, str]:
+        """
+        Tuple form of classify().
+        Returns: (status, confidence_score, reason)
+        """
+        outcome = await self.classify(description, price_text, usage)
+        return outcome.status, outcome.confidence_score, outcome.reason
+
+    async def classify_listings_batch(
+        self,
+        listings: List[Dict[str, Any]],
+        usage: Optional[ClassificationUsage] = None
+    ) -> Dict[str, ClassificationOutcome]:
+        """
+        Classify several listings (dicts with id, description, price_raw) with one model call.
+        Each listing gets a stable prompt id (L1..Ln) and the model answers with a JSON array.
+        Listings missing or malformed in the answer are re-classified one at a time.
+        Returns: {listing_id: outcome}
+        """
+        if len(listings) > MAX_BATCH_SIZE:
+            raise ValueError(f"At most {MAX_BATCH_SIZE} listings can be classified per model call")
+        keyed = {f"L{i + 1}": listing for i, listing in enumerate(listings)}
+        parsed: Dict[str, ClassificationOutcome] = {}
+
+        try:
+            payload = await self._request_json(
+                self._build_batch_prompt(keyed),
+                self.expected_completion_tokens * len(keyed),
+                usage,
+                listings_count=len(keyed)
+            )
+            entries = payload.get("results")
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict):
+                    continue
+                key = str(entry.get("id", "")).strip().strip("[]")
+                if key not in keyed or key in parsed or entry.get("status") not in STATUS_MAP:
+                    continue
+                if not isinstance(entry.get("confidence_score"), (int, float)):
+                    continue
+                parsed[key] = self._parse_result(entry)
+        except Exception as e:
+            logger.warning(f"Batched classification of {len(keyed)} listings failed, falling back to single calls: {e}")
+
+        missing = [key for key in keyed if key not in parsed]
+        if missing and parsed:
+            logger.warning(f"Batched classification returned {len(parsed)}/{len(keyed)} usable results, classifying the rest singly")
+        for key in missing:
+            listing = keyed[key]
+            parsed[key] = await self.classify(
+                str(listing.get("description") or ""),
+                str(listing.get("price_raw") or ""),
+                usage,
+                str(listing.get("id"))
+            )
+            if usage is not None:
+                usage.single_fallbacks += 1
+
+        return {str(keyed[key].get("id")): parsed[key] for key in keyed}
+
+    async def classify_many(
+        self,
+        listings: List[Dict[str, Any]],
+        batch_size: int = 1,
+        on_result: Optional[Callable[[str, ClassificationOutcome], None]] = None
+    ) -> Tuple[Dict[str, ClassificationOutcome], Dict[str, Any]]:
+        """
+        Classify listings one per call (batch_size=1) or packed batch_size per call.
+        Returns the results keyed by listing id plus a performance report (throughput,
+        tokens and estimated cost per listing) so both modes can be compared.
+        on_result is called with each listing's outcome as soon as it is available.
+        """
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        usage = ClassificationUsage()
+        results: Dict[str, ClassificationOutcome] = {}
+        started = time.perf_counter()
+
+        # Confident local predictions never reach the LLM
+        remaining: List[Dict[str, Any]] = []
+        for listing in listings:
+            local = self._local_first_pass(str(listing.get("description") or ""), str(listing.get("price_raw") or ""))
+            if local is not None:
+                results[str(listing.get("id"))] = local
+                usage.local_predictions += 1
+                if on_result:
+                    on_result(str(listing.get("id")), local)
+            else:
+                remaining.append(listing)
+
+        if batch_size == 1:
+            for listing in remaining:
+                outcome = await self.classify(
+                    str(listing.get("description") or ""),
+                    str(listing.get("price_raw") or ""),
+                    usage,
+                    str(listing.get("id"))
+                )
+                results[str(listing.get("id"))] = outcome
+                if on_result:
+                    on_result(str(listing.get("id")), outcome)
+        else:
+            for i in range(0, len(remaining), batch_size):
+                batch_results = await self.classify_listings_batch(remaining[i:i + batch_size], usage)
+                results.update(batch_results)
+                if on_result:
+                    for listing_id, outcome in batch_results.items():
+                        on_result(listing_id, outcome)
+
+        elapsed = time.perf_counter() - started
+        count = len(results)
+        # What the same listings would have cost as single-listing prompts (estimated)
+        single_prompt_tokens = sum(
+            estimate_tokens(CLASSIFICATION_SYSTEM_PROMPT)
+            + estimate_tokens(self._build_single_prompt(str(l.get("description") or ""), str(l.get("price_raw") or "")))
+            for l in listings
+        )
+        cost = usage.estimated_cost()
+        report = {
+            "mode": "single" if batch_size == 1 else "batched",
+            "batch_size": batch_size,
+            "listings": count,
+            "model_calls": usage.model_calls,
+            "single_fallbacks": usage.single_fallbacks,
+            "local_predictions": usage.local_predictions,
+            "elapsed_seconds": round(elapsed, 3),
+            "listings_per_second": round(count / elapsed, 3) if elapsed > 0 else None,
+            "prompt_tokens": usage.prompt_tokens,
+            "cached_prompt_tokens": usage.cached_prompt_tokens,
+            "cache_hit_rate": round(usage.cached_prompt_tokens / usage.prompt_tokens, 3) if usage.prompt_tokens else 0,
+            "completion_tokens": usage.completion_tokens,
+            "prompt_tokens_per_listing": round(usage.prompt_tokens / count, 1) if count else 0,
+            "estimated_single_mode_prompt_tokens_per_listing": round(single_prompt_tokens / count, 1) if count else 0,
+            "estimated_cost_usd": round(cost, 6),
+            "estimated_cost_per_listing_usd": round(cost / count, 6) if count else 0,
+        }
+        return results, report
+
+    def fetch_listings_to_classify(
+        self,
+        limit: int,
+        only_unclassified: bool = True,
+        listing_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Next `limit` active listings to classify in a single query. With only_unclassified
+        the database anti-joins against classifications (unclassified_listings function)
+        instead of checking each listing separately.
+        """
+        if only_unclassified:
+            response = supabase.rpc(
+                "unclassified_listings",
+                {"p_limit": limit, "p_listing_ids": listing_ids or None}
+            ).execute()
+        else:
+            query = supabase.table("listings").select("id, description, price_raw").eq("is_active", True)
+            if listing_ids:
+                query = query.in_("id", listing_ids)
+            response = query.limit(limit).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return [row for row in rows if isinstance(row, dict) and row.get("id")]
+
+    @staticmethod
+    def classification_row(
+        listing_id: str,
+        outcome: ClassificationOutcome,
+        input_hash: Optional[str] = None
+    ) -> Dict[str, Any]:
+        return {
+            "listing_id": str(listing_id),
+            "status": outcome.status.value,
+            "confidence_score": outcome.confidence_score,
+            "classification_reason": outcome.reason,
+            "ai_model_used": outcome.model,
+            "prompt_version": PROMPT_VERSION,
+            "input_hash": input_hash,
+            "classified_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def save_outcomes(
+        self,
+        outcomes: Dict[str, ClassificationOutcome],
+        listings: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Insert or replace the classification of every listing in one upsert request.
+        Pass the classified listings to record the input hash of what was classified.
+        Error outcomes are skipped, so a failed call never replaces a stored classification.
+        """
+        outcomes = {listing_id: outcome for listing_id, outcome in outcomes.items() if not outcome.error}
+        if not outcomes:
+            return
+        hashes = {
+            str(listing.get("id")): classification_input_hash(listing.get("description"), listing.get("price_raw"))
+            for listing in listings or []
+        }
+        rows = [
+            self.classification_row(listing_id, outcome, hashes.get(str(listing_id)))
+            for listing_id, outcome in outcomes.items()
+        ]
+        supabase.table("classifications").upsert(rows, on_conflict="listing_id").execute()
+
+    async def classify_and_store(self, listings: List[Dict[str, Any]], batch_size: int = 1) -> Dict[str, Any]:
+        """
+        Classify listings and save all results with a single bulk upsert.
+        Returns per-listing results plus the classify_many performance report.
+        """
+        classified, performance = await self.classify_many(listings, batch_size)
+        try:
+            self.save_outcomes(classified, listings)
+            error = None
+        except Exception as e:
+            logger.error(f"Failed to save {len(classified)} classifications: {e}")
+            error = str(e)
+
+        results = []
+        for listing in listings:
+            listing_id = str(listing.get("id"))
+            outcome = classified.get(listing_id)
+            if outcome is None or outcome.error or error:
+                results.append({
+                    "listing_id": listing_id,
+                    "status": "failed",
+                    "error": error or (outcome.reason if outcome else "No classification returned")
+                })
+                continue
+            results.append({
+                "listing_id": listing_id,
+                "status": "success",
+                "classification": {
+                    "status": outcome.status,
+                    "confidence_score": outcome.confidence_score
+                }
+            })
+        successful = sum(1 for r in results if r["status"] == "success")
+        return {
+            "processed": len(listings),
+            "successful": successful,
+            "failed": len(results) - successful,
+            "results": results,
+            "performance": performance
+        }
+
+    async def stream_classify_and_store(
+        self,
+        listings: List[Dict[str, Any]],
+        batch_size: int,
+        channel: str,
+        chunk_size: int = 50
+    ) -> None:
+        """
+        classify_and_store for long jobs: saves chunk by chunk and publishes a "result"
+        event per listing and a "progress" event per chunk to the progress broker channel.
+        """
+        total = len(listings)
+        processed = succeeded = failed = 0
+        started = time.perf_counter()
+
+        def progress() -> Dict[str, Any]:
+            elapsed = time.perf_counter() - started
+            rate = processed / elapsed if elapsed > 0 else 0
+            return {
+                "total": total,
+                "processed": processed,
+                "succeeded": succeeded,
+                "failed": failed,
+                "elapsed_seconds": round(elapsed, 1),
+                "listings_per_second": round(rate, 3),
+                "eta_seconds": round((total - processed) / rate, 1) if rate else None
+            }
+
+        def publish_result(listing_id: str, outcome: ClassificationOutcome) -> None:
+            progress_broker.publish(channel, "result", {
+                "listing_id": listing_id,
+                "status": outcome.status.value,
+                "confidence_score": outcome.confidence_score,
+                "model": outcome.model
+            })
+
+        progress_broker.publish(channel, "start", progress())
+        for i in range(0, total, chunk_size):
+            chunk = listings[i:i + chunk_size]
+            classified, _ = await self.classify_many(chunk, batch_size, on_result=publish_result)
+            try:
+                await asyncio.to_thread(self.save_outcomes, classified, chunk)
+                chunk_failed = sum(1 for outcome in classified.values() if outcome.error)
+            except Exception as e:
+                logger.error(f"Failed to save {len(classified)} classifications: {e}")
+                progress_broker.publish(channel, "error", {"error": f"Failed to save chunk: {e}"})
+                chunk_failed = len(classified)
+            processed += len(chunk)
+            failed += chunk_failed + len(chunk) - len(classified)
+            succeeded = processed - failed
+            progress_broker.publish(channel, "progress", progress())
+        progress_broker.close(channel, {"status": "completed", **progress()})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Dashboard totals, status breakdown and confidence distribution (classification_stats rollup)."""
+        response = supabase.rpc("classification_stats", {}).execute()
+        return response.data if isinstance(response.data, dict) else {}
+
+    def get_version_counts(self) -> List[Dict[str, Any]]:
+        """Classification counts per (prompt_version, ai_model_used), flagging the current one."""
+        response = supabase.rpc("classification_version_counts", {}).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return [
+            {**row, "current": row.get("prompt_version") == PROMPT_VERSION and row.get("ai_model_used") == self.model}
+            for row in rows if isinstance(row, dict)
+        ]
+
+    async def compare_versions(
+        self,
+        sample_size: int,
+        from_prompt_version: Optional[str] = None,
+        apply: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Re-classify a random sample of classifications made with another prompt version or
+        model using the current ones, and report old vs new side by side (agreement, status
+        transitions, confidence change, cost). With apply the new results replace the old.
+        """
+        response = supabase.rpc("stale_classification_sample", {
+            "p_prompt_version": PROMPT_VERSION,
+            "p_model": self.model,
+            "p_limit": sample_size,
+            "p_from_prompt_version": from_prompt_version
+        }).execute()
+        sample = [
+            {**row, "id": row["listing_id"]}
+            for row in (response.data if isinstance(response.data, list) else [])
+            if isinstance(row, dict) and row.get("listing_id")
+        ]
+
+        usage = ClassificationUsage()
+        classified: Dict[str, ClassificationOutcome] = {}
+        for listing in sample:
+            # Always ask the current prompt/model; a local prediction would not compare versions
+            classified[str(listing["id"])] = await self.classify(
+                str(listing.get("description") or ""),
+                str(listing.get("price_raw") or ""),
+                usage,
+                str(listing["id"]),
+                use_local=False
+            )
+
+        rows = []
+        transitions: Dict[str, int] = {}
+        for listing in sample:
+            new = classified[str(listing["id"])]
+            old_status = str(listing.get("status"))
+            transition = f"{old_status}->{new.status.value}"
+            transitions[transition] = transitions.get(transition, 0) + 1
+            rows.append({
+                "listing_id": str(listing["id"]),
+                "price_raw": listing.get("price_raw"),
+                "old": {
+                    "status": old_status,
+                    "confidence_score": listing.get("confidence_score"),
+                    "model": listing.get("ai_model_used"),
+                    "prompt_version": listing.get("prompt_version")
+                },
+                "new": {
+                    "status": new.status.value,
+                    "confidence_score": new.confidence_score,
+                    "model": new.model,
+                    "prompt_version": PROMPT_VERSION,
+                    "reason": new.reason
+                },
+                "changed": old_status != new.status.value
+            })
+
+        if apply and classified:
+            self.save_outcomes(classified, sample)
+
+        compared = len(rows)
+        agreed = sum(1 for row in rows if not row["changed"])
+        confidence_deltas = [
+            row["new"]["confidence_score"] - int(row["old"]["confidence_score"] or 0) for row in rows
+        ]
+        return {
+            "current_prompt_version": PROMPT_VERSION,
+            "current_model": self.model,
+            "from_prompt_version": from_prompt_version,
+            "compared": compared,
+            "agreement_rate": round(agreed / compared, 3) if compared else None,
+            "changed": compared - agreed,
+            "transitions": transitions,
+            "mean_confidence_delta": round(sum(confidence_deltas) / compared, 1) if compared else None,
+            "model_calls": usage.model_calls,
+            "estimated_cost_usd": round(usage.estimated_cost(), 6),
+            "applied": bool(apply and classified),
+            "rows": rows
+        }
 
 classification_service = ClassificationService()
@@ -0,0 +1,125 @@
+"""
+Classification telemetry: latency, tokens, retries and cost per OpenAI call.
+
+Rows are buffered in memory and written to `classification_runs` in one insert
+shortly after the first buffered call, so telemetry never adds a database round
+trip to the classification path itself.
+
+When that insert fails the rows are written one by one: a row the database
+rejects while others go in is dropped (it would fail forever). When none go in
+(database unreachable) the rows are kept and retried with exponential backoff,
+whether or not new calls arrive, and dropped after max_attempts failed writes.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.database import supabase
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Consecutive single-row failures, with none written, that mean the database is unreachable
+OUTAGE_PROBE_ROWS = 3
+
+
+class ClassificationTelemetry:
+    def __init__(
+        self,
+        flush_delay: float = 2.0,
+        max_buffer: int = 200,
+        max_attempts: int = 8,
+        max_retry_delay: float = 60.0
+    ):
+        self.flush_delay = flush_delay
+        self.max_buffer = max_buffer
+        self.max_attempts = max_attempts
+        self.max_retry_delay = max_retry_delay
+        # (row, failed write attempts), oldest first
+        self._buffer: List[Tuple[Dict[str, Any], int]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._retry_delay = flush_delay
+
+    def record(self, run: Dict[str, Any]) -> None:
+        """Buffer one call record and schedule a flush."""
+        self._buffer.append((run, 0))
+        if len(self._buffer) > self.max_buffer * 5:
+            # Database unreachable for a long time; keep memory bounded
+            dropped = len(self._buffer) - self.max_buffer
+            self._buffer = self._buffer[-self.max_buffer:]
+            logger.warning(f"Dropped {dropped} buffered classification telemetry rows")
+        self._schedule(self.flush_delay if len(self._buffer) < self.max_buffer else 0)
+
+    def _schedule(self, delay: float) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._flush_task = None
+        await self.flush()
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        supabase.table("classification_runs").insert(rows).execute()
+
+    async def flush(self) -> None:
+        """Write all buffered rows in a single insert, falling back to row by row on failure."""
+        if not self._buffer:
+            return
+        pending, self._buffer = self._buffer, []
+        try:
+            await asyncio.to_thread(self._insert, [row for row, _ in pending])
+            self._retry_delay = self.flush_delay
+            return
+        except Exception as e:
+            logger.warning(f"Failed to write {len(pending)} classification telemetry rows, retrying one by one: {e}")
+
+        written = 0
+        failed: List[Tuple[Dict[str, Any], int]] = []
+        last_error: Optional[Exception] = None
+        for index, (row, attempts) in enumerate(pending):
+            if not written and len(failed) >= OUTAGE_PROBE_ROWS:
+                # Nothing goes in: the database is down, not the rows bad. Keep the untried rows
+                # first so a failing row at the front does not hold the rest back next time
+                pending = pending[index:] + failed
+                break
+            try:
+                await asyncio.to_thread(self._insert, [row])
+                written += 1
+            except Exception as e:
+                failed.append((row, attempts + 1))
+                last_error = e
+        else:
+            pending = failed
+        if written:
+            self._retry_delay = self.flush_delay
+            if failed:
+                # Other rows went in, so these are rejected for their content
+                logger.error(f"Dropped {len(failed)} classification telemetry rows the database rejected: {last_error}")
+            return
+
+        retry = [(row, attempts) for row, attempts in pending if attempts < self.max_attempts]
+        if len(retry) < len(pending):
+            logger.error(
+                f"Dropped {len(pending) - len(retry)} classification telemetry rows after "
+                f"{self.max_attempts} failed writes: {last_error}"
+            )
+        if not retry:
+            return
+        self._buffer = retry + self._buffer
+        logger.error(
+            f"Failed to write {len(retry)} classification telemetry rows, retrying in {self._retry_delay:.0f}s: {last_error}"
+        )
+        # Retry on a timer rather than on the next recorded call, backing off while writes fail
+        self._schedule(self._retry_delay)
+        self._retry_delay = min(self._retry_delay * 2, self.max_retry_delay)
+
+    def get_stats(self, days: int) -> Dict[str, Any]:
+        """Aggregated latency percentiles, tokens and cost (computed in the database)."""
+        response = supabase.rpc("classification_run_stats", {"p_days": days}).execute()
+        return response.data if isinstance(response.data, dict) else {}
+
+
+classification_telemetry = ClassificationTelemetry()
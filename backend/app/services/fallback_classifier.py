@@ -0,0 +1,57 @@
+"""
+Rule-based fallback classifier.
+
+Used when the AI classifier is unavailable (circuit open). Applies the same
+classification rules as the AI prompt with plain pattern matching, and caps
+confidence low so these results are picked up again by low-confidence
+reclassification once the AI service recovers.
+"""
+import re
+from typing import Tuple
+from app.models.classification import ClassificationStatus
+
+FALLBACK_MODEL_NAME = "rules-fallback"
+MAX_FALLBACK_CONFIDENCE = 45
+
+_FIXED_PRICE = re.compile(r"\bfixed\s+price\b|\bfixed\s+at\b|\bprice\s+set\s+at\b|\bno\s+offers\s+over\b", re.IGNORECASE)
+_FIXED_CONSIDERED = re.compile(
+    r"fixed\s+price\s+(offers\s+)?(considered|welcome|encouraged)|willing\s+to\s+accept\s+(a\s+)?fixed\s+price",
+    re.IGNORECASE
+)
+_CLOSING_DATE = re.compile(r"closing\s+date", re.IGNORECASE)
+_NO_CLOSING_DATE = re.compile(r"no\s+closing\s+date", re.IGNORECASE)
+_OFFERS = re.compile(r"offers\s+(over|invited|in\s+excess\s+of)|\bo/?o\b", re.IGNORECASE)
+_COMPETITIVE = re.compile(
+    r"highly\s+sought|exceed\s+(the\s+)?asking|multiple\s+offers|offers\s+in\s+excess\s+of",
+    re.IGNORECASE
+)
+_BUYER_FRIENDLY = re.compile(
+    r"quick\s+sale|motivated\s+seller|relocat|negotiable|flexible\s+on\s+price|open\s+to\s+offers",
+    re.IGNORECASE
+)
+_BARE_PRICE = re.compile(r"^\s*(asking\s+price|guide\s+price|price)?\s*:?\s*£\s?[\d,.]+\s*[km]?\s*$", re.IGNORECASE)
+
+
+def classify_with_rules(description: str, price_text: str) -> Tuple[ClassificationStatus, int, str]:
+    """
+    Classify a listing from its price text and description using the prompt's rules.
+    Returns: (status, confidence_score, reason)
+    """
+    price_text = price_text or ""
+    text = f"{price_text} {description or ''}"
+
+    if _FIXED_CONSIDERED.search(text):
+        return ClassificationStatus.LIKELY, 40, "Fallback rules: fixed price offers considered."
+    if _FIXED_PRICE.search(price_text):
+        return ClassificationStatus.EXPLICIT, MAX_FALLBACK_CONFIDENCE, "Fallback rules: price text states a fixed price."
+    if _CLOSING_DATE.search(text) and not _NO_CLOSING_DATE.search(text):
+        return ClassificationStatus.COMPETITIVE, MAX_FALLBACK_CONFIDENCE, "Fallback rules: closing date mentioned."
+    if _COMPETITIVE.search(text):
+        return ClassificationStatus.COMPETITIVE, 40, "Fallback rules: competitive bidding language."
+    if _OFFERS.search(price_text):
+        if _BUYER_FRIENDLY.search(text) or _NO_CLOSING_DATE.search(text):
+            return ClassificationStatus.LIKELY, 35, "Fallback rules: offers over with buyer-friendly language."
+        return ClassificationStatus.COMPETITIVE, 35, "Fallback rules: offers over without fixed price mention."
+    if _BARE_PRICE.match(price_text) and not _OFFERS.search(text):
+        return ClassificationStatus.EXPLICIT, 35, "Fallback rules: plain price with no competitive language."
+    return ClassificationStatus.COMPETITIVE, 20, "Fallback rules: no clear pricing indicators."
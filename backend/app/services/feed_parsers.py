@@ -0,0 +1,295 @@
+"""
+Agent property feed parsers.
+
+Rightmove BLM files (delimited text) and XML data feeds are read incrementally
+and turned into rows shaped like ManualListingInput, yielded the same way as
+IngestionService.iter_upload_rows: (row_number, row_or_none, error_or_none).
+The ingestion pipeline consumes them in batches, so memory stays bounded by the
+pipeline queues rather than the feed size.
+
+- BLM: the header declares the field (EOF) and record (EOR) separators and the
+  definition record names the columns; data records are split off a buffered
+  read, never the whole file.
+- XML: iterparse over <property>/<listing> elements; each element is detached
+  from its parent once mapped, so no full tree is ever built. Child tags are
+  matched by name (case-insensitive, namespaces ignored) against the aliases
+  used by common feed formats (Jupix, Vebra, Kyero and similar).
+
+Feeds carry the agent's own property reference rather than a listing URL, so a
+listing URL template ("https://agent.example/property/{ref}") builds the URL
+when a property has none.
+"""
+import io
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+from xml.etree.ElementTree import Element, ParseError, iterparse
+
+FEED_FORMATS = ("blm", "xml")
+BLM_READ_SIZE = 64 * 1024
+
+# BLM PRICE_QUALIFIER codes
+PRICE_QUALIFIERS = {
+    "0": "", "1": "POA", "2": "Guide Price", "3": "Fixed Price", "4": "Offers in Excess of",
+    "5": "OIRO", "6": "Sale by Tender", "7": "From", "9": "Shared Ownership", "10": "Offers Over",
+    "11": "Part Buy Part Rent", "12": "Shared Equity", "15": "Offers Invited", "16": "Coming Soon",
+}
+# BLM STATUS_ID codes no longer on the market: SSTC, SSTCM (Scotland), reserved, let agreed
+BLM_INACTIVE_STATUSES = {"1", "2", "4", "5"}
+BLM_LETTINGS = "2"
+INACTIVE_STATUS_WORDS = {"sold", "sstc", "sstcm", "sold stc", "sold subject to contract", "reserved", "let", "let agreed", "withdrawn"}
+
+# XML child tag aliases (lower-case local names) per field, in order of preference
+XML_PROPERTY_TAGS = {"property", "listing"}
+XML_ALIASES = {
+    "ref": ("agent_ref", "propertyid", "property_id", "ref", "reference", "id"),
+    "listing_url": ("listing_url", "property_url", "details_url", "url", "link"),
+    "display_address": ("display_address", "displayaddress", "full_address", "fulladdress"),
+    "address_1": ("address_1", "address1", "street"),
+    "address_2": ("address_2", "address2"),
+    "address_3": ("address_3", "address3"),
+    "postcode": ("postcode", "addresspostcode", "post_code", "postal_code"),
+    "city": ("town", "city", "addresstown"),
+    "region": ("county", "region", "addresscounty", "province"),
+    "price": ("price", "asking_price", "askingprice"),
+    "price_qualifier": ("price_qualifier", "pricequalifier", "qualifier"),
+    "price_raw": ("price_text", "display_price", "displayprice", "price_display"),
+    "description": ("description", "full_description", "fulldescription", "desc", "summary", "mainsummary"),
+    "agent_name": ("agent_name", "branch_name", "branchname"),
+    "image_url": ("image", "photo", "picture", "image_url"),
+    "status": ("status", "availability"),
+    "transaction": ("transaction", "trans_type", "department"),
+}
+
+
+def price_text(price: Optional[str], qualifier: Optional[str]) -> Optional[str]:
+    """Display price as a portal would show it ("Fixed Price £250,000", "POA") from an amount and qualifier."""
+    label = PRICE_QUALIFIERS.get((qualifier or "").strip(), (qualifier or "").strip())
+    if label.upper() == "POA":
+        return "POA"
+    amount = (price or "").strip().replace(",", "").lstrip("£")
+    try:
+        amount = f"£{float(amount):,.0f}" if float(amount) > 0 else ""
+    except ValueError:
+        amount = (price or "").strip()
+    text = f"{label} {amount}".strip()
+    return text or None
+
+
+def listing_url(ref: Optional[str], url: Optional[str], template: Optional[str]) -> Optional[str]:
+    if url and url.strip().lower().startswith(("http://", "https://")):
+        return url.strip()
+    if template and ref:
+        return template.replace("{ref}", ref.strip())
+    return None
+
+
+def _join(*parts: Optional[str]) -> str:
+    return ", ".join(part.strip() for part in parts if part and part.strip())
+
+
+def _listing_row(
+    fields: Dict[str, Optional[str]],
+    defaults: Dict[str, Any],
+    template: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """ManualListingInput-shaped row from mapped feed fields, or (None, error)."""
+    url = listing_url(fields.get("ref"), fields.get("listing_url"), template)
+    if not url:
+        return None, f"Property {fields.get('ref') or '(no reference)'} has no listing URL; pass listing_url_template"
+    image = fields.get("image_url")
+    row = {
+        **defaults,
+        "listing_url": url,
+        "address": fields.get("address"),
+        "postcode": fields.get("postcode"),
+        "city": fields.get("city"),
+        "region": fields.get("region"),
+        "price_raw": fields.get("price_raw") or price_text(fields.get("price"), fields.get("price_qualifier")),
+        "description": fields.get("description"),
+        # BLM media columns are often file names shipped alongside the feed
+        "image_url": image if image and image.lower().startswith(("http://", "https://")) else None,
+        "is_active": fields.get("is_active", True),
+    }
+    if fields.get("agent_name"):
+        row["agent_name"] = fields["agent_name"]
+    return row, None
+
+
+def _blm_header(text: io.TextIOWrapper) -> Dict[str, str]:
+    """Header key/values up to #DEFINITION#."""
+    header: Dict[str, str] = {}
+    for line in text:
+        line = line.strip()
+        if line.upper() == "#DEFINITION#":
+            return header
+        if ":" in line and not line.startswith("#"):
+            key, value = line.split(":", 1)
+            header[key.strip().upper()] = value.strip().strip("'\"")
+    raise ValueError("Not a BLM file: no #DEFINITION# section")
+
+
+def _blm_records(text: io.TextIOWrapper, eor: str) -> Iterator[str]:
+    buffer = ""
+    for chunk in iter(lambda: text.read(BLM_READ_SIZE), ""):
+        buffer += chunk
+        *records, buffer = buffer.split(eor)
+        yield from records
+    if buffer.strip():
+        yield buffer
+
+
+def iter_blm_rows(
+    fileobj: BinaryIO,
+    defaults: Dict[str, Any],
+    listing_url_template: Optional[str] = None,
+    encoding: str = "utf-8"
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Stream listings from a Rightmove BLM file. Lettings records are reported as invalid."""
+    text = io.TextIOWrapper(fileobj, encoding=encoding, errors="replace", newline="")
+    try:
+        try:
+            header = _blm_header(text)
+        except ValueError as e:
+            yield 0, None, str(e)
+            return
+        eof, eor = header.get("EOF", "^"), header.get("EOR", "~")
+
+        columns: Optional[List[str]] = None
+        row_number = 0
+        for record in _blm_records(text, eor):
+            record = record.strip()
+            if record.upper().startswith("#DATA#"):
+                record = record[len("#DATA#"):].strip()
+            if record.upper().startswith("#END#"):
+                return
+            if not record:
+                continue
+            values = record.split(eof)
+            if columns is None:
+                columns = [value.strip().upper() for value in values]
+                continue
+
+            row_number += 1
+            blm = dict(zip(columns, values))
+            if blm.get("TRANS_TYPE_ID", "").strip() == BLM_LETTINGS:
+                yield row_number, None, f"Property {blm.get('AGENT_REF', '')} is a letting"
+                continue
+            postcode = " ".join(part.strip() for part in (blm.get("POSTCODE1"), blm.get("POSTCODE2")) if part and part.strip())
+            row, error = _listing_row({
+                "ref": blm.get("AGENT_REF"),
+                "listing_url": blm.get("PROPERTY_URL"),
+                "address": blm.get("DISPLAY_ADDRESS", "").strip() or _join(
+                    blm.get("ADDRESS_1"), blm.get("ADDRESS_2"), blm.get("ADDRESS_3"), blm.get("TOWN")
+                ),
+                "postcode": postcode or None,
+                "city": blm.get("TOWN"),
+                "region": blm.get("ADDRESS_4"),
+                "price": blm.get("PRICE"),
+                "price_qualifier": blm.get("PRICE_QUALIFIER"),
+                "description": blm.get("DESCRIPTION", "").strip() or blm.get("SUMMARY"),
+                "image_url": blm.get("MEDIA_IMAGE_00"),
+                "is_active": blm.get("STATUS_ID", "0").strip() not in BLM_INACTIVE_STATUSES,
+            }, defaults, listing_url_template)
+            yield row_number, row, error
+    finally:
+        # Leave the underlying upload file open for its owner
+        text.detach()
+
+
+def _local_name(tag: Any) -> str:
+    return tag.rsplit("}", 1)[-1].lower() if isinstance(tag, str) else ""
+
+
+def _xml_fields(element: Element) -> Dict[str, Optional[str]]:
+    """First non-empty value per alias among the element's descendants (text or url/href attribute)."""
+    found: Dict[str, Optional[str]] = {}
+    attributes: Dict[str, Dict[str, str]] = {}
+    for child in element.iter():
+        if child is element:
+            continue
+        name = _local_name(child.tag)
+        value = child.get("url") or child.get("href") or "".join(child.itertext()).strip()
+        if name not in found and value:
+            found[name] = value
+            attributes[name] = {key.lower(): val for key, val in child.attrib.items()}
+    for key, val in element.attrib.items():
+        found.setdefault(_local_name(key), val)
+
+    def first(field: str) -> Optional[str]:
+        return next((found[alias] for alias in XML_ALIASES[field] if found.get(alias)), None)
+
+    # Jupix style split street line: <addressName>, <addressNumber>, <addressStreet>
+    street = " ".join(found[name] for name in ("addressname", "addressnumber", "addressstreet") if found.get(name))
+    qualifier = first("price_qualifier") or attributes.get("price", {}).get("qualifier")
+    status = (first("status") or "").strip().lower()
+    return {
+        "ref": first("ref"),
+        "listing_url": first("listing_url"),
+        "address": first("display_address") or _join(
+            street or first("address_1"), first("address_2"), first("address_3"), first("city")
+        ),
+        "postcode": first("postcode"),
+        "city": first("city"),
+        "region": first("region"),
+        "price": first("price"),
+        "price_qualifier": qualifier,
+        "price_raw": first("price_raw"),
+        "description": first("description"),
+        "agent_name": first("agent_name"),
+        "image_url": first("image_url"),
+        "is_active": status not in INACTIVE_STATUS_WORDS,
+        "transaction": (first("transaction") or "").strip().lower(),
+    }
+
+
+def iter_xml_rows(
+    fileobj: BinaryIO,
+    defaults: Dict[str, Any],
+    listing_url_template: Optional[str] = None
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Stream listings from an XML property feed. Lettings records are reported as invalid."""
+    parents: List[Element] = []
+    row_number = 0
+    try:
+        for event, element in iterparse(fileobj, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if _local_name(element.tag) not in XML_PROPERTY_TAGS:
+                continue
+            # Nested <property> inside a listing (e.g. a property type tag) is a field, not a record
+            if any(_local_name(parent.tag) in XML_PROPERTY_TAGS for parent in parents):
+                continue
+
+            row_number += 1
+            fields = _xml_fields(element)
+            if fields["transaction"] in ("letting", "lettings", "rent", "rental"):
+                yield row_number, None, f"Property {fields.get('ref') or ''} is a letting"
+            else:
+                row, error = _listing_row(fields, defaults, listing_url_template)
+                yield row_number, row, error
+            # Drop the mapped element so the tree never holds more than one property
+            element.clear()
+            if parents:
+                parents[-1].remove(element)
+    except ParseError as e:
+        yield row_number + 1, None, f"Invalid XML: {e}"
+
+
+def iter_feed_rows(
+    fileobj: BinaryIO,
+    feed_format: str,
+    source: str = "agent",
+    agent_name: Optional[str] = None,
+    listing_url_template: Optional[str] = None,
+    encoding: str = "utf-8"
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Rows of a BLM or XML feed for IngestionPipeline.run()."""
+    defaults: Dict[str, Any] = {"source": source}
+    if agent_name:
+        defaults["agent_name"] = agent_name
+    if feed_format == "blm":
+        return iter_blm_rows(fileobj, defaults, listing_url_template, encoding)
+    if feed_format == "xml":
+        return iter_xml_rows(fileobj, defaults, listing_url_template)
+    raise ValueError(f"Unknown feed format '{feed_format}'. Expected one of: {', '.join(FEED_FORMATS)}")
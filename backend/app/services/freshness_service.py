@@ -0,0 +1,200 @@
+"""
+Listing freshness checks.
+
+A lifespan task wakes every FRESHNESS_CHECK_INTERVAL_SECONDS and revalidates
+the active listings that were least recently checked (last_checked_at older
+than FRESHNESS_MAX_AGE_HOURS), batch by batch:
+
+1. claim_stale_listings (migrations/011) picks the oldest batch and bumps its
+   last_checked_at in one statement, so workers never check the same listings.
+2. Each listing is checked against its source with at most FRESHNESS_CONCURRENCY
+   checks in flight: the Zoopla API for Zoopla listings when it is enabled,
+   otherwise a GET of the listing URL (404/410 means gone).
+3. Listings that are gone are deactivated in one statement per batch.
+
+Listing URLs are user input, so only known portal hosts and the host of the
+listing's own agent_url are fetched, and only when they resolve to public
+addresses; redirects are followed by hand under the same rule. Anything else is
+not requested at all.
+
+Inconclusive checks (timeouts, 5xx, disallowed or malformed URLs and redirects,
+malformed responses) keep the listing active; it simply comes round again after
+FRESHNESS_MAX_AGE_HOURS.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import httpx
+from app.core.config import settings
+from app.core.database import supabase
+from app.core.logging_config import get_logger
+from app.services.ingestion_service import ingestion_service
+from app.services.zoopla_service import zoopla_service
+
+logger = get_logger(__name__)
+
+GONE_STATUS_CODES = (404, 410)
+USER_AGENT = "FixedPriceScotland-FreshnessCheck/1.0"
+MAX_REDIRECTS = 5
+
+
+def _is_public_address(address: str) -> bool:
+    """Whether an IP address is globally routable (not private, loopback, link-local, reserved)."""
+    try:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])
+    except ValueError:
+        return False
+    return ip.is_global and not ip.is_multicast
+
+
+def _agent_host(listing: Dict[str, Any]) -> Optional[str]:
+    """Host of the listing's agent_url (not an IP literal), the one non-portal host checks may fetch."""
+    try:
+        host = httpx.URL(str(listing.get("agent_url") or "")).host.lower().rstrip(".")
+    except (httpx.InvalidURL, TypeError):
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        return host or None
+
+
+class FreshnessService:
+    def __init__(self):
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        checked_before = datetime.now(timezone.utc) - timedelta(hours=settings.FRESHNESS_MAX_AGE_HOURS)
+        response = supabase.rpc("claim_stale_listings", {
+            "p_limit": limit,
+            "p_checked_before": checked_before.isoformat()
+        }).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return [row for row in rows if isinstance(row, dict) and row.get("id")]
+
+    def _deactivate(self, listing_ids: List[str]) -> int:
+        response = supabase.rpc("deactivate_listings", {"p_ids": listing_ids}).execute()
+        return response.data if isinstance(response.data, int) else 0
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        return [info[4][0] for info in infos]
+
+    async def _may_fetch(self, url: httpx.URL, agent_host: Optional[str]) -> bool:
+        """Whether a URL is a portal or agent page on a public address (never internal hosts)."""
+        host = url.host.lower().rstrip(".")
+        if url.scheme not in ("http", "https") or not host:
+            return False
+        if not ingestion_service.detect_portal(host) and not (
+            agent_host and (host == agent_host or host.endswith(f".{agent_host}"))
+        ):
+            return False
+        try:
+            addresses = await self._resolve(host, url.port or (443 if url.scheme == "https" else 80))
+        except (OSError, UnicodeError):
+            return False
+        return bool(addresses) and all(_is_public_address(address) for address in addresses)
+
+    async def _check_url(self, client: httpx.AsyncClient, url: str, agent_host: Optional[str] = None) -> Optional[bool]:
+        """
+        True when the listing page is there, False when it is gone, None when unclear or
+        when the URL (or a redirect) points anywhere but a portal or the listing's agent.
+        """
+        try:
+            target = httpx.URL(url)
+            for _ in range(MAX_REDIRECTS + 1):
+                if not await self._may_fetch(target, agent_host):
+                    logger.debug(f"Freshness check skipped disallowed URL {target}")
+                    return None
+                async with client.stream("GET", target, follow_redirects=False) as response:
+                    if response.is_redirect:
+                        target = target.join(response.headers["location"])
+                        continue
+                    if response.status_code in GONE_STATUS_CODES:
+                        return False
+                    if 200 <= response.status_code < 300:
+                        return True
+                    return None
+            return None
+        except (httpx.HTTPError, httpx.InvalidURL, KeyError):
+            return None
+
+    async def check_listing(self, client: httpx.AsyncClient, listing: Dict[str, Any]) -> Optional[bool]:
+        """Whether a listing is still on the market (None when that could not be determined)."""
+        url = str(listing.get("listing_url") or "")
+        if listing.get("source") == "zoopla" and zoopla_service.enabled:
+            exists = await zoopla_service.listing_exists(url)
+            if exists is not None:
+                return exists
+        return await self._check_url(client, url, _agent_host(listing)) if url else None
+
+    async def check_batch(self, client: httpx.AsyncClient, limit: int) -> Dict[str, int]:
+        """Claim, check and (where gone) deactivate one batch. Returns counts for the batch."""
+        listings = await asyncio.to_thread(self._claim, limit)
+        semaphore = asyncio.Semaphore(settings.FRESHNESS_CONCURRENCY)
+
+        async def check(listing: Dict[str, Any]) -> Optional[bool]:
+            # One bad listing must not abort a batch whose last_checked_at is already bumped
+            async with semaphore:
+                try:
+                    return await self.check_listing(client, listing)
+                except Exception as e:
+                    logger.warning(f"Freshness check failed for listing {listing.get('id')}: {e!r}")
+                    return None
+
+        results = await asyncio.gather(*(check(listing) for listing in listings))
+        gone = [str(listing["id"]) for listing, exists in zip(listings, results) if exists is False]
+        deactivated = await asyncio.to_thread(self._deactivate, gone) if gone else 0
+        return {
+            "checked": len(listings),
+            "active": sum(1 for exists in results if exists),
+            "deactivated": deactivated,
+            "inconclusive": sum(1 for exists in results if exists is None),
+        }
+
+    async def run(self, max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """Check stale listings batch by batch until none are left or max_batches is reached."""
+        async with self._lock:
+            started = time.perf_counter()
+            totals = {"checked": 0, "active": 0, "deactivated": 0, "inconclusive": 0, "batches": 0}
+            batch_size = settings.FRESHNESS_BATCH_SIZE
+            async with httpx.AsyncClient(
+                timeout=settings.FRESHNESS_REQUEST_TIMEOUT_SECONDS,
+                headers={"User-Agent": USER_AGENT},
+                limits=httpx.Limits(max_connections=settings.FRESHNESS_CONCURRENCY)
+            ) as client:
+                for _ in range(max_batches or settings.FRESHNESS_MAX_BATCHES_PER_RUN):
+                    batch = await self.check_batch(client, batch_size)
+                    totals["batches"] += 1
+                    for key, value in batch.items():
+                        totals[key] += value
+                    if batch["checked"] < batch_size:
+                        break
+            self.last_run = {
+                **totals,
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+            }
+            if totals["checked"]:
+                logger.info(
+                    f"Freshness check: {totals['checked']} listings checked, {totals['deactivated']} deactivated, "
+                    f"{totals['inconclusive']} inconclusive"
+                )
+            return self.last_run
+
+    async def watch(self) -> None:
+        """Lifespan task: run a freshness check every FRESHNESS_CHECK_INTERVAL_SECONDS."""
+        while True:
+            try:
+                await self.run()
+            except Exception as e:
+                logger.warning(f"Freshness check failed: {e}")
+            await asyncio.sleep(settings.FRESHNESS_CHECK_INTERVAL_SECONDS)
+
+
+freshness_service = FreshnessService()
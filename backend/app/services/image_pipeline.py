@@ -0,0 +1,101 @@
+"""
+Listing photo variants.
+
+Uploaded photos are stored as sent, and next to each original the pipeline
+stores WebP variants sized for where they are shown:
+
+    <id>.jpg            original
+    <id>_thumb.webp     search cards (320px long edge)
+    <id>_medium.webp    listing page (960px long edge)
+
+Variants are decoded, EXIF-rotated, resized and encoded in a process pool, so
+the CPU-bound work neither blocks the event loop nor competes for its GIL, and
+they carry no EXIF/ICC/XMP metadata (camera, GPS). Variant URLs are derived
+from the original's (photoVariantUrl in the frontend), so stored image_url
+values need no new column.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+from app.core.config import settings
+
+# Variant name -> longest edge in pixels (smallest first, as listed in srcset)
+VARIANTS: Dict[str, int] = {"thumb": 320, "medium": 960}
+VARIANT_FORMAT = "webp"
+VARIANT_CONTENT_TYPE = "image/webp"
+WEBP_QUALITY = 80
+# Decompression bomb guard: a 5MB file can still declare a huge canvas
+MAX_PIXELS = 50_000_000
+
+
+class InvalidImageError(ValueError):
+    """Raised when uploaded bytes are not a decodable image."""
+
+
+def variant_path(path: str, variant: str) -> str:
+    """Storage path of a variant: "<stem>_<variant>.webp" next to the original."""
+    stem, _ = os.path.splitext(path)
+    return f"{stem}_{variant}.{VARIANT_FORMAT}"
+
+
+def render_variants(data: bytes) -> Tuple[Dict[str, Tuple[bytes, int]], Tuple[int, int]]:
+    """
+    (WebP bytes, width) per variant and the original's (width, height). Runs in a worker
+    process. Raises InvalidImageError for undecodable or oversized images.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as opened:
+            if opened.width * opened.height > MAX_PIXELS:
+                raise InvalidImageError(f"Image is too large ({opened.width}x{opened.height})")
+            # Apply the EXIF orientation before the metadata is dropped
+            image = ImageOps.exif_transpose(opened)
+            image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise InvalidImageError(f"Not a valid image: {e}")
+
+    image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB")
+    size = image.size
+    rendered: Dict[str, Tuple[bytes, int]] = {}
+    for name, edge in VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        # No exif/icc_profile/xmp arguments: the variant is written without metadata
+        variant.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+        rendered[name] = (buffer.getvalue(), variant.width)
+    return rendered, size
+
+
+class ImagePipeline:
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def render(self, data: bytes) -> Tuple[Dict[str, Tuple[bytes, int]], Tuple[int, int]]:
+        """render_variants() in the process pool. Raises InvalidImageError."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), render_variants, data)
+
+    @staticmethod
+    def srcset(candidates: Dict[str, int]) -> str:
+        """srcset attribute value from {url: width}, smallest first; one URL per width."""
+        by_width: Dict[int, str] = {}
+        for url, width in candidates.items():
+            by_width.setdefault(width, url)
+        return ", ".join(f"{url} {width}w" for width, url in sorted(by_width.items()))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+image_pipeline = ImagePipeline(workers=settings.IMAGE_PROCESS_WORKERS)
@@ -0,0 +1,314 @@
+"""
+Staged ingestion pipeline.
+
+Listings flow through bounded asyncio queues between stages, each with its own
+worker count and batch size:
+
+    validate -> dedupe -> write -> alert
+
+- validate: normalise and validate rows (IngestionService.prepare_bulk_row)
+- dedupe:   batch lookup of stored listings by canonical URL (plan_upsert)
+- write:    batched insert / diff update / last_checked_at bump (apply_upsert)
+- alert:    saved-search alerts for new listings
+
+New and materially changed listings are handed to the reclassification queue
+as they are written, so the job returns without waiting for the model. Rows are
+pulled from the (synchronous) file parser in a worker thread, a chunk at a time.
+
+A full queue blocks the stage feeding it (backpressure), so the feed never
+buffers unbounded work. Per-stage metrics show throughput, utilisation and time
+spent blocked, i.e. which stage is the bottleneck.
+"""
+import asyncio
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.services.alert_service import alert_service
+from app.services.ingestion_service import ingestion_service, needs_classification
+from app.services.reclassification_queue import reclassification_queue
+
+logger = get_logger(__name__)
+
+_DONE = object()
+
+
+class StageMetrics:
+    def __init__(self):
+        self.received = 0
+        self.failed = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0  # waiting for room in the next stage's queue
+        self.max_queue_depth = 0
+
+    def snapshot(self, elapsed: float, workers: int) -> Dict[str, Any]:
+        return {
+            "workers": workers,
+            "received": self.received,
+            "failed": self.failed,
+            "batches": self.batches,
+            "items_per_second": round(self.received / elapsed, 2) if elapsed > 0 else None,
+            # Share of the stage's worker time spent working: near 1.0 marks the bottleneck
+            "utilization": round(self.busy_seconds / (elapsed * workers), 3) if elapsed > 0 else None,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+class Stage:
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[List[Any]], Awaitable[None]],
+        workers: int = 1,
+        batch_size: int = 1,
+        max_wait: float = 0.05,
+        queue_size: int = 500,
+        on_error: Optional[Callable[[List[Any], Exception], None]] = None
+    ):
+        self.name = name
+        self.handler = handler
+        # Called with the batch when the handler raises, so its items are still accounted for
+        self.on_error = on_error
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.metrics = StageMetrics()
+
+
+class Pipeline:
+    """Bounded queues between stages; each stage's workers take batches from its queue."""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = {stage.name: stage for stage in stages}
+        self.order = [stage.name for stage in stages]
+        self._tasks: Dict[str, List[asyncio.Task]] = {}
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def start(self) -> None:
+        self._started = time.perf_counter()
+        for stage in self.stages.values():
+            self._tasks[stage.name] = [
+                asyncio.get_running_loop().create_task(self._worker(stage)) for _ in range(stage.workers)
+            ]
+
+    async def emit(self, stage_name: str, item: Any, source: Optional[str] = None) -> None:
+        """Queue an item for a stage, waiting while its queue is full (backpressure)."""
+        stage = self.stages[stage_name]
+        if stage.queue.full():
+            started = time.perf_counter()
+            await stage.queue.put(item)
+            if source:
+                self.stages[source].metrics.blocked_seconds += time.perf_counter() - started
+        else:
+            stage.queue.put_nowait(item)
+        stage.metrics.max_queue_depth = max(stage.metrics.max_queue_depth, stage.queue.qsize())
+
+    async def _collect(self, stage: Stage) -> Tuple[List[Any], bool]:
+        """Up to batch_size items, waiting at most max_wait for the batch to fill."""
+        item = await stage.queue.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + stage.max_wait
+        while len(batch) < stage.batch_size:
+            if not stage.queue.empty():
+                item = stage.queue.get_nowait()
+            else:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(stage.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _worker(self, stage: Stage) -> None:
+        while True:
+            batch, done = await self._collect(stage)
+            if batch:
+                started = time.perf_counter()
+                try:
+                    await stage.handler(batch)
+                except Exception as e:
+                    stage.metrics.failed += len(batch)
+                    logger.error(f"Ingestion stage {stage.name} failed for {len(batch)} items: {e}")
+                    if stage.on_error is not None:
+                        stage.on_error(batch, e)
+                stage.metrics.busy_seconds += time.perf_counter() - started
+                stage.metrics.received += len(batch)
+                stage.metrics.batches += 1
+            if done:
+                return
+
+    async def close(self) -> None:
+        """Drain the stages in order: a stage is closed once every stage feeding it has finished."""
+        for name in self.order:
+            stage = self.stages[name]
+            for _ in range(stage.workers):
+                await stage.queue.put(_DONE)
+            await asyncio.gather(*self._tasks[name])
+        self._finished = time.perf_counter()
+
+    def cancel(self) -> None:
+        for tasks in self._tasks.values():
+            for task in tasks:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        end = self._finished or time.perf_counter()
+        elapsed = end - self._started if self._started else 0.0
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": {
+                name: self.stages[name].metrics.snapshot(elapsed, self.stages[name].workers) for name in self.order
+            },
+        }
+
+
+class IngestionPipeline:
+    """
+    One ingestion job (a bulk upload or a portal sync) run through the staged pipeline.
+    Feed rows as (row_number, row_or_none, parse_error_or_none), like iter_upload_rows.
+    """
+
+    def __init__(
+        self,
+        created_by: Optional[str] = None,
+        update_existing: bool = True,
+        classify: bool = True,
+        alerts: bool = True
+    ):
+        self.created_by = created_by
+        self.update_existing = update_existing
+        self.classify = classify
+        self.alerts = alerts
+        self.report: List[Dict[str, Any]] = []
+        self.counts = {"created": 0, "updated": 0, "unchanged": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+        self.classification_queued = 0
+        self.alerts_checked = 0
+        self._claimed_urls: Set[str] = set()
+        self._reported_rows: Set[int] = set()
+        queue_size = settings.INGESTION_PIPELINE_QUEUE_SIZE
+        write_batch = settings.INGESTION_BULK_CHUNK_SIZE
+        self.pipeline = Pipeline([
+            Stage("validate", self._validate, workers=1, batch_size=write_batch, max_wait=0, queue_size=queue_size),
+            Stage(
+                "dedupe", self._dedupe, workers=1, batch_size=write_batch, queue_size=queue_size,
+                on_error=lambda items, e: self._fail_rows(
+                    [row_number for row_number, _ in items], f"Duplicate check failed: {str(e)}"
+                )
+            ),
+            Stage(
+                "write", self._write, workers=settings.INGESTION_WRITE_WORKERS, batch_size=1, queue_size=4,
+                on_error=lambda items, e: self._fail_rows(
+                    [row_number for row_numbers, _ in items for row_number in row_numbers], f"Database error: {str(e)}"
+                )
+            ),
+            Stage("alert", self._alert, workers=settings.INGESTION_ALERT_WORKERS, queue_size=queue_size),
+        ])
+
+    def _record(self, row_number: int, result: Dict[str, Any]) -> None:
+        self.counts[result["status"]] += 1
+        self.report.append({"row": row_number, **result})
+        self._reported_rows.add(row_number)
+
+    def _fail_rows(self, row_numbers: List[int], error: str) -> None:
+        """Report the rows of a failed stage batch that have no result yet as failed."""
+        for row_number in row_numbers:
+            if row_number not in self._reported_rows:
+                self._record(row_number, {"status": "failed", "error": error})
+
+    async def _validate(self, items: List[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]) -> None:
+        for row_number, row, parse_error in items:
+            if parse_error:
+                self._record(row_number, {"status": "invalid", "error": parse_error})
+                continue
+            try:
+                listing_data, error = ingestion_service.prepare_bulk_row(row or {})
+            except Exception as e:
+                self._record(row_number, {"status": "failed", "error": f"Validation failed: {str(e)}"})
+                continue
+            if error or listing_data is None:
+                self._record(row_number, {"status": "invalid", "error": error})
+                continue
+            if self.created_by:
+                listing_data["created_by_user_id"] = self.created_by
+            await self.pipeline.emit("dedupe", (row_number, listing_data), source="validate")
+
+    async def _dedupe(self, items: List[Tuple[int, Dict[str, Any]]]) -> None:
+        plan = await asyncio.to_thread(
+            ingestion_service.plan_upsert, [data for _, data in items], self.update_existing, self._claimed_urls
+        )
+        await self.pipeline.emit("write", ([row_number for row_number, _ in items], plan), source="dedupe")
+
+    async def _write(self, items: List[Tuple[List[int], Dict[str, Any]]]) -> None:
+        for row_numbers, plan in items:
+            try:
+                results = await asyncio.to_thread(ingestion_service.apply_upsert, plan)
+            except Exception as e:
+                results = [{"status": "failed", "error": f"Database error: {str(e)}"} for _ in row_numbers]
+            for row_number, result in zip(row_numbers, results):
+                self._record(row_number, result)
+                if self.classify and needs_classification(result):
+                    reclassification_queue.enqueue(str(result["listing_id"]))
+                    self.classification_queued += 1
+                if self.alerts and result["status"] == "created":
+                    await self.pipeline.emit("alert", str(result["listing_id"]), source="write")
+
+    async def _alert(self, listing_ids: List[str]) -> None:
+        for listing_id in listing_ids:
+            try:
+                await alert_service.check_and_send_alerts(listing_id)
+            except Exception as e:
+                logger.error(f"Failed to check and send search alerts for {listing_id}: {e}")
+            self.alerts_checked += 1
+
+    async def run(
+        self,
+        rows: Iterable[Tuple[int, Optional[Dict[str, Any]], Optional[str]]],
+        max_rows: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Feed rows through every stage and wait for all of them to finish. Returns the job report."""
+        total_rows = 0
+        truncated = False
+        iterator = iter(rows)
+        chunk_size = settings.INGESTION_BULK_CHUNK_SIZE
+        self.pipeline.start()
+        try:
+            while not truncated:
+                # Parsing is blocking file I/O and CPU work: keep it off the event loop
+                chunk = await asyncio.to_thread(list, itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                for item in chunk:
+                    if max_rows is not None and total_rows >= max_rows:
+                        truncated = True
+                        break
+                    total_rows += 1
+                    await self.pipeline.emit("validate", item)
+            await self.pipeline.close()
+        except BaseException:
+            self.pipeline.cancel()
+            raise
+
+        self.report.sort(key=lambda entry: entry["row"])
+        return {
+            "total_rows": total_rows,
+            "truncated": truncated,
+            **self.counts,
+            "classification_queued": self.classification_queued if self.classify else None,
+            "alerts_checked": self.alerts_checked if self.alerts else None,
+            "rows": self.report,
+            "pipeline": self.pipeline.metrics(),
+        }
@@ -1,8 +1,66 @@
+import csv
+import hashlib
+import io
+import json
 import re
-from typing import Optional, Dict, Any, List
-from urllib.parse import urlparse
+from typing import Optional, Dict, Any, List, BinaryIO, Iterator, Set, Tuple
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 from app.core.database import supabase
+from app.core.logging_config import get_logger
 from app.models.listing import ListingCreate
+from app.services.price_parser import parse_price, parse_prices
+from app.services.property_matcher import property_matcher
+
+logger = get_logger(__name__)
+
+# Columns accepted from bulk upload files (anything else is ignored)
+BULK_FIELDS = (
+    "listing_url", "source", "address", "postcode", "city", "region", "price_raw", "price_numeric",
+    "description", "agent_name", "agent_url", "image_url", "is_active",
+)
+
+# Fields whose change is worth writing when a listing is re-ingested (hashed into content_hash)
+MATERIAL_FIELDS = (
+    "address", "postcode", "city", "region", "price_raw", "price_numeric", "description",
+    "agent_name", "agent_url", "image_url", "is_active",
+)
+# Changes to these need the listing reclassified
+CLASSIFICATION_FIELDS = ("price_raw", "description")
+# Changes to these need the listing matched to a property again (property_matcher)
+ADDRESS_FIELDS = ("address", "postcode")
+
+# Query parameters that only record where a visitor came from (dropped from canonical URLs)
+TRACKING_PARAM_PREFIXES = ("utm_", "mc_", "_ga", "_gl")
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "dclid", "yclid", "ref", "referrer", "channel", "source", "_hsenc", "_hsmi"}
+# Values per IN (...) query: keeps the PostgREST request URL well under proxy limits
+URL_LOOKUP_CHUNK = 200
+
+def _material_value(value: Any) -> Any:
+    """Comparable form of a material field (trimmed text, rounded numbers, empty text as None)."""
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value or None
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    return value
+
+
+def listing_content_hash(listing: Dict[str, Any]) -> str:
+    """Hash of a listing's material fields as ingested (stored in listings.content_hash)."""
+    values = [_material_value(listing.get(field)) for field in MATERIAL_FIELDS]
+    return hashlib.sha256(json.dumps(values, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def needs_classification(result: Dict[str, Any]) -> bool:
+    """Whether an upsert result is a new listing or changed what the classifier reads."""
+    if result.get("status") == "created":
+        return True
+    return result.get("status") == "updated" and any(
+        field in CLASSIFICATION_FIELDS for field in result.get("changed_fields", [])
+    )
+
 
 class IngestionService:
     # Valid property portal sources
@@ -42,6 +100,44 @@ class IngestionService:
         # If no pattern matches, allow it but mark as "other" or "agent"
         return True, "other"
 
+    def detect_portal(self, host: str) -> Optional[str]:
+        """Known portal for a URL host (matched with URL_PATTERNS), or None."""
+        for source, pattern in self.URL_PATTERNS.items():
+            if re.search(rf"(^|\.){pattern}$", host):
+                return source
+        return None
+
+    def canonical_url(self, url: str) -> str:
+        """
+        Canonical form of a listing URL, used for storage and duplicate checks:
+        https, lower-case host without "www.", no fragment or trailing slash. Known
+        portals identify a listing by its path, so their query string is dropped;
+        other sites keep their query minus tracking parameters, sorted.
+        """
+        url = (url or "").strip()
+        try:
+            parsed = urlparse(url)
+            host = (parsed.hostname or "").lower()
+            port = parsed.port
+        except ValueError:
+            return url
+        if not parsed.scheme or not host:
+            return url
+        if host.startswith("www."):
+            host = host[4:]
+        if port and port not in (80, 443):
+            host = f"{host}:{port}"
+        path = re.sub(r"/{2,}", "/", parsed.path).rstrip("/")
+
+        query = ""
+        if self.detect_portal(host) is None and parsed.query:
+            params = [
+                (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+            ]
+            query = urlencode(sorted(params))
+        return urlunparse(("https", host, path, "", query, ""))
+
     def validate_listing_data(self, listing_data: Dict[str, Any]) -> tuple[bool, Optional[str]]:
         """
         Validates required fields for a listing.
@@ -85,57 +181,50 @@ class IngestionService:
         """
         Extracts numeric price from strings like "Fixed Price £250,000" or "Offers Over £180k".
         """
-        if not price_text:
-            return None
-            
-        # Remove commas and non-numeric chars except decimal and k/m
-        cleaned = price_text.lower().replace(',', '').replace('£', '').strip()
-        
-        # Look for numbers
-        match = re.search(r'(\d+(?:\.\d+)?)', cleaned)
-        if not match:
-            return None
-            
-        value = float(match.group(1))
-        
-        # Handle 'k' or 'm' suffixes
-        if 'k' in cleaned:
-            value *= 1000
-        elif 'm' in cleaned:
-            value *= 1000000
-            
-        return value
+        return parse_price(price_text)
 
     async def check_duplicate(self, url: str) -> tuple[bool, Optional[Dict[str, Any]]]:
         """
-        Checks if a listing with this URL already exists.
+        Checks if a listing with this URL (compared in canonical form) already exists.
         Returns: (is_duplicate, existing_listing_or_none)
         """
-        response = supabase.table("listings").select("id, listing_url, address, is_active").eq("listing_url", url).execute()
-        
-        if response.data and isinstance(response.data, list) and len(response.data) > 0:
-            return True, response.data[0]
-        
-        return False, None
+        existing = self.find_existing_urls([url]).get(self.canonical_url(url))
+        return existing is not None, existing
+
+    async def check_duplicates_batch(self, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Existing listings for many URLs in one round trip (per URL_LOOKUP_CHUNK URLs).
+        Returns: {url_as_given: existing_listing} for the URLs that are duplicates
+        """
+        existing = self.find_existing_urls(urls)
+        matches: Dict[str, Dict[str, Any]] = {}
+        for url in urls:
+            listing = existing.get(self.canonical_url(url))
+            if listing is not None:
+                matches[url] = listing
+        return matches
 
-    async def add_manual_listing(self, listing_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def add_manual_listing(self, listing_data: Dict[str, Any], check_duplicate: bool = True) -> Dict[str, Any]:
         """
         Process and add a single listing manually with comprehensive validation.
+        Pass check_duplicate=False when the caller already checked (e.g. with check_duplicates_batch).
         """
         # Validate listing data
         is_valid, error_msg = self.validate_listing_data(listing_data)
         if not is_valid:
             return {"error": error_msg}
         
-        url = listing_data.get("listing_url")
+        url = self.canonical_url(str(listing_data.get("listing_url")))
+        listing_data["listing_url"] = url
         
         # Check for duplicates
-        is_duplicate, existing = await self.check_duplicate(str(url))
-        if is_duplicate:
-            return {
-                "error": "Listing already exists",
-                "existing_listing": existing
-            }
+        if check_duplicate:
+            is_duplicate, existing = await self.check_duplicate(url)
+            if is_duplicate:
+                return {
+                    "error": "Listing already exists",
+                    "existing_listing": existing
+                }
 
         # Auto-parse numeric price if not provided
         if not listing_data.get("price_numeric") and listing_data.get("price_raw"):
@@ -147,6 +236,9 @@ class IngestionService:
         if "is_active" not in listing_data:
             listing_data["is_active"] = True
 
+        # Group with the same property listed on other portals
+        property_matcher.assign_safely([listing_data])
+
         # Insert into database
         try:
             response = supabase.table("listings").insert(listing_data).execute()
@@ -158,4 +250,256 @@ class IngestionService:
         except Exception as e:
             return {"error": f"Database error: {str(e)}"}
 
+    def iter_upload_rows(self, fileobj: BinaryIO, file_format: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+        """
+        Stream rows from an uploaded CSV (header row required) or JSONL file without
+        reading it into memory. Yields (row_number, row_or_none, parse_error_or_none).
+        """
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        try:
+            if file_format == "csv":
+                reader = csv.DictReader(text)
+                if reader.fieldnames:
+                    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+                for row_number, row in enumerate(reader, start=1):
+                    yield row_number, dict(row), None
+            else:
+                row_number = 0
+                for line in text:
+                    if not line.strip():
+                        continue
+                    row_number += 1
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        yield row_number, None, f"Invalid JSON: {e.msg}"
+                        continue
+                    if not isinstance(row, dict):
+                        yield row_number, None, "Each JSONL line must be an object"
+                        continue
+                    yield row_number, row, None
+        except UnicodeDecodeError:
+            yield 0, None, "File must be UTF-8 encoded"
+        finally:
+            # Leave the underlying upload file open for its owner
+            text.detach()
+
+    def prepare_bulk_row(self, row: Dict[str, Any]) -> tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Normalise one uploaded row (known columns, trimmed strings, typed price and
+        is_active) and validate it like a manual listing. Returns: (listing_data, error)
+        """
+        listing_data: Dict[str, Any] = {}
+        for field in BULK_FIELDS:
+            value = row.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+                if value == "":
+                    value = None
+            if value is not None:
+                listing_data[field] = value
+
+        if "price_numeric" in listing_data:
+            try:
+                listing_data["price_numeric"] = float(str(listing_data["price_numeric"]).replace(",", "").replace("£", ""))
+            except ValueError:
+                return None, "price_numeric must be a number"
+        if "is_active" in listing_data and isinstance(listing_data["is_active"], str):
+            listing_data["is_active"] = listing_data["is_active"].lower() not in ("false", "0", "no", "n")
+        if listing_data.get("source"):
+            listing_data["source"] = str(listing_data["source"]).lower()
+
+        is_valid, error_msg = self.validate_listing_data(listing_data)
+        if not is_valid:
+            return None, error_msg
+        listing_data["listing_url"] = self.canonical_url(str(listing_data["listing_url"]))
+        # price_numeric is parsed from price_raw per batch (parse_prices) in plan_upsert
+        listing_data.setdefault("is_active", True)
+        return listing_data, None
+
+    def find_existing_urls(self, urls: List[str], columns: str = "id, listing_url, address, is_active") -> Dict[str, Dict[str, Any]]:
+        """Existing listings for a set of URLs, keyed by canonical URL (one query per URL_LOOKUP_CHUNK)."""
+        canonical = list(dict.fromkeys(self.canonical_url(str(url)) for url in urls if url))
+        existing: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(canonical), URL_LOOKUP_CHUNK):
+            response = (
+                supabase.table("listings")
+                .select(columns)
+                .in_("listing_url", canonical[start:start + URL_LOOKUP_CHUNK])
+                .execute()
+            )
+            rows = response.data if isinstance(response.data, list) else []
+            for row in rows:
+                if isinstance(row, dict) and row.get("listing_url"):
+                    existing.setdefault(self.canonical_url(row["listing_url"]), row)
+        return existing
+
+    def _insert_listings(self, listings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Insert listings with one statement; if it fails, retry row by row so one bad row
+        does not fail the others. Returns one result per listing (created or failed).
+        """
+        def results_for(batch: List[Dict[str, Any]], returned: Any) -> List[Dict[str, Any]]:
+            inserted = {row.get("listing_url"): row for row in returned or [] if isinstance(row, dict)}
+            return [
+                {"status": "created", "listing_id": inserted[data["listing_url"]]["id"]}
+                if data["listing_url"] in inserted else {"status": "failed", "error": "Not returned by insert"}
+                for data in batch
+            ]
+
+        if not listings:
+            return []
+        try:
+            return results_for(listings, supabase.table("listings").insert(listings).execute().data)
+        except Exception as e:
+            logger.warning(f"Bulk insert of {len(listings)} listings failed, retrying per row: {e}")
+        results = []
+        for data in listings:
+            try:
+                results.extend(results_for([data], supabase.table("listings").insert(data).execute().data))
+            except Exception as row_error:
+                results.append({"status": "failed", "error": f"Database error: {str(row_error)}"})
+        return results
+
+    def plan_upsert(
+        self,
+        listings: List[Dict[str, Any]],
+        update_existing: bool = True,
+        claimed_urls: Optional[Set[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        First half of upsert_listings: canonicalise URLs, parse missing prices, hash the
+        material fields and look up stored listings (one query). URLs in claimed_urls
+        (being inserted by an earlier batch of the same job) count as duplicates; new
+        URLs are added to it. Returns the plan apply_upsert executes.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(listings)
+        for data in listings:
+            data["listing_url"] = self.canonical_url(str(data["listing_url"]))
+        unpriced = [data for data in listings if not data.get("price_numeric") and data.get("price_raw")]
+        for data, price in zip(unpriced, parse_prices([str(data["price_raw"]) for data in unpriced])):
+            if price:
+                data["price_numeric"] = price
+        hashes = [listing_content_hash(data) for data in listings]
+
+        existing = self.find_existing_urls(
+            [data["listing_url"] for data in listings], columns="id, listing_url, content_hash"
+        )
+        new: List[int] = []
+        compare: List[Tuple[int, str]] = []
+        touch_ids: List[str] = []
+        first_seen: Dict[str, int] = {}
+        for i, data in enumerate(listings):
+            url = data["listing_url"]
+            row = existing.get(url)
+            if url in first_seen:
+                results[i] = {"status": "duplicate", "error": f"Same URL as item {first_seen[url] + 1}"}
+            elif row is None and claimed_urls is not None and url in claimed_urls:
+                results[i] = {"status": "duplicate", "error": "Same URL as an earlier item"}
+            elif row is None:
+                new.append(i)
+                if claimed_urls is not None:
+                    claimed_urls.add(url)
+            elif not update_existing:
+                results[i] = {"status": "duplicate", "listing_id": row["id"]}
+            elif row.get("content_hash") == hashes[i]:
+                touch_ids.append(str(row["id"]))
+                results[i] = {"status": "unchanged", "listing_id": row["id"]}
+            else:
+                compare.append((i, str(row["id"])))
+            first_seen.setdefault(url, i)
+        return {
+            "listings": listings, "results": results, "hashes": hashes,
+            "new": new, "compare": compare, "touch_ids": touch_ids,
+        }
+
+    def apply_upsert(self, plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Second half of upsert_listings: write the changed fields of changed listings (one
+        statement, with a new property match for changed addresses), bump last_checked_at
+        of unchanged ones (one statement) and insert new ones (one statement). Returns one
+        result per planned listing.
+        """
+        listings, results, hashes = plan["listings"], plan["results"], plan["hashes"]
+        compare, touch_ids, new = plan["compare"], plan["touch_ids"], plan["new"]
+
+        if compare:
+            current: Dict[str, Dict[str, Any]] = {}
+            ids = [listing_id for _, listing_id in compare]
+            for start in range(0, len(ids), URL_LOOKUP_CHUNK):
+                response = (
+                    supabase.table("listings")
+                    .select("id, " + ", ".join(MATERIAL_FIELDS))
+                    .in_("id", ids[start:start + URL_LOOKUP_CHUNK])
+                    .execute()
+                )
+                for row in response.data if isinstance(response.data, list) else []:
+                    if isinstance(row, dict):
+                        current[str(row["id"])] = row
+            changes = []
+            moved: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+            for i, listing_id in compare:
+                stored = current.get(listing_id, {})
+                diff = {
+                    field: listings[i][field] for field in MATERIAL_FIELDS
+                    if field in listings[i] and _material_value(listings[i][field]) != _material_value(stored.get(field))
+                }
+                # A listing with no stored hash yet may not have changed: then only the hash is written
+                change = {"id": listing_id, "content_hash": hashes[i], **diff}
+                changes.append(change)
+                if any(field in diff for field in ADDRESS_FIELDS):
+                    moved.append((change, {**stored, **diff, "id": listing_id}))
+                results[i] = (
+                    {"status": "updated", "listing_id": listing_id, "changed_fields": sorted(diff)}
+                    if diff else {"status": "unchanged", "listing_id": listing_id}
+                )
+            if moved:
+                # Corrected addresses can belong to another property: match them again (one query)
+                matched = [listing for _, listing in moved]
+                property_matcher.assign_safely(matched)
+                for change, listing in moved:
+                    if "property_id" in listing:
+                        change["block_key"] = listing["block_key"]
+                        change["property_id"] = listing["property_id"]
+            try:
+                supabase.rpc("apply_listing_changes", {"p_changes": changes}).execute()
+            except Exception as e:
+                logger.error(f"Failed to apply changes to {len(changes)} listings: {e}")
+                for i, listing_id in compare:
+                    results[i] = {"status": "failed", "listing_id": listing_id, "error": f"Database error: {str(e)}"}
+
+        if touch_ids:
+            try:
+                supabase.rpc("touch_listings", {"p_ids": touch_ids}).execute()
+            except Exception as e:
+                # Only last_checked_at is stale; the listings themselves are current
+                logger.warning(f"Failed to bump last_checked_at for {len(touch_ids)} listings: {e}")
+
+        if new:
+            rows = [listings[i] for i in new]
+            property_matcher.assign_safely(rows)
+            for i in new:
+                listings[i]["content_hash"] = hashes[i]
+            for i, result in zip(new, self._insert_listings(rows)):
+                results[i] = result
+        return [result or {"status": "failed", "error": "Not processed"} for result in results]
+
+    def upsert_listings(self, listings: List[Dict[str, Any]], update_existing: bool = True) -> List[Dict[str, Any]]:
+        """
+        Insert new listings and refresh re-ingested ones (matched by canonical URL) in batches.
+        Re-ingested listings whose content_hash is unchanged only get last_checked_at bumped
+        (one statement); changed ones get only their changed material fields written (one
+        statement), and a new property match when their address changed. With
+        update_existing=False, existing listings are reported as duplicates.
+
+        Returns one result per input: {"status": created|updated|unchanged|duplicate|failed,
+        "listing_id", "changed_fields" (updated), "error" (failed/duplicate)}.
+        """
+        return self.apply_upsert(self.plan_upsert(listings, update_existing))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Listing totals, classified/unclassified and per-source counts (ingestion_stats rollup)."""
+        response = supabase.rpc("ingestion_stats", {}).execute()
+        return response.data if isinstance(response.data, dict) else {}
+
 ingestion_service = IngestionService()
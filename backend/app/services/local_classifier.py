@@ -0,0 +1,251 @@
+"""
+Local lightweight classifier trained from existing AI classifications.
+
+A TF-IDF + logistic regression model is fitted offline (scikit-learn, see
+backend/train_local_classifier.py) on `price_raw + description` using the
+GPT-4o labels already stored in `classifications`. The fitted weights are exported
+to a JSON file and scored here in pure Python, so the API needs no ML dependency
+and loads the model in milliseconds.
+
+ClassificationService uses it as a first pass (confident predictions skip the LLM)
+and as the fallback while the AI circuit is open.
+"""
+import json
+import math
+import os
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging_config import get_logger
+from app.models.classification import ClassificationStatus
+
+logger = get_logger(__name__)
+
+# Keep "£" as its own token; otherwise the scikit-learn default (2+ word characters)
+TOKEN_PATTERN = r"(?u)£|\b\w\w+\b"
+_TOKEN_RE = re.compile(TOKEN_PATTERN)
+NGRAM_RANGE = (1, 2)
+
+
+def build_text(description: str, price_text: str) -> str:
+    """Model input: price text first (most informative), then the description."""
+    return f"{price_text or ''} \n {description or ''}"
+
+
+def _ngrams(text: str) -> List[str]:
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams: List[str] = []
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return grams
+
+
+class LocalClassifier:
+    """Pure-Python scorer for an exported TF-IDF + logistic regression model."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.classes: List[str] = []
+        self.intercepts: List[float] = []
+        self.terms: Dict[str, List[float]] = {}  # term -> [idf, coef_class_0, coef_class_1, ...]
+        self.version: Optional[str] = None
+        self.report: Dict[str, Any] = {}
+        self._loaded_mtime: Optional[float] = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return bool(self.terms)
+
+    @property
+    def model_name(self) -> str:
+        return f"local-tfidf-{self.version}" if self.version else "local-tfidf"
+
+    def load(self) -> bool:
+        """(Re)load the model file if it exists and changed. Returns whether a model is available."""
+        if not settings.LOCAL_CLASSIFIER_ENABLED or not os.path.exists(self.path):
+            return self.is_loaded
+        mtime = os.path.getmtime(self.path)
+        if self._loaded_mtime == mtime:
+            return True
+        started = time.perf_counter()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.classes = list(data["classes"])
+            self.intercepts = [float(x) for x in data["intercepts"]]
+            self.terms = data["terms"]
+            self.version = data.get("version")
+            self.report = data.get("report", {})
+            self._loaded_mtime = mtime
+            logger.info(
+                f"Loaded local classifier {self.model_name} ({len(self.terms)} terms) "
+                f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        except Exception as e:
+            logger.error(f"Failed to load local classifier from {self.path}: {e}")
+        return self.is_loaded
+
+    def predict_proba(self, description: str, price_text: str) -> Optional[Dict[str, float]]:
+        """Class probabilities for one listing, or None when no model is loaded."""
+        if not self.is_loaded:
+            return None
+        counts = Counter(g for g in _ngrams(build_text(description, price_text)) if g in self.terms)
+        n_rows = len(self.intercepts)
+        scores = list(self.intercepts)
+        if counts:
+            # Sublinear tf * idf, L2-normalised (matches the TfidfVectorizer used for training)
+            weights = {term: (1.0 + math.log(count)) * self.terms[term][0] for term, count in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, weight in weights.items():
+                coefs = self.terms[term]
+                for k in range(n_rows):
+                    scores[k] += coefs[k + 1] * weight / norm
+
+        if n_rows == 1:
+            # Binary model: single decision function for classes[1]
+            p = 1.0 / (1.0 + math.exp(-scores[0]))
+            return {self.classes[0]: 1.0 - p, self.classes[1]: p}
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return {cls: e / total for cls, e in zip(self.classes, exps)}
+
+    def predict(self, description: str, price_text: str) -> Optional[Tuple[ClassificationStatus, float]]:
+        """Most likely status and its probability, or None when no model is loaded."""
+        proba = self.predict_proba(description, price_text)
+        if not proba:
+            return None
+        label = max(proba, key=lambda k: proba[k])
+        return ClassificationStatus(label), proba[label]
+
+
+def fetch_training_rows(min_label_confidence: int, page_size: int = 1000) -> List[Tuple[str, str]]:
+    """
+    Load (text, label) pairs from stored AI classifications, skipping low-confidence
+    labels and anything produced by the fallback or a previous local model.
+    """
+    from app.core.database import supabase
+
+    rows: List[Tuple[str, str]] = []
+    start = 0
+    while True:
+        response = (
+            supabase.table("classifications")
+            .select("status, confidence_score, ai_model_used, listings(price_raw, description)")
+            .gte("confidence_score", min_label_confidence)
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+        )
+        page = response.data if isinstance(response.data, list) else []
+        for item in page:
+            if not isinstance(item, dict):
+                continue
+            model_used = str(item.get("ai_model_used") or "")
+            if model_used.startswith("local-") or model_used.startswith("rules-"):
+                continue
+            listing = item.get("listings")
+            if isinstance(listing, list):
+                listing = listing[0] if listing else None
+            if not isinstance(listing, dict) or item.get("status") not in [s.value for s in ClassificationStatus]:
+                continue
+            rows.append((build_text(str(listing.get("description") or ""), str(listing.get("price_raw") or "")), str(item["status"])))
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+def train_local_classifier(
+    rows: List[Tuple[str, str]],
+    test_size: float = 0.2,
+    threshold: float = 0.9,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """
+    Fit TF-IDF + logistic regression on (text, label) rows and evaluate on a held-out
+    split against the LLM labels. Returns the exportable model dict (with its report).
+    Requires scikit-learn (training only).
+    """
+    try:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+    except ImportError as e:
+        raise RuntimeError("scikit-learn is required to train the local classifier: pip install -r requirements-train.txt") from e
+
+    if len({label for _, label in rows}) < 2:
+        raise ValueError("Need labelled examples from at least two classes to train")
+
+    shuffled = list(rows)
+    random.Random(seed).shuffle(shuffled)
+    split = max(1, int(len(shuffled) * test_size))
+    test, train = shuffled[:split], shuffled[split:]
+
+    vectorizer = TfidfVectorizer(
+        token_pattern=TOKEN_PATTERN, ngram_range=NGRAM_RANGE, sublinear_tf=True, min_df=2, max_features=20000
+    )
+    x_train = vectorizer.fit_transform([text for text, _ in train])
+    y_train = [label for _, label in train]
+    model = LogisticRegression(max_iter=2000, C=4.0, class_weight="balanced")
+    model.fit(x_train, y_train)
+
+    x_test = vectorizer.transform([text for text, _ in test])
+    y_test = [label for _, label in test]
+    predicted = model.predict(x_test)
+    probabilities = model.predict_proba(x_test).max(axis=1)
+    confident = [i for i, p in enumerate(probabilities) if p >= threshold]
+    classes = [str(c) for c in model.classes_]
+
+    report = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "train_size": len(train),
+        "test_size": len(test),
+        "label_distribution": dict(Counter(label for _, label in rows)),
+        "accuracy": round(float(accuracy_score(y_test, predicted)), 4),
+        "per_class": {
+            cls: {k: round(float(v), 4) for k, v in metrics.items()}
+            for cls, metrics in classification_report(y_test, predicted, output_dict=True, zero_division=0).items()
+            if cls in classes
+        },
+        "confusion_matrix": {
+            "labels": classes,
+            "matrix": confusion_matrix(y_test, predicted, labels=classes).tolist(),
+        },
+        # How many LLM calls the first pass would skip at this threshold, and how accurately
+        "threshold": threshold,
+        "coverage_at_threshold": round(len(confident) / len(test), 4) if test else 0,
+        "accuracy_at_threshold": round(
+            sum(1 for i in confident if predicted[i] == y_test[i]) / len(confident), 4
+        ) if confident else None,
+    }
+
+    idf = vectorizer.idf_
+    coef = model.coef_
+    terms = {
+        term: [round(float(idf[index]), 6)] + [round(float(coef[k][index]), 6) for k in range(coef.shape[0])]
+        for term, index in vectorizer.vocabulary_.items()
+    }
+    return {
+        "version": datetime.now(timezone.utc).strftime("%Y%m%d%H%M"),
+        "token_pattern": TOKEN_PATTERN,
+        "ngram_range": list(NGRAM_RANGE),
+        "classes": classes,
+        "intercepts": [round(float(x), 6) for x in model.intercept_],
+        "terms": terms,
+        "report": report,
+    }
+
+
+def save_model(model: Dict[str, Any], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(model, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+local_classifier = LocalClassifier(settings.LOCAL_CLASSIFIER_PATH)
@@ -0,0 +1,81 @@
+"""
+Asking price extraction from listing price text.
+
+Compiled patterns describe a price: optional currency, a number with optional
+thousands separators (commas or single spaces, "£250 000") and decimals, and an optional multiplier suffix ("k", "m",
+"million", "thousand") that must be attached to that number. The first amount
+with a currency sign wins; without one, the first bare number that is plausibly
+a price (>= 1,000 or with a suffix) is used, so "3 bed" or "Flat 2/1" are not
+prices.
+
+parse_prices() parses many strings in one call (bulk ingestion and backfills),
+each distinct string once. That only pays off when strings repeat ("POA",
+"Offers over £250,000"): on distinct strings it is no faster than calling
+parse_price per string, and neither was joining the strings for a single regex
+pass (see benchmarks/run_price_parser_benchmark.py).
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+_AMOUNT = r"""
+    (?P<number>\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d{1,3}(?:[ ]\d{3})+\b(?:\.\d+)?|\d+(?:\.\d+)?)
+    (?:\s?(?P<suffix>k|m|mil|million|thousand)\b)?
+"""
+_CURRENCY = r"(?:£|\bgbp)\s?"
+_FLAGS = re.IGNORECASE | re.VERBOSE
+
+# Any amount, with or without currency
+AMOUNT_PATTERN = re.compile(_AMOUNT, _FLAGS)
+# First amount with a currency sign
+CURRENCY_AMOUNT_PATTERN = re.compile(_CURRENCY + _AMOUNT, _FLAGS)
+
+MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "m": 1_000_000, "mil": 1_000_000, "million": 1_000_000}
+# Bare numbers below this (bedrooms, flat positions, floors) are not prices
+MIN_BARE_PRICE = 1_000
+
+
+def _amount(match: "re.Match[str]") -> float:
+    value = float(match.group("number").replace(",", "").replace(" ", ""))
+    suffix = match.group("suffix")
+    return value * MULTIPLIERS[suffix.lower()] if suffix else value
+
+
+def _bare_price(price_text: str) -> Optional[float]:
+    for match in AMOUNT_PATTERN.finditer(price_text):
+        value = _amount(match)
+        if match.group("suffix") or value >= MIN_BARE_PRICE:
+            return value
+    return None
+
+
+def _parse_price(price_text: Optional[str]) -> Optional[float]:
+    if not price_text:
+        return None
+    match = CURRENCY_AMOUNT_PATTERN.search(price_text)
+    if match:
+        return _amount(match)
+    return _bare_price(price_text)
+
+
+@lru_cache(maxsize=4096)
+def parse_price(price_text: Optional[str]) -> Optional[float]:
+    """
+    Numeric asking price from text like "Fixed Price £250,000", "Offers Over £180k"
+    or "OIRO £1.2m". Returns None when the text has no price ("POA").
+    """
+    return _parse_price(price_text)
+
+
+def parse_prices(texts: Iterable[Optional[str]]) -> List[Optional[float]]:
+    """
+    parse_price for many strings at once. Repeated strings ("POA", "Offers over £250,000")
+    are parsed once, which is where it wins; distinct strings cost the same as parse_price.
+    """
+    parsed: Dict[Optional[str], Optional[float]] = {}
+    prices: List[Optional[float]] = []
+    for text in texts:
+        if text not in parsed:
+            parsed[text] = _parse_price(text)
+        prices.append(parsed[text])
+    return prices
@@ -0,0 +1,107 @@
+"""
+In-process publish/subscribe for live job progress (Server-Sent Events).
+
+Long-running jobs (streamed batch classification, reclassification runs)
+publish events to a channel; SSE endpoints subscribe and forward them. Each
+subscriber has a bounded queue: a slow client loses its oldest events rather
+than growing memory. The latest progress event is replayed to new subscribers.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, Set
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Events replayed to late subscribers so they start with current counts
+SNAPSHOT_EVENTS = ("start", "progress")
+_CLOSED = object()
+
+
+def format_sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class ProgressBroker:
+    def __init__(self, max_queue: int = 500, keepalive_seconds: float = 15.0):
+        self.max_queue = max_queue
+        self.keepalive_seconds = keepalive_seconds
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._jobs: Set[asyncio.Task] = set()
+
+    def has_channel(self, channel: str) -> bool:
+        return channel in self._latest or bool(self._subscribers.get(channel))
+
+    def publish(self, channel: str, event: str, data: Any) -> None:
+        message = {"event": event, "data": data}
+        if event in SNAPSHOT_EVENTS:
+            self._latest[channel] = message
+        for queue in self._subscribers.get(channel, ()):
+            self._put(queue, message)
+
+    def close(self, channel: str, data: Any = None) -> None:
+        """Send a final "end" event and end every subscription to the channel."""
+        self.publish(channel, "end", data)
+        self._latest.pop(channel, None)
+        for queue in self._subscribers.get(channel, ()):
+            self._put(queue, _CLOSED)
+
+    def _put(self, queue: asyncio.Queue, message: Any) -> None:
+        if queue.full():
+            # Slow consumer: drop its oldest event
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        """Register a subscriber now (before the job starts) so no event is missed."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        latest = self._latest.get(channel)
+        if latest:
+            queue.put_nowait(latest)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            self._subscribers.pop(channel, None)
+
+    async def listen(self, channel: str, queue: asyncio.Queue) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield events until the channel closes. Yields None after keepalive_seconds
+        without events so the caller can send a keep-alive or poll other state.
+        """
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if message is _CLOSED:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(channel, queue)
+
+    def run(self, channel: str, job: Awaitable[Any]) -> asyncio.Task:
+        """Run a job in the background; failures are published as an "error" event."""
+        async def wrapper():
+            try:
+                await job
+            except Exception as e:
+                logger.error(f"Job {channel} failed: {e}")
+                self.publish(channel, "error", {"error": str(e)})
+                self.close(channel, {"status": "failed"})
+
+        task = asyncio.get_running_loop().create_task(wrapper())
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+        return task
+
+
+progress_broker = ProgressBroker()
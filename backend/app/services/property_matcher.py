@@ -0,0 +1,203 @@
+"""
+Cross-portal property matching.
+
+The same property is often listed on Rightmove, Zoopla, ESPC and S1homes with
+differently written addresses. Listings of one property share a property_id:
+
+1. Blocking: block_key is the normalised full postcode plus the street number,
+   stored on listings and indexed (migrations/008), so the candidates for a new
+   listing come from one indexed lookup returning a handful of rows.
+2. Matching: candidates in the block are scored on normalised address similarity
+   (flat designators must agree) and asking price. The best candidate at or above
+   PROPERTY_MATCH_THRESHOLD gives its property_id; otherwise a new one is created.
+"""
+import re
+import unicodedata
+import uuid
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.database import supabase
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+POSTCODE_PATTERN = re.compile(r"\b([A-Z]{1,2}\d[A-Z\d]?)\s*(\d[A-Z]{2})\b")
+# Address words written differently across portals
+ABBREVIATIONS = {
+    "street": "st", "road": "rd", "avenue": "ave", "drive": "dr", "crescent": "cres", "terrace": "ter",
+    "gardens": "gdns", "place": "pl", "court": "ct", "square": "sq", "lane": "ln", "grove": "gr",
+    "park": "pk", "north": "n", "south": "s", "east": "e", "west": "w",
+    "apartment": "flat", "apt": "flat", "and": "&",
+}
+# Scottish flat positions: "3F2" (third floor, flat 2) and "2/1" (second floor, first flat)
+FLAT_POSITION_PATTERN = re.compile(r"^(\d+f\d+|\d+/\d+|gf\d*|bf\d*)$")
+NUMBER_PATTERN = re.compile(r"^\d+[a-z]?$")
+# Candidates read per block (a block is one postcode and street number)
+MAX_BLOCK_CANDIDATES = 50
+
+
+def normalize_postcode(value: Optional[str]) -> Optional[str]:
+    """Full UK postcode as "EH9 1AA", or None when the value has no full postcode."""
+    match = POSTCODE_PATTERN.search((value or "").upper())
+    return f"{match.group(1)} {match.group(2)}" if match else None
+
+
+def normalize_address(address: Optional[str]) -> str:
+    """Lower-case address tokens with the postcode and punctuation removed and common words abbreviated."""
+    text = unicodedata.normalize("NFKC", address or "")
+    text = POSTCODE_PATTERN.sub(" ", text.upper()).lower()
+    tokens = re.findall(r"[a-z0-9/&]+", text)
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def address_parts(normalized: str) -> Tuple[Optional[str], Optional[str]]:
+    """(street number, flat designator) of a normalised address."""
+    tokens = normalized.split()
+    number: Optional[str] = None
+    flat: Optional[str] = None
+    for i, token in enumerate(tokens):
+        previous = tokens[i - 1] if i else ""
+        following = tokens[i + 1] if i + 1 < len(tokens) else ""
+        if previous == "flat":
+            flat = token
+        elif FLAT_POSITION_PATTERN.match(token):
+            if "/" in token and number is None and following.isalpha():
+                # Edinburgh style "12/6 Marchmont Rd": number 12, flat 6
+                number, flat = token.split("/", 1)
+            else:
+                flat = token
+        elif number is None and NUMBER_PATTERN.match(token) and (following.isalpha() or not following):
+            number = token
+    return number, flat
+
+
+def block_key(address: Optional[str], postcode: Optional[str]) -> Optional[str]:
+    """Blocking key (full postcode + street number), or None when either is missing."""
+    full_postcode = normalize_postcode(postcode) or normalize_postcode(address)
+    number, _ = address_parts(normalize_address(address))
+    if not full_postcode or not number:
+        return None
+    return f"{full_postcode.replace(' ', '')}:{number}"
+
+
+def address_similarity(a: str, b: str) -> float:
+    """Similarity of two normalised addresses, ignoring token order."""
+    return SequenceMatcher(None, " ".join(sorted(a.split())), " ".join(sorted(b.split()))).ratio()
+
+
+def match_score(listing: Dict[str, Any], candidate: Dict[str, Any]) -> float:
+    """0-1 likelihood that two listings in the same block are the same property."""
+    address_a = normalize_address(listing.get("address"))
+    address_b = normalize_address(candidate.get("address"))
+    flat_a, flat_b = address_parts(address_a)[1], address_parts(address_b)[1]
+    if flat_a and flat_b and flat_a != flat_b:
+        return 0.0
+
+    price_a, price_b = listing.get("price_numeric"), candidate.get("price_numeric")
+    if price_a and price_b:
+        difference = abs(float(price_a) - float(price_b)) / max(float(price_a), float(price_b))
+        price_score = max(0.0, 1.0 - difference / 0.2)
+    else:
+        price_score = 0.5
+    return 0.8 * address_similarity(address_a, address_b) + 0.2 * price_score
+
+
+def _listed_order(listing: Dict[str, Any]) -> Tuple[datetime, str]:
+    """Sort key for which of a property's listings came first: (created_at, id)."""
+    try:
+        created = datetime.fromisoformat(str(listing.get("created_at")))
+    except ValueError:
+        # Unknown creation time: never counts as the earlier listing
+        created = datetime.max.replace(tzinfo=timezone.utc)
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return created, str(listing.get("id"))
+
+
+class PropertyMatcher:
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def _fetch_blocks(self, keys: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Listings already in the given blocks, in one indexed query."""
+        response = (
+            supabase.table("listings")
+            .select("id, property_id, block_key, address, price_numeric")
+            .in_("block_key", keys)
+            .not_.is_("property_id", "null")
+            .limit(MAX_BLOCK_CANDIDATES * len(keys))
+            .execute()
+        )
+        blocks: Dict[str, List[Dict[str, Any]]] = {}
+        for row in response.data if isinstance(response.data, list) else []:
+            if isinstance(row, dict) and row.get("block_key"):
+                blocks.setdefault(row["block_key"], []).append(row)
+        return blocks
+
+    def assign(self, listings: List[Dict[str, Any]]) -> int:
+        """
+        Set block_key and property_id on listing dicts (before insert or on address
+        change). Listings in the same batch can match each other. Returns how many
+        joined an existing property.
+        """
+        keys = []
+        for listing in listings:
+            listing["block_key"] = block_key(listing.get("address"), listing.get("postcode"))
+            if listing["block_key"]:
+                keys.append(listing["block_key"])
+        blocks = self._fetch_blocks(list(dict.fromkeys(keys))) if keys else {}
+
+        matched = 0
+        for listing in listings:
+            key = listing["block_key"]
+            best: Optional[Dict[str, Any]] = None
+            best_score = self.threshold
+            for candidate in blocks.get(key, []) if key else []:
+                if listing.get("id") and str(candidate.get("id")) == str(listing["id"]):
+                    continue
+                score = match_score(listing, candidate)
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is not None:
+                listing["property_id"] = str(best["property_id"])
+                matched += 1
+            else:
+                listing["property_id"] = str(uuid.uuid4())
+            if key:
+                blocks.setdefault(key, []).append(listing)
+        return matched
+
+    def assign_safely(self, listings: List[Dict[str, Any]]) -> None:
+        """assign(), but a matching failure never blocks ingestion (listings stay unclustered)."""
+        try:
+            self.assign(listings)
+        except Exception as e:
+            logger.warning(f"Property matching failed for {len(listings)} listings: {e}")
+            for listing in listings:
+                listing.pop("block_key", None)
+                listing.pop("property_id", None)
+
+    def has_other_listings(self, listing: Dict[str, Any]) -> bool:
+        """
+        Whether the listing's property was already actively listed before it (e.g. on
+        another portal). Listings created together are ordered by (created_at, id), so
+        of several new listings of one property exactly one counts as the first.
+        """
+        if not listing.get("property_id"):
+            return False
+        response = (
+            supabase.table("listings")
+            .select("id, created_at")
+            .eq("property_id", str(listing["property_id"]))
+            .neq("id", str(listing.get("id")))
+            .eq("is_active", True)
+            .execute()
+        )
+        rows = response.data if isinstance(response.data, list) else []
+        own_key = _listed_order(listing)
+        return any(_listed_order(row) < own_key for row in rows if isinstance(row, dict))
+
+
+property_matcher = PropertyMatcher(threshold=settings.PROPERTY_MATCH_THRESHOLD)
@@ -0,0 +1,183 @@
+"""
+Proactive rate limiting for OpenAI requests.
+
+Classification calls are paced against the configured requests-per-minute (RPM)
+and tokens-per-minute (TPM) budgets before they are sent, so batch jobs and
+concurrent workers no longer stampede the quota and back off together on 429s.
+
+Bucket state is kept in a small SQLite file so every worker process on the host
+draws from the same budget.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+from typing import Optional
+from app.core.config import settings
+from app.core.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Rough characters-per-token ratio for English text with the GPT-4o tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap prompt token estimate (no tokenizer dependency).
+    Slightly over-estimates for typical listing text, which is the safe direction.
+    """
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class LLMRateLimiter:
+    """
+    Two token buckets (requests and tokens) shared through SQLite.
+
+    Each call reserves one request and its estimated tokens immediately, letting the
+    bucket go into debt; the caller then sleeps until the debt would have refilled.
+    This keeps callers in arrival order across processes with a single short
+    transaction per call instead of polling.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        db_path: str,
+        bucket_name: str = "openai",
+    ):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.db_path = db_path
+        self.bucket_name = bucket_name
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        # isolation_level=None: we manage transactions explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=10.0, isolation_level=None)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    name TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._initialized = True
+        return conn
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        Refill both buckets, deduct one request and `tokens`, and return how long the
+        caller must wait (seconds) before sending.
+        """
+        rpm = float(self.requests_per_minute)
+        tpm = float(self.tokens_per_minute)
+        # A single oversized prompt must not wait forever
+        cost = float(min(tokens, self.tokens_per_minute)) if tpm > 0 else 0.0
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT requests, tokens, updated_at FROM rate_limit_buckets WHERE name = ?",
+                (self.bucket_name,),
+            ).fetchone()
+            if row is None:
+                requests_left, tokens_left = rpm, tpm
+            else:
+                elapsed = max(0.0, now - row[2])
+                requests_left = min(rpm, row[0] + elapsed * rpm / 60.0)
+                tokens_left = min(tpm, row[1] + elapsed * tpm / 60.0)
+
+            if rpm > 0:
+                requests_left -= 1.0
+            tokens_left -= cost
+
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limit_buckets (name, requests, tokens, updated_at) VALUES (?, ?, ?, ?)",
+                (self.bucket_name, requests_left, tokens_left, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        wait = 0.0
+        if rpm > 0 and requests_left < 0:
+            wait = max(wait, -requests_left * 60.0 / rpm)
+        if tpm > 0 and tokens_left < 0:
+            wait = max(wait, -tokens_left * 60.0 / tpm)
+        return wait
+
+    def _adjust_tokens(self, delta: float) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE rate_limit_buckets SET tokens = MIN(?, tokens + ?) WHERE name = ?",
+                (float(self.tokens_per_minute), delta, self.bucket_name),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """
+        Reserve budget for one request and sleep until it may be sent.
+        Returns the time spent waiting. Fails open (no wait) if the store is unavailable.
+        """
+        if not self.enabled:
+            return 0.0
+        try:
+            wait = await asyncio.to_thread(self._reserve, estimated_tokens)
+        except Exception as e:
+            logger.warning(f"Rate limiter store unavailable, sending without pacing: {e}")
+            return 0.0
+        if wait > 0:
+            logger.debug(f"Rate limiter pacing OpenAI request for {wait:.2f}s ({estimated_tokens} est. tokens)")
+            await asyncio.sleep(wait)
+        return wait
+
+    async def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]) -> None:
+        """
+        Reconcile the token bucket with the usage the API actually reported,
+        crediting over-estimates back and charging under-estimates.
+        """
+        if self.tokens_per_minute <= 0 or actual_tokens is None:
+            return
+        delta = float(estimated_tokens - actual_tokens)
+        if delta == 0:
+            return
+        try:
+            await asyncio.to_thread(self._adjust_tokens, delta)
+        except Exception as e:
+            logger.warning(f"Failed to reconcile rate limiter token usage: {e}")
+
+
+llm_rate_limiter = LLMRateLimiter(
+    requests_per_minute=settings.OPENAI_RPM_LIMIT,
+    tokens_per_minute=settings.OPENAI_TPM_LIMIT,
+    db_path=settings.OPENAI_RATE_LIMIT_DB_PATH,
+)
@@ -0,0 +1,234 @@
+"""
+Change-triggered reclassification queue.
+
+Listing updates and ingestion jobs enqueue a listing only when it is new or its
+classification inputs changed (see classification_input_hash). Requests are coalesced per listing and drained
+shortly after the first one arrives, so a burst of edits to the same listing
+costs one classification of its final text, and edits that end up back at the
+already-classified text cost none. A listing whose text matches a classified
+listing of the same property (the same advert on another portal, see
+property_matcher) copies that classification instead of calling the model; so
+does a listing created through the API or manual ingestion (classify_new).
+"""
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+from app.core.config import settings
+from app.core.database import supabase
+from app.core.logging_config import get_logger
+from app.models.classification import ClassificationOutcome
+from app.services.classification_service import classification_service, classification_input_hash, PROMPT_VERSION
+
+logger = get_logger(__name__)
+
+
+class ReclassificationQueue:
+    def __init__(self, delay: float, batch_size: int, max_attempts: int):
+        self.delay = delay
+        self.batch_size = max(1, batch_size)
+        self.max_attempts = max(1, max_attempts)
+        self._pending: Set[str] = set()
+        self._attempts: Dict[str, int] = {}  # failed attempts of listings being retried
+        self._drain_task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.coalesced = 0
+        self.skipped_unchanged = 0
+        self.reclassified = 0
+        self.copied_from_same_property = 0
+        self.retried = 0
+        self.failed = 0
+
+    def enqueue(self, listing_id: str) -> None:
+        """Queue a listing for reclassification; repeated requests before the drain are merged."""
+        listing_id = str(listing_id)
+        if listing_id in self._pending:
+            self.coalesced += 1
+            return
+        self._pending.add(listing_id)
+        self.enqueued += 1
+        self._schedule_drain()
+
+    def _schedule_drain(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._drain_task is None or self._drain_task.done() or self._drain_task is asyncio.current_task():
+            self._drain_task = loop.create_task(self._drain_later())
+
+    async def _drain_later(self) -> None:
+        await asyncio.sleep(self.delay)
+        await self.drain()
+
+    def _load_changed(self, listing_ids: List[str]) -> List[Dict]:
+        """Current text of the listings whose stored classification is for different input."""
+        response = (
+            supabase.table("listings")
+            .select("id, property_id, description, price_raw, classifications(input_hash)")
+            .in_("id", listing_ids)
+            .execute()
+        )
+        changed = []
+        for listing in response.data if isinstance(response.data, list) else []:
+            if not isinstance(listing, dict) or not listing.get("id"):
+                continue
+            classification = listing.pop("classifications", None)
+            if isinstance(classification, list):
+                classification = classification[0] if classification else None
+            stored_hash = classification.get("input_hash") if isinstance(classification, dict) else None
+            if stored_hash == classification_input_hash(listing.get("description"), listing.get("price_raw")):
+                self.skipped_unchanged += 1
+                continue
+            changed.append(listing)
+        return self.copy_same_property(changed)
+
+    def copy_same_property(self, listings: List[Dict]) -> List[Dict]:
+        """
+        Copy current-prompt classifications of identical text from other listings of the
+        same property (one query, one upsert). Returns the listings that still need the model.
+        """
+        copies = self._copy_classifications(listings)
+        return [listing for listing in listings if str(listing["id"]) not in copies]
+
+    def _copy_classifications(self, listings: List[Dict]) -> Dict[str, Dict]:
+        """The copying step of _load_changed, returning the stored copies by listing id."""
+        clustered = {
+            (str(listing["property_id"]), classification_input_hash(listing.get("description"), listing.get("price_raw"))): listing
+            for listing in listings if listing.get("property_id")
+        }
+        if not clustered:
+            return {}
+        response = (
+            supabase.table("classifications")
+            .select("listing_id, status, confidence_score, classification_reason, ai_model_used, input_hash, listings!inner(property_id)")
+            .in_("input_hash", list({input_hash for _, input_hash in clustered}))
+            .in_("listings.property_id", list({property_id for property_id, _ in clustered}))
+            .eq("prompt_version", PROMPT_VERSION)
+            .execute()
+        )
+        copies: Dict[str, Dict] = {}
+        for row in response.data if isinstance(response.data, list) else []:
+            if not isinstance(row, dict):
+                continue
+            owner = row.get("listings")
+            if isinstance(owner, list):
+                owner = owner[0] if owner else None
+            listing = clustered.get((str((owner or {}).get("property_id")), row.get("input_hash")))
+            if listing is None or str(row.get("listing_id")) == str(listing["id"]) or str(listing["id"]) in copies:
+                continue
+            copies[str(listing["id"])] = {
+                "listing_id": str(listing["id"]),
+                "status": row["status"],
+                "confidence_score": row["confidence_score"],
+                "classification_reason": row.get("classification_reason"),
+                "ai_model_used": row.get("ai_model_used"),
+                "prompt_version": PROMPT_VERSION,
+                "input_hash": row["input_hash"],
+                "classified_at": datetime.now(timezone.utc).isoformat()
+            }
+        if not copies:
+            return {}
+        supabase.table("classifications").upsert(list(copies.values()), on_conflict="listing_id").execute()
+        self.copied_from_same_property += len(copies)
+        return copies
+
+    async def classify_new(self, listing: Dict) -> ClassificationOutcome:
+        """
+        Classify and store a just-created listing. A same-property classification of
+        identical text is copied instead of calling the model; a failed call is not
+        stored and the listing is queued for the next drain.
+        """
+        listing_id = str(listing["id"])
+        copied = (await asyncio.to_thread(self._copy_classifications, [listing])).get(listing_id)
+        if copied:
+            return ClassificationOutcome(
+                status=copied["status"],
+                confidence_score=copied["confidence_score"],
+                reason=copied.get("classification_reason") or "",
+                model=copied.get("ai_model_used") or ""
+            )
+        outcome = await classification_service.classify(
+            str(listing.get("description") or ""),
+            str(listing.get("price_raw") or ""),
+            listing_id=listing_id
+        )
+        await asyncio.to_thread(classification_service.save_outcomes, {listing_id: outcome}, [listing])
+        if outcome.error:
+            self.enqueue(listing_id)
+        return outcome
+
+    async def drain(self) -> None:
+        """
+        Classify every pending listing, batch_size at a time, saving each round in one upsert.
+        Listings that fail are queued again for the next drain, up to max_attempts times.
+        """
+        failed: List[str] = []
+        while self._pending:
+            listing_ids = list(itertools.islice(self._pending, self.batch_size))
+            self._pending.difference_update(listing_ids)
+            try:
+                listings = await asyncio.to_thread(self._load_changed, listing_ids)
+                if not listings:
+                    self._forget(listing_ids)
+                    continue
+                classified, _ = await classification_service.classify_many(listings)
+                # Error outcomes are not saved (save_outcomes skips them) and go back on the queue
+                await asyncio.to_thread(classification_service.save_outcomes, classified, listings)
+                retry = [
+                    str(listing["id"]) for listing in listings
+                    if str(listing["id"]) not in classified or classified[str(listing["id"])].error
+                ]
+                self.reclassified += len(listings) - len(retry)
+                logger.info(f"Reclassified {len(listings) - len(retry)} updated listings")
+                self._forget([listing_id for listing_id in listing_ids if listing_id not in retry])
+                failed.extend(retry)
+            except Exception as e:
+                logger.error(f"Failed to reclassify {len(listing_ids)} updated listings: {e}")
+                failed.extend(listing_ids)
+        if failed:
+            self._retry(failed)
+
+    def _forget(self, listing_ids: List[str]) -> None:
+        for listing_id in listing_ids:
+            self._attempts.pop(listing_id, None)
+
+    def _retry(self, listing_ids: List[str]) -> None:
+        """Queue failed listings for the next drain (not this one), dropping those out of attempts."""
+        retry = []
+        for listing_id in listing_ids:
+            attempts = self._attempts.get(listing_id, 0) + 1
+            if attempts >= self.max_attempts:
+                self._attempts.pop(listing_id, None)
+                self.failed += 1
+                continue
+            self._attempts[listing_id] = attempts
+            retry.append(listing_id)
+        if len(retry) < len(listing_ids):
+            logger.error(
+                f"Gave up reclassifying {len(listing_ids) - len(retry)} listings after {self.max_attempts} attempts"
+            )
+        if not retry:
+            return
+        self._pending.update(retry)
+        self.retried += len(retry)
+        self._schedule_drain()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "skipped_unchanged": self.skipped_unchanged,
+            "reclassified": self.reclassified,
+            "copied_from_same_property": self.copied_from_same_property,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+reclassification_queue = ReclassificationQueue(
+    delay=settings.RECLASSIFY_ON_UPDATE_DELAY_SECONDS,
+    batch_size=settings.RECLASSIFY_DRAIN_BATCH_SIZE,
+    max_attempts=settings.RECLASSIFY_MAX_ATTEMPTS
+)
@@ -0,0 +1,308 @@
+"""
+Background reclassification runs.
+
+A run walks the active listings matching its filter in id order, classifying and
+saving them one chunk at a time and checkpointing the last listing id after every
+chunk, so a run can be paused, resumed, cancelled, and survives timeouts and
+restarts. Runs are stored in `reclassification_runs` (migrations/003).
+
+A worker only processes a run while it holds the run's lease (worker_id plus a
+heartbeat refreshed every chunk); runs whose lease has expired are picked up by
+the watchdog started in the application lifespan.
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+from app.core.database import supabase
+from app.core.logging_config import get_logger
+from app.services.classification_service import classification_service, PROMPT_VERSION
+from app.services.progress_broker import progress_broker
+
+logger = get_logger(__name__)
+
+RUN_FILTERS = ("all", "unclassified", "low_confidence", "stale_prompt")
+# Runs that are not being processed (no further events will be published)
+FINISHED_STATUSES = ("paused", "cancelled", "completed", "failed")
+
+
+def run_channel(run_id: str) -> str:
+    return f"run:{run_id}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _timestamp(value: datetime) -> str:
+    # No "+00:00" offset: the value is also used inside PostgREST or() filters
+    return value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class ReclassificationService:
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def _get_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        response = supabase.table("reclassification_runs").select("*").eq("id", run_id).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return rows[0] if rows and isinstance(rows[0], dict) else None
+
+    def _update_run(self, run_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        fields = {**fields, "updated_at": _timestamp(_now())}
+        response = supabase.table("reclassification_runs").update(fields).eq("id", run_id).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return rows[0] if rows and isinstance(rows[0], dict) else None
+
+    def _claim(self, run_id: str) -> bool:
+        """Take (or keep) the lease on a running run. False if another live worker holds it."""
+        now = _now()
+        expired = _timestamp(now - timedelta(seconds=settings.RECLASSIFICATION_LEASE_SECONDS))
+        response = (
+            supabase.table("reclassification_runs")
+            .update({"worker_id": self.worker_id, "heartbeat_at": _timestamp(now), "updated_at": _timestamp(now)})
+            .eq("id", run_id)
+            .eq("status", "running")
+            .or_(f"worker_id.eq.{self.worker_id},heartbeat_at.is.null,heartbeat_at.lt.{expired}")
+            .execute()
+        )
+        return bool(response.data)
+
+    def _fetch_candidates(self, run: Dict[str, Any]) -> List[Dict[str, Any]]:
+        response = supabase.rpc("reclassification_candidates", {
+            "p_filter": run["filter"],
+            "p_after": run.get("cursor_listing_id"),
+            "p_limit": settings.RECLASSIFICATION_CHUNK_SIZE,
+            "p_min_confidence": run["min_confidence"],
+            "p_prompt_version": run["prompt_version"],
+            "p_model": run.get("model")
+        }).execute()
+        rows = response.data if isinstance(response.data, list) else []
+        return [row for row in rows if isinstance(row, dict) and row.get("id")]
+
+    def create_run(
+        self,
+        filter: str,
+        batch_size: int = 1,
+        min_confidence: int = 70,
+        created_by: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Create a run (status running, owned by this worker) and start processing it."""
+        if filter not in RUN_FILTERS:
+            raise ValueError(f"Unknown filter '{filter}'. Expected one of: {', '.join(RUN_FILTERS)}")
+        total = supabase.rpc("reclassification_candidate_count", {
+            "p_filter": filter,
+            "p_min_confidence": min_confidence,
+            "p_prompt_version": PROMPT_VERSION,
+            "p_model": classification_service.model
+        }).execute().data
+        response = supabase.table("reclassification_runs").insert({
+            "filter": filter,
+            "min_confidence": min_confidence,
+            "prompt_version": PROMPT_VERSION,
+            "model": classification_service.model,
+            "batch_size": batch_size,
+            "total": total if isinstance(total, int) else 0,
+            "worker_id": self.worker_id,
+            "heartbeat_at": _timestamp(_now()),
+            "created_by": created_by
+        }).execute()
+        if not response.data or not isinstance(response.data[0], dict):
+            raise RuntimeError("Failed to create reclassification run")
+        run = response.data[0]
+        self._start(str(run["id"]))
+        return run
+
+    def _start(self, run_id: str) -> None:
+        task = self._tasks.get(run_id)
+        if task is not None and not task.done():
+            return
+        self._tasks[run_id] = asyncio.get_running_loop().create_task(self._process(run_id))
+
+    async def _process(self, run_id: str) -> None:
+        """
+        Classify chunk after chunk, checkpointing the cursor, until done, paused or cancelled.
+        Per-listing results and per-chunk progress are published to channel "run:<id>".
+        """
+        channel = run_channel(run_id)
+
+        def publish_result(listing_id: str, outcome: Any) -> None:
+            progress_broker.publish(channel, "result", {
+                "listing_id": listing_id,
+                "status": outcome.status.value,
+                "confidence_score": outcome.confidence_score,
+                "model": outcome.model
+            })
+
+        try:
+            while True:
+                # Status changes (pause/cancel) from any worker take effect at the next chunk
+                if not await asyncio.to_thread(self._claim, run_id):
+                    return
+                run = await asyncio.to_thread(self._get_run, run_id)
+                if not run:
+                    return
+
+                started = time.perf_counter()
+                listings = await asyncio.to_thread(self._fetch_candidates, run)
+                if not listings:
+                    await asyncio.to_thread(self._update_run, run_id, {
+                        "status": "completed", "finished_at": _timestamp(_now())
+                    })
+                    logger.info(f"Reclassification run {run_id} completed: {run['processed']} listings")
+                    return
+
+                classified, _ = await classification_service.classify_many(
+                    listings, run["batch_size"], on_result=publish_result
+                )
+                await asyncio.to_thread(classification_service.save_outcomes, classified, listings)
+                # Error outcomes are not saved: those listings keep their previous classification
+                failed = sum(1 for outcome in classified.values() if outcome.error)
+
+                updated = await asyncio.to_thread(self._update_run, run_id, {
+                    "cursor_listing_id": str(listings[-1]["id"]),
+                    "processed": run["processed"] + len(listings),
+                    "succeeded": run["succeeded"] + len(classified) - failed,
+                    "failed": run["failed"] + len(listings) - len(classified) + failed,
+                    "active_seconds": round(float(run["active_seconds"]) + time.perf_counter() - started, 3),
+                    "heartbeat_at": _timestamp(_now())
+                })
+                if updated:
+                    progress_broker.publish(channel, "progress", self._with_progress(updated))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Cursor is at the last completed chunk; resuming continues from there
+            logger.error(f"Reclassification run {run_id} failed: {e}")
+            try:
+                await asyncio.to_thread(self._update_run, run_id, {"status": "failed", "error": str(e)})
+            except Exception as update_error:
+                logger.error(f"Failed to mark reclassification run {run_id} as failed: {update_error}")
+        finally:
+            self._tasks.pop(run_id, None)
+            # Subscribers get the final state (completed, paused, cancelled, failed)
+            try:
+                final = await asyncio.to_thread(self._get_run, run_id)
+            except Exception:
+                final = None
+            progress_broker.close(channel, self._with_progress(final) if final else None)
+
+    def pause(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Stop after the current chunk; resume continues from the checkpoint."""
+        return self._set_status(run_id, "paused", from_statuses=("running",))
+
+    def cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        return self._set_status(run_id, "cancelled", from_statuses=("running", "paused", "failed"))
+
+    def resume(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Continue a paused or failed run from its checkpoint on this worker."""
+        run = self._set_status(run_id, "running", from_statuses=("paused", "failed"), extra={
+            "error": None, "worker_id": self.worker_id, "heartbeat_at": _timestamp(_now())
+        })
+        if run:
+            self._start(run_id)
+        return run
+
+    def _set_status(
+        self,
+        run_id: str,
+        status: str,
+        from_statuses: tuple,
+        extra: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        fields = {"status": status, "updated_at": _timestamp(_now()), **(extra or {})}
+        if status == "cancelled":
+            fields["finished_at"] = _timestamp(_now())
+        response = (
+            supabase.table("reclassification_runs")
+            .update(fields)
+            .eq("id", run_id)
+            .in_("status", list(from_statuses))
+            .execute()
+        )
+        rows = response.data if isinstance(response.data, list) else []
+        return rows[0] if rows and isinstance(rows[0], dict) else None
+
+    def get_progress(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Run row plus throughput (listings/second of active time) and ETA."""
+        run = self._get_run(run_id)
+        if not run:
+            return None
+        return self._with_progress(run)
+
+    def list_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        response = (
+            supabase.table("reclassification_runs")
+            .select("*")
+            .order("created_at", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        rows = response.data if isinstance(response.data, list) else []
+        return [self._with_progress(run) for run in rows if isinstance(run, dict)]
+
+    @staticmethod
+    def _with_progress(run: Dict[str, Any]) -> Dict[str, Any]:
+        processed = int(run.get("processed") or 0)
+        total = int(run.get("total") or 0)
+        active_seconds = float(run.get("active_seconds") or 0)
+        throughput = processed / active_seconds if active_seconds > 0 else None
+        remaining = max(0, total - processed)
+        eta = round(remaining / throughput, 1) if throughput and run.get("status") == "running" else None
+        return {
+            **run,
+            "percent_complete": round(min(100.0, processed / total * 100), 1) if total else None,
+            "listings_per_second": round(throughput, 3) if throughput else None,
+            "eta_seconds": eta
+        }
+
+    async def resume_orphaned(self) -> int:
+        """Start processing running runs whose lease expired (worker restarted or crashed)."""
+        expired = _timestamp(_now() - timedelta(seconds=settings.RECLASSIFICATION_LEASE_SECONDS))
+        response = await asyncio.to_thread(
+            lambda: supabase.table("reclassification_runs")
+            .select("id")
+            .eq("status", "running")
+            .or_(f"heartbeat_at.is.null,heartbeat_at.lt.{expired}")
+            .execute()
+        )
+        rows = response.data if isinstance(response.data, list) else []
+        for row in rows:
+            if isinstance(row, dict) and row.get("id"):
+                logger.info(f"Resuming reclassification run {row['id']}")
+                self._start(str(row["id"]))
+        return len(rows)
+
+    async def watch(self) -> None:
+        """Lifespan task: pick up orphaned runs now and then once per lease period."""
+        while True:
+            try:
+                await self.resume_orphaned()
+            except Exception as e:
+                logger.warning(f"Failed to check for orphaned reclassification runs: {e}")
+            await asyncio.sleep(settings.RECLASSIFICATION_LEASE_SECONDS)
+
+    async def shutdown(self) -> None:
+        """Stop local tasks and release their leases so another worker resumes them at once."""
+        run_ids = list(self._tasks)
+        for task in list(self._tasks.values()):
+            task.cancel()
+        for run_id in run_ids:
+            try:
+                await asyncio.to_thread(
+                    lambda: supabase.table("reclassification_runs")
+                    .update({"worker_id": None, "heartbeat_at": None})
+                    .eq("id", run_id)
+                    .eq("worker_id", self.worker_id)
+                    .execute()
+                )
+            except Exception as e:
+                logger.warning(f"Failed to release reclassification run {run_id}: {e}")
+
+
+reclassification_service = ReclassificationService()
@@ -5,13 +5,15 @@ Handles integration with Zoopla APIs for property listings.
 Note: Requires commercial API access from Hometrack.
 """
 import os
+import re
 import asyncio
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 import httpx
 from app.core.config import settings
 from app.services.zoopla_auth import zoopla_auth_service
-from app.services.ingestion_service import ingestion_service
+from app.services.ingestion_service import ingestion_service, needs_classification
+from app.services.reclassification_queue import reclassification_queue
 
 
 class ZooplaService:
@@ -96,6 +98,37 @@ class ZooplaService:
             print(f"Error fetching Zoopla listings: {e}")
             return []
     
+    async def listing_exists(self, listing_url: str) -> Optional[bool]:
+        """
+        Whether a Zoopla listing is still on the market, according to the API.
+        Returns None when that cannot be determined (API disabled, unknown URL, API error).
+        """
+        match = re.search(r"/(?:property|details)/(\d+)", listing_url or "")
+        if not self.enabled or not match:
+            return None
+        token = await zoopla_auth_service.get_access_token()
+        if not token:
+            return None
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await client.get(
+                    f"{self.base_url}/listing/property-items/{match.group(1)}",
+                    headers=zoopla_auth_service.get_auth_headers(token),
+                    timeout=30.0
+                )
+        except httpx.HTTPError:
+            return None
+        if response.status_code in (404, 410):
+            return False
+        if response.status_code != 200:
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            return None
+        status = str(data.get("status") or data.get("listingStatus") or "").lower() if isinstance(data, dict) else ""
+        return status not in ("sold", "withdrawn", "off_market", "removed")
+    
     def _map_zoopla_listing(self, zoopla_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Map Zoopla API response to our listing format.
@@ -175,6 +208,7 @@ class ZooplaService:
                 "processed": 0,
                 "added": 0,
                 "updated": 0,
+                "unchanged": 0,
                 "errors": 0
             }
         
@@ -183,6 +217,7 @@ class ZooplaService:
             "processed": 0,
             "added": 0,
             "updated": 0,
+            "unchanged": 0,
             "errors": 0,
             "errors_list": []
         }
@@ -192,36 +227,37 @@ class ZooplaService:
             listings = await self.fetch_listings(filters, limit)
             results["processed"] = len(listings)
             
-            # Process each listing
+            # Validate, then upsert the whole page: unchanged listings are only marked as
+            # checked and changed ones get just their changed fields written
+            valid = []
             for listing_data in listings:
-                try:
-                    # Check for duplicates
-                    is_duplicate, existing = await ingestion_service.check_duplicate(
-                        listing_data["listing_url"]
-                    )
-                    
-                    if is_duplicate:
-                        # Update existing listing
-                        # (Implementation depends on your update logic)
-                        results["updated"] += 1
-                    else:
-                        # Add new listing
-                        result = await ingestion_service.add_manual_listing(listing_data)
-                        if "error" not in result:
-                            results["added"] += 1
-                        else:
-                            results["errors"] += 1
-                            results["errors_list"].append({
-                                "listing": listing_data.get("address", "Unknown"),
-                                "error": result.get("error", "Unknown error")
-                            })
-                            
-                except Exception as e:
+                is_valid, error_msg = ingestion_service.validate_listing_data(listing_data)
+                if is_valid:
+                    valid.append(listing_data)
+                else:
+                    results["errors"] += 1
+                    results["errors_list"].append({
+                        "listing": listing_data.get("address", "Unknown"),
+                        "error": error_msg
+                    })
+            
+            upserted = await asyncio.to_thread(ingestion_service.upsert_listings, valid)
+            for listing_data, result in zip(valid, upserted):
+                status = result["status"]
+                if status == "created":
+                    results["added"] += 1
+                elif status == "updated":
+                    results["updated"] += 1
+                elif status in ("unchanged", "duplicate"):
+                    results["unchanged"] += 1
+                else:
                     results["errors"] += 1
                     results["errors_list"].append({
                         "listing": listing_data.get("address", "Unknown"),
-                        "error": str(e)
+                        "error": result.get("error", "Unknown error")
                     })
+                if needs_classification(result):
+                    reclassification_queue.enqueue(str(result["listing_id"]))
             
             return results
             
@@ -232,6 +268,7 @@ class ZooplaService:
                 "processed": results["processed"],
                 "added": results["added"],
                 "updated": results["updated"],
+                "unchanged": results["unchanged"],
                 "errors": results["errors"]
             }
 
@@ -0,0 +1,57 @@
+"""
+Re-parse listing prices with app/services/price_parser.py.
+
+Usage (from backend/):
+    python backfill_price_numeric.py [--dry-run]
+
+The previous parser applied a "k"/"m" multiplier when those letters appeared
+anywhere in the text ("Offers Over £250,000 in Morningside" became 250 billion).
+A listing is updated when its price_numeric is missing or equals what that
+parser produced, and the new parser disagrees; prices entered by hand are kept.
+Prices are parsed a page at a time with parse_prices.
+"""
+import argparse
+from app.core.database import supabase
+from app.services._legacy_price_parser import legacy_parse_price
+from app.services.price_parser import parse_prices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse listing prices with the price grammar")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    parser.add_argument("--page-size", type=int, default=1000, help="Listings read per query")
+    args = parser.parse_args()
+
+    start = scanned = updated = 0
+    while True:
+        response = (
+            supabase.table("listings")
+            .select("id, price_raw, price_numeric")
+            .order("id")
+            .range(start, start + args.page_size - 1)
+            .execute()
+        )
+        page = [row for row in response.data or [] if isinstance(row, dict)]
+        prices = parse_prices([str(row.get("price_raw") or "") for row in page])
+        for row, price in zip(page, prices):
+            stored = row.get("price_numeric")
+            stored = float(stored) if stored is not None else None
+            if price is None or stored == price:
+                continue
+            if stored is not None and stored != legacy_parse_price(str(row.get("price_raw") or "")):
+                continue
+            if args.dry_run:
+                print(f"  {row['id']}: {row.get('price_raw')!r} {stored} -> {price}")
+            else:
+                supabase.table("listings").update({"price_numeric": price}).eq("id", str(row["id"])).execute()
+            updated += 1
+        scanned += len(page)
+        if len(page) < args.page_size:
+            break
+        start += args.page_size
+
+    print(f"Scanned {scanned} listings; {'would update' if args.dry_run else 'updated'} {updated} prices")
+
+
+if __name__ == "__main__":
+    main()
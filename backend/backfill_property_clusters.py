@@ -0,0 +1,54 @@
+"""
+Cluster existing listings into properties (block_key + property_id).
+
+Usage (from backend/):
+    python backfill_property_clusters.py [--all]
+
+Listings without a property_id are processed oldest first, a page at a time,
+with the same matcher ingestion uses, so the earliest listing of a property
+defines its property_id. --all clears every assignment first and re-clusters
+everything (e.g. after changing PROPERTY_MATCH_THRESHOLD).
+"""
+import argparse
+from app.core.database import supabase
+from app.services.property_matcher import property_matcher
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster existing listings into properties")
+    parser.add_argument("--all", action="store_true", help="Clear existing clusters and re-cluster every listing")
+    parser.add_argument("--page-size", type=int, default=500, help="Listings matched per batch")
+    args = parser.parse_args()
+
+    if args.all:
+        supabase.table("listings").update({"block_key": None, "property_id": None}).not_.is_("id", "null").execute()
+
+    processed = matched = 0
+    while True:
+        # Assigned listings leave the "property_id is null" set, so the next page is always the first
+        response = (
+            supabase.table("listings")
+            .select("id, address, postcode, price_numeric")
+            .is_("property_id", "null")
+            .order("created_at")
+            .order("id")
+            .limit(args.page_size)
+            .execute()
+        )
+        page = [row for row in response.data or [] if isinstance(row, dict)]
+        if not page:
+            break
+
+        matched += property_matcher.assign(page)
+        for listing in page:
+            supabase.table("listings").update({
+                "block_key": listing["block_key"], "property_id": listing["property_id"]
+            }).eq("id", str(listing["id"])).execute()
+        processed += len(page)
+        print(f"Clustered {processed} listings ({matched} joined an earlier listing's property)")
+
+    print(f"Done: {processed} listings clustered, {matched} matched another listing of the same property")
+
+
+if __name__ == "__main__":
+    main()
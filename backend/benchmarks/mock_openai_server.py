@@ -0,0 +1,196 @@
+"""
+OpenAI-compatible mock server for offline classification benchmarks.
+
+Implements POST /v1/chat/completions well enough for ClassificationService:
+single and multi-listing prompts are answered in the JSON format the prompts
+ask for. Answers come from the golden dataset (with optional label noise), or
+from the rule-based fallback classifier for listings it does not know.
+Latency, slow tail, server errors and 429s are configurable so retries,
+timeouts, hedging and the circuit breaker can be exercised.
+
+Usage (from backend/):
+    python benchmarks/mock_openai_server.py --port 8765 --latency-ms 300 --error-rate 0.05
+then point the API at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.services.fallback_classifier import classify_with_rules  # noqa: E402
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_listings.jsonl")
+STATUSES = ("explicit", "likely", "competitive")
+LISTING_PATTERN = re.compile(r"(?:\[(L\d+)\]\n)?Price: (.*)\nDescription: (.*)")
+WORD_PATTERN = re.compile(r"\w+")
+# Providers cache prompt prefixes in 1024-token blocks after the first 1024 tokens
+CACHE_BLOCK_TOKENS = 1024
+
+
+@dataclass
+class MockSettings:
+    latency_ms: float = 200.0
+    jitter_ms: float = 50.0
+    slow_rate: float = 0.0        # fraction of requests that take slow_factor x longer
+    slow_factor: float = 10.0
+    error_rate: float = 0.0       # fraction answered with HTTP 500
+    rate_limit_rate: float = 0.0  # fraction answered with HTTP 429
+    label_noise: float = 0.0      # fraction of answers with a wrong label
+    seed: Optional[int] = None
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def create_app(settings: MockSettings, dataset_path: str = DEFAULT_DATASET) -> FastAPI:
+    app = FastAPI(title="Mock OpenAI")
+    rng = random.Random(settings.seed)
+    golden_by_price: Dict[str, List[Dict[str, Any]]] = {}
+    for row in load_golden(dataset_path):
+        golden_by_price.setdefault(row["price_raw"].strip(), []).append(row)
+    seen_prefixes = set()
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def answer(price: str, description: str) -> Tuple[str, int, str]:
+        candidates = golden_by_price.get(price.strip(), [])
+        if candidates:
+            # Descriptions may be trimmed by the service; pick the closest by word overlap
+            words = set(WORD_PATTERN.findall(description.lower()))
+            best = max(candidates, key=lambda r: len(words & set(WORD_PATTERN.findall(r["description"].lower()))))
+            status, confidence, reason = best["expected_status"], rng.randint(75, 98), "Matched golden listing."
+        else:
+            rule_status, confidence, reason = classify_with_rules(description, price)
+            status = rule_status.value
+        if settings.label_noise and rng.random() < settings.label_noise:
+            status = rng.choice([s for s in STATUSES if s != status])
+            confidence, reason = rng.randint(50, 80), "Noisy answer."
+        return status, confidence, reason
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        body = await request.json()
+        stats["requests"] += 1
+
+        delay = max(0.0, rng.gauss(settings.latency_ms, settings.jitter_ms)) / 1000
+        if settings.slow_rate and rng.random() < settings.slow_rate:
+            delay *= settings.slow_factor
+        await asyncio.sleep(delay)
+
+        roll = rng.random()
+        if roll < settings.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "1"},
+                content={"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Internal server error (mock)", "type": "server_error"}}
+            )
+
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        listings = LISTING_PATTERN.findall(user)
+
+        if len(listings) == 1 and not listings[0][0]:
+            status, confidence, reason = answer(listings[0][1], listings[0][2])
+            content = {"status": status, "confidence_score": confidence, "reason": reason}
+        else:
+            results = []
+            for key, price, description in listings:
+                status, confidence, reason = answer(price, description)
+                results.append({"id": key, "status": status, "confidence_score": confidence, "reason": reason})
+            content = {"results": results}
+        completion = json.dumps(content)
+
+        prompt_tokens = _tokens(system) + _tokens(user)
+        system_tokens = _tokens(system)
+        cached = 0
+        if system in seen_prefixes and system_tokens >= CACHE_BLOCK_TOKENS:
+            cached = system_tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+        seen_prefixes.add(system)
+
+        return {
+            "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": completion},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": _tokens(completion),
+                "total_tokens": prompt_tokens + _tokens(completion),
+                "prompt_tokens_details": {"cached_tokens": cached}
+            }
+        }
+
+    @app.get("/stats")
+    async def get_stats() -> Any:
+        return stats
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="Latency standard deviation")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of requests in the slow tail")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="Latency multiplier for the slow tail")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of HTTP 500 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of HTTP 429 responses")
+    parser.add_argument("--label-noise", type=float, default=0.0, help="Fraction of deliberately wrong labels")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible runs")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET, help="Golden dataset (JSONL)")
+
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    return MockSettings(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        label_noise=args.label_noise,
+        seed=args.seed,
+    )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for classification benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args), args.dataset), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
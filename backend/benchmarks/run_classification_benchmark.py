@@ -0,0 +1,229 @@
+"""
+Offline classification benchmark.
+
+Runs ClassificationService end to end against the golden dataset and reports
+accuracy, confusion matrix, throughput, latency percentiles and retry behaviour.
+By default an in-process mock OpenAI server (benchmarks/mock_openai_server.py)
+answers the requests, so no API key or network access is needed; pass
+--base-url to benchmark another OpenAI-compatible endpoint instead.
+
+Usage (from backend/):
+    python benchmarks/run_classification_benchmark.py --repeat 4 --concurrency 8 --error-rate 0.05
+    python benchmarks/run_classification_benchmark.py --batch-size 10 --min-accuracy 0.95 --output bench.json
+
+Exits with status 1 when accuracy is below --min-accuracy (for CI).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_openai_server import (  # noqa: E402
+    DEFAULT_DATASET, STATUSES, add_arguments, create_app, load_golden, settings_from_args
+)
+
+# Settings the app requires at import; placeholders are enough because the benchmark
+# never touches the database (telemetry is collected in memory below)
+PLACEHOLDER_ENV = {
+    "SUPABASE_URL": "https://benchmark.supabase.co",
+    "SUPABASE_ANON_KEY": "benchmark.placeholder.key",
+    "SUPABASE_SERVICE_ROLE_KEY": "benchmark.placeholder.key",
+    "SUPABASE_DB_PASSWORD": "benchmark",
+    "DB_HOST": "localhost",
+    "JWT_SECRET": "benchmark",
+    "MAIL_FROM": "benchmark@example.com",
+}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(args: argparse.Namespace) -> str:
+    """Run the mock server in a background thread; returns its base URL."""
+    import uvicorn
+
+    port = _free_port()
+    config = uvicorn.Config(
+        create_app(settings_from_args(args), args.dataset), host="127.0.0.1", port=port, log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("Mock OpenAI server did not start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    # Keep stdout for the JSON report: app logs go to stderr (setup_logging keeps existing handlers)
+    app_logger = logging.getLogger("fixedprice_scotland")
+    app_logger.addHandler(logging.StreamHandler(sys.stderr))
+
+    # Imported here: settings are read from the environment prepared in main()
+    from app.services.classification_service import classification_service
+    from app.services.classification_telemetry import classification_telemetry
+
+    # Per-call logs only with --verbose
+    app_logger.setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    runs: List[Dict[str, Any]] = []
+    classification_telemetry.record = runs.append  # type: ignore[method-assign]
+    classification_service.retry_delay = args.retry_delay
+    classification_service.rate_limit_delay = args.retry_delay
+
+    golden = load_golden(args.dataset)[: args.limit or None]
+    listings = [
+        {**row, "id": f"{row['id']}#{n}"} for n in range(args.repeat) for row in golden
+    ]
+    chunks = [listings[i:i + args.batch_size] for i in range(0, len(listings), args.batch_size)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    outcomes: Dict[str, Any] = {}
+
+    async def classify_chunk(chunk: List[Dict[str, Any]]) -> None:
+        async with semaphore:
+            results, _ = await classification_service.classify_many(chunk, args.batch_size)
+            outcomes.update(results)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(classify_chunk(chunk) for chunk in chunks))
+    elapsed = time.perf_counter() - started
+
+    confusion = {expected: Counter() for expected in STATUSES}
+    models = Counter()
+    correct = 0
+    for listing in listings:
+        outcome = outcomes.get(listing["id"])
+        predicted = outcome.status.value if outcome else "missing"
+        confusion[listing["expected_status"]][predicted] += 1
+        models[outcome.model if outcome else "missing"] += 1
+        correct += predicted == listing["expected_status"]
+
+    per_class = {}
+    for status in STATUSES:
+        true_positive = confusion[status][status]
+        predicted_total = sum(confusion[expected][status] for expected in STATUSES)
+        actual_total = sum(confusion[status].values())
+        per_class[status] = {
+            "precision": round(true_positive / predicted_total, 4) if predicted_total else None,
+            "recall": round(true_positive / actual_total, 4) if actual_total else None,
+            "support": actual_total,
+        }
+
+    latencies = [run["latency_ms"] for run in runs]
+    successful_calls = [run for run in runs if run["success"]]
+    prompt_tokens = sum(run["prompt_tokens"] for run in runs)
+    cached_tokens = sum(run["cached_tokens"] for run in runs)
+    return {
+        "config": {
+            "base_url": os.environ.get("OPENAI_BASE_URL"),
+            "model": classification_service.model,
+            "listings": len(listings),
+            "batch_size": args.batch_size,
+            "concurrency": args.concurrency,
+            "request_timeout_seconds": classification_service.request_timeout,
+            "hedge_after_seconds": classification_service.hedge_after,
+        },
+        "accuracy": round(correct / len(listings), 4) if listings else None,
+        "per_class": per_class,
+        "confusion_matrix": {
+            "rows_expected_columns_predicted": list(STATUSES),
+            "matrix": [[confusion[expected][predicted] for predicted in STATUSES] for expected in STATUSES],
+            "missing": sum(confusion[expected]["missing"] for expected in STATUSES),
+        },
+        "answered_by_model": dict(models),
+        "throughput": {
+            "elapsed_seconds": round(elapsed, 3),
+            "listings_per_second": round(len(listings) / elapsed, 3) if elapsed > 0 else None,
+        },
+        "calls": {
+            "total": len(runs),
+            "failed": len(runs) - len(successful_calls),
+            "retries": sum(run["retries"] for run in runs),
+            "calls_with_retries": sum(1 for run in runs if run["retries"] > 0),
+            "latency_ms": {
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "mean": round(statistics.mean(latencies), 1) if latencies else None,
+            },
+            "prompt_tokens": prompt_tokens,
+            "cached_prompt_tokens": cached_tokens,
+            "cache_hit_rate": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0,
+            "estimated_cost_usd": round(sum(run["estimated_cost_usd"] for run in runs), 6),
+        },
+        "circuit": classification_service.circuit_breaker.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline classification accuracy and throughput benchmark")
+    parser.add_argument("--base-url", default=None, help="Use this OpenAI-compatible endpoint instead of the mock")
+    parser.add_argument("--limit", type=int, default=0, help="Only use the first N golden listings (0 = all)")
+    parser.add_argument("--repeat", type=int, default=1, help="Classify the dataset N times (throughput runs)")
+    parser.add_argument("--batch-size", type=int, default=1, help="Listings per model call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Model calls in flight")
+    parser.add_argument("--retry-delay", type=float, default=0.1, help="Seconds between retries (service default 2-5)")
+    parser.add_argument("--timeout", type=float, default=None, help="OPENAI_REQUEST_TIMEOUT_SECONDS override")
+    parser.add_argument("--hedge-after", type=float, default=None, help="OPENAI_HEDGE_AFTER_SECONDS override")
+    parser.add_argument("--with-local", action="store_true", help="Keep the local classifier first pass enabled")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Exit 1 when accuracy is below this")
+    parser.add_argument("--output", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Log every model call (to stderr)")
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.batch_size = max(1, args.batch_size)
+    args.dataset = args.dataset or DEFAULT_DATASET
+
+    for key, value in PLACEHOLDER_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ["OPENAI_BASE_URL"] = args.base_url or start_mock_server(args)
+    if not args.base_url:
+        os.environ["OPENAI_API_KEY"] = "mock"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    # Pacing would measure the limiter, not the classifier
+    os.environ["OPENAI_RPM_LIMIT"] = "0"
+    os.environ["OPENAI_TPM_LIMIT"] = "0"
+    if not args.with_local:
+        os.environ["LOCAL_CLASSIFIER_ENABLED"] = "false"
+    if args.timeout is not None:
+        os.environ["OPENAI_REQUEST_TIMEOUT_SECONDS"] = str(args.timeout)
+    if args.hedge_after is not None:
+        os.environ["OPENAI_HEDGE_AFTER_SECONDS"] = str(args.hedge_after)
+
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.min_accuracy is not None and (report["accuracy"] or 0) < args.min_accuracy:
+        print(f"Accuracy {report['accuracy']} is below the required {args.min_accuracy}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
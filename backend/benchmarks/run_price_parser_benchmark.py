@@ -0,0 +1,100 @@
+"""
+Price parser benchmark.
+
+Checks app/services/price_parser.py against a corpus of Scottish price
+phrasings (benchmarks/price_corpus.jsonl) and compares the throughput of the
+previous per-call parser, parse_price (uncached) and batched parse_prices on
+distinct and on repeated strings.
+
+Usage (from backend/):
+    python benchmarks/run_price_parser_benchmark.py --repeat 2000
+    python benchmarks/run_price_parser_benchmark.py --min-accuracy 1.0
+
+Exits with status 1 when accuracy is below --min-accuracy (for CI).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services._legacy_price_parser import legacy_parse_price  # noqa: E402
+from app.services.price_parser import parse_price, parse_prices  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "price_corpus.jsonl")
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def accuracy(parsed: List[Optional[float]], corpus: List[Dict[str, Any]]) -> Dict[str, Any]:
+    wrong = [
+        {"text": row["text"], "expected": row["expected"], "parsed": value}
+        for row, value in zip(corpus, parsed) if value != row["expected"]
+    ]
+    return {"accuracy": round(1 - len(wrong) / len(corpus), 4) if corpus else None, "wrong": wrong}
+
+
+def throughput(parse_all: Callable[[List[str]], List[Optional[float]]], texts: List[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    parse_all(texts)
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed_seconds": round(elapsed, 4),
+        "strings_per_second": round(len(texts) / elapsed) if elapsed > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price parser accuracy and throughput benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Corpus of {text, expected} rows (JSONL)")
+    parser.add_argument("--repeat", type=int, default=1000, help="Corpus copies parsed in the throughput runs")
+    parser.add_argument("--min-accuracy", type=float, default=None, help="Exit 1 when accuracy is below this")
+    parser.add_argument("--show-wrong", action="store_true", help="List the strings each parser gets wrong")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    texts = [row["text"] for row in corpus]
+    # "distinct": every string unique (worst case); "repeated": the corpus copied as is, like
+    # real feeds where many listings share phrasings ("POA", "Offers over £250,000")
+    datasets = {
+        "distinct": [f"{text} #{n}" if text else text for n in range(args.repeat) for text in texts],
+        "repeated": texts * args.repeat,
+    }
+    uncached = parse_price.__wrapped__
+
+    results = {
+        "legacy": accuracy([legacy_parse_price(text) for text in texts], corpus),
+        "parse_price": accuracy([uncached(text) for text in texts], corpus),
+        "parse_prices": accuracy(parse_prices(texts), corpus),
+    }
+    report = {
+        "corpus_size": len(corpus),
+        "throughput_strings": len(texts) * args.repeat,
+        "accuracy": {name: result["accuracy"] for name, result in results.items()},
+        "throughput": {
+            name: {
+                "legacy": throughput(lambda items: [legacy_parse_price(text) for text in items], bulk),
+                "parse_price": throughput(lambda items: [uncached(text) for text in items], bulk),
+                "parse_prices": throughput(parse_prices, bulk),
+            }
+            for name, bulk in datasets.items()
+        },
+    }
+    if args.show_wrong:
+        report["wrong"] = {name: result["wrong"] for name, result in results.items()}
+    print(json.dumps(report, indent=2))
+
+    if args.min_accuracy is not None and (report["accuracy"]["parse_price"] or 0) < args.min_accuracy:
+        print(f"Accuracy {report['accuracy']['parse_price']} is below the required {args.min_accuracy}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
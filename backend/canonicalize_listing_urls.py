@@ -0,0 +1,68 @@
+"""
+Rewrite stored listing URLs to their canonical form.
+
+Usage (from backend/):
+    python canonicalize_listing_urls.py [--dry-run]
+
+New listings are stored with IngestionService.canonical_url; run this once so
+older rows match the batched duplicate checks. Listings whose canonical URL is
+already used by another listing are left unchanged and reported, so the
+duplicates can be reviewed (and merged or deleted) by hand.
+"""
+import argparse
+from typing import Dict, List
+from app.core.database import supabase
+from app.services.ingestion_service import ingestion_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Canonicalize stored listing URLs")
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing them")
+    parser.add_argument("--page-size", type=int, default=1000, help="Listings read per query")
+    args = parser.parse_args()
+
+    owner: Dict[str, str] = {}  # canonical URL -> listing id that keeps it
+    changes: List[tuple] = []
+    start = 0
+    while True:
+        response = (
+            supabase.table("listings")
+            .select("id, listing_url")
+            .order("id")
+            .range(start, start + args.page_size - 1)
+            .execute()
+        )
+        page = response.data if isinstance(response.data, list) else []
+        for row in page:
+            if not isinstance(row, dict) or not row.get("listing_url"):
+                continue
+            canonical = ingestion_service.canonical_url(row["listing_url"])
+            # Rows already in canonical form keep their URL; claim it before others
+            if canonical == row["listing_url"]:
+                owner[canonical] = str(row["id"])
+            else:
+                changes.append((str(row["id"]), row["listing_url"], canonical))
+        if len(page) < args.page_size:
+            break
+        start += args.page_size
+
+    updated = 0
+    conflicts = []
+    for listing_id, url, canonical in changes:
+        if canonical in owner:
+            conflicts.append({"listing_id": listing_id, "url": url, "duplicate_of": owner[canonical]})
+            continue
+        owner[canonical] = listing_id
+        if not args.dry_run:
+            supabase.table("listings").update({"listing_url": canonical}).eq("id", listing_id).execute()
+        updated += 1
+
+    print(f"{'Would update' if args.dry_run else 'Updated'} {updated} listing URLs")
+    if conflicts:
+        print(f"{len(conflicts)} listings duplicate another listing's canonical URL (left unchanged):")
+        for conflict in conflicts:
+            print(f"  {conflict['listing_id']} {conflict['url']} -> duplicate of {conflict['duplicate_of']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Generate WebP variants for listing photos uploaded before the image pipeline.
+
+Usage (from backend/):
+    python generate_photo_variants.py [--dry-run]
+
+Walks the listing-photos bucket and, for every original without a "_thumb"
+variant, renders the variants with app/services/image_pipeline.py (in its
+process pool) and uploads them next to the original. Search cards fall back to
+the original when a thumbnail is missing, so this can run at any time.
+"""
+import argparse
+import asyncio
+from app.core.database import supabase
+from app.services.image_pipeline import (
+    image_pipeline, variant_path, InvalidImageError, VARIANTS, VARIANT_CONTENT_TYPE, VARIANT_FORMAT
+)
+
+LISTING_PHOTOS_BUCKET = "listing-photos"
+
+
+def list_photo_names(page_size: int) -> list:
+    bucket = supabase.storage.from_(LISTING_PHOTOS_BUCKET)
+    names = []
+    offset = 0
+    while True:
+        page = bucket.list("", {"limit": page_size, "offset": offset, "sortBy": {"column": "name", "order": "asc"}})
+        names.extend(item["name"] for item in page or [] if isinstance(item, dict) and item.get("name"))
+        if len(page or []) < page_size:
+            return names
+        offset += page_size
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Render WebP variants for existing listing photos")
+    parser.add_argument("--dry-run", action="store_true", help="List photos without variants without rendering them")
+    parser.add_argument("--page-size", type=int, default=1000, help="Objects listed per storage request")
+    args = parser.parse_args()
+
+    names = list_photo_names(args.page_size)
+    existing = set(names)
+    variant_suffixes = tuple(f"_{name}.{VARIANT_FORMAT}" for name in VARIANTS)
+    originals = [
+        name for name in names
+        if not name.endswith(variant_suffixes) and variant_path(name, "thumb") not in existing
+    ]
+    print(f"{len(originals)} of {len(names)} stored files need variants")
+    if args.dry_run:
+        for name in originals:
+            print(f"  {name}")
+        return
+
+    bucket = supabase.storage.from_(LISTING_PHOTOS_BUCKET)
+    generated = failed = 0
+    for name in originals:
+        try:
+            variants, _ = await image_pipeline.render(bucket.download(name))
+        except InvalidImageError as e:
+            print(f"  {name}: skipped ({e})")
+            failed += 1
+            continue
+        for variant, (data, _) in variants.items():
+            bucket.upload(variant_path(name, variant), data, file_options={"content-type": VARIANT_CONTENT_TYPE, "upsert": "true"})
+        generated += 1
+    image_pipeline.shutdown()
+    print(f"Generated variants for {generated} photos; {failed} could not be decoded")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,3 +1,4 @@
+import asyncio
 from typing import Callable, Any, Optional
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response, HTTPException
@@ -36,11 +37,29 @@ async def lifespan(app: FastAPI):
         logger.info("Database connection verified")
     else:
         logger.warning("Database connection test failed")
+    # Continue reclassification runs interrupted by a restart
+    from app.services.reclassification_service import reclassification_service
+    reclassification_watch = asyncio.create_task(reclassification_service.watch())
+    # Revalidate stale listings and deactivate the ones that are gone
+    freshness_watch = None
+    if settings.FRESHNESS_CHECK_ENABLED:
+        from app.services.freshness_service import freshness_service
+        freshness_watch = asyncio.create_task(freshness_service.watch())
     
     yield
     
     # Shutdown
     logger.info("Shutting down FixedPrice Scotland API...")
+    reclassification_watch.cancel()
+    if freshness_watch is not None:
+        freshness_watch.cancel()
+    await reclassification_service.shutdown()
+    from app.services.reclassification_queue import reclassification_queue
+    await reclassification_queue.drain()
+    from app.services.classification_telemetry import classification_telemetry
+    await classification_telemetry.flush()
+    from app.services.image_pipeline import image_pipeline
+    image_pipeline.shutdown()
     from app.core.database import close_connections
     close_connections()
 
@@ -0,0 +1,96 @@
+-- ============================================
+-- Classification telemetry
+-- One row per OpenAI classification call (single or multi-listing prompt),
+-- written by app/services/classification_telemetry.py.
+-- Apply in the Supabase SQL editor (or psql) after the base schema.
+-- ============================================
+
+create table if not exists public.classification_runs (
+    id uuid primary key default gen_random_uuid(),
+    listing_id uuid references public.listings(id) on delete set null,  -- null for multi-listing calls
+    listings_count integer not null default 1,
+    model text not null,
+    prompt_version text,
+    mode text not null default 'single',  -- single | batched
+    success boolean not null default true,
+    error text,
+    latency_ms integer not null,          -- wall time including retries and hedging
+    queue_ms integer not null default 0,  -- time spent waiting on the RPM/TPM limiter
+    retries integer not null default 0,
+    prompt_tokens integer not null default 0,
+    cached_tokens integer not null default 0,
+    completion_tokens integer not null default 0,
+    cache_hit boolean not null default false,
+    estimated_cost_usd numeric(12, 6) not null default 0,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists classification_runs_created_at_idx
+    on public.classification_runs (created_at);
+
+-- Backend writes with the service role; no client access
+alter table public.classification_runs enable row level security;
+
+-- Aggregates for GET /classifications/telemetry, computed in one round trip
+create or replace function public.classification_run_stats(p_days integer default 7)
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with runs as (
+        select *
+        from classification_runs
+        where created_at >= now() - make_interval(days => p_days)
+    )
+    select json_build_object(
+        'days', p_days,
+        'calls', (select count(*) from runs),
+        'failed_calls', (select count(*) from runs where not success),
+        'listings_classified', (select coalesce(sum(listings_count), 0) from runs where success),
+        'retries', (select coalesce(sum(retries), 0) from runs),
+        'cache_hit_rate', (select coalesce(round(avg(case when cache_hit then 1 else 0 end)::numeric, 3), 0) from runs),
+        'latency_ms', (
+            select json_build_object(
+                'p50', percentile_cont(0.5) within group (order by latency_ms),
+                'p95', percentile_cont(0.95) within group (order by latency_ms),
+                'avg', round(avg(latency_ms)::numeric, 1)
+            )
+            from runs
+        ),
+        'tokens', (
+            select json_build_object(
+                'prompt', coalesce(sum(prompt_tokens), 0),
+                'cached', coalesce(sum(cached_tokens), 0),
+                'completion', coalesce(sum(completion_tokens), 0)
+            )
+            from runs
+        ),
+        'estimated_cost_usd', (select coalesce(sum(estimated_cost_usd), 0) from runs),
+        'by_model', (
+            select coalesce(json_agg(m order by m.calls desc), '[]'::json)
+            from (
+                select model, count(*) as calls, sum(estimated_cost_usd) as estimated_cost_usd
+                from runs
+                group by model
+            ) m
+        ),
+        'per_day', (
+            select coalesce(json_agg(d order by d.day), '[]'::json)
+            from (
+                select
+                    created_at::date as day,
+                    count(*) as calls,
+                    sum(listings_count) as listings,
+                    percentile_cont(0.5) within group (order by latency_ms) as p50_latency_ms,
+                    percentile_cont(0.95) within group (order by latency_ms) as p95_latency_ms,
+                    sum(estimated_cost_usd) as estimated_cost_usd
+                from runs
+                group by created_at::date
+            ) d
+        )
+    );
+$$;
+
+revoke execute on function public.classification_run_stats(integer) from public, anon, authenticated;
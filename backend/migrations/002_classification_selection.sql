@@ -0,0 +1,46 @@
+-- ============================================
+-- Classification selection and bulk upsert
+-- One classification row per listing (enables upsert on listing_id) and a
+-- single anti-join query returning the next listings that need classifying,
+-- used by /classifications/batch and /ingestion/batch-classify.
+-- Apply in the Supabase SQL editor (or psql) after the base schema.
+-- ============================================
+
+-- Keep only the most recent classification per listing before adding the unique index
+-- (rows without classified_at rank last, so every duplicate goes, NULLs included)
+delete from public.classifications c
+using (
+    select id,
+           row_number() over (
+               partition by listing_id
+               order by classified_at desc nulls last, id desc
+           ) as recency
+    from public.classifications
+) ranked
+where c.id = ranked.id
+  and ranked.recency > 1;
+
+create unique index if not exists classifications_listing_id_key
+    on public.classifications (listing_id);
+
+-- Active listings with no classification, oldest first (optionally restricted to p_listing_ids)
+create or replace function public.unclassified_listings(
+    p_limit integer default 50,
+    p_listing_ids uuid[] default null
+)
+returns table (id uuid, description text, price_raw text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select l.id, l.description, l.price_raw
+    from listings l
+    where l.is_active
+      and (p_listing_ids is null or l.id = any(p_listing_ids))
+      and not exists (select 1 from classifications c where c.listing_id = l.id)
+    order by l.created_at
+    limit p_limit;
+$$;
+
+revoke execute on function public.unclassified_listings(integer, uuid[]) from public, anon, authenticated;
@@ -0,0 +1,95 @@
+-- ============================================
+-- Reclassification runs
+-- Background full-corpus (re)classification with a persisted keyset cursor,
+-- driven by app/services/reclassification_service.py. A run survives restarts:
+-- the worker that holds its heartbeat lease continues from cursor_listing_id.
+-- Apply in the Supabase SQL editor (or psql) after 002_classification_selection.sql.
+-- ============================================
+
+-- Prompt version that produced each classification (for the stale_prompt filter)
+alter table public.classifications add column if not exists prompt_version text;
+
+create table if not exists public.reclassification_runs (
+    id uuid primary key default gen_random_uuid(),
+    filter text not null check (filter in ('all', 'unclassified', 'low_confidence', 'stale_prompt')),
+    min_confidence integer not null default 70,   -- low_confidence: reclassify below this score
+    prompt_version text not null,                 -- stale_prompt: reclassify rows not at this version
+    batch_size integer not null default 1,
+    status text not null default 'running' check (status in ('running', 'paused', 'cancelled', 'completed', 'failed')),
+    cursor_listing_id uuid,                       -- last listing processed (listings are walked in id order)
+    total integer not null default 0,             -- candidates when the run was created
+    processed integer not null default 0,
+    succeeded integer not null default 0,
+    failed integer not null default 0,
+    active_seconds numeric(12, 3) not null default 0,  -- time spent processing (excludes pauses)
+    error text,
+    worker_id text,                               -- worker holding the lease
+    heartbeat_at timestamptz,
+    created_by uuid,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    finished_at timestamptz
+);
+
+create index if not exists reclassification_runs_status_idx
+    on public.reclassification_runs (status);
+
+-- Backend writes with the service role; no client access
+alter table public.reclassification_runs enable row level security;
+
+-- Active listings matching a run filter, in id order after p_after
+create or replace function public.reclassification_candidates(
+    p_filter text,
+    p_after uuid default null,
+    p_limit integer default 50,
+    p_min_confidence integer default 70,
+    p_prompt_version text default null
+)
+returns table (id uuid, description text, price_raw text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select l.id, l.description, l.price_raw
+    from listings l
+    left join classifications c on c.listing_id = l.id
+    where l.is_active
+      and (p_after is null or l.id > p_after)
+      and case p_filter
+          when 'all' then true
+          when 'unclassified' then c.id is null
+          when 'low_confidence' then c.id is null or c.confidence_score < p_min_confidence
+          when 'stale_prompt' then c.id is null or c.prompt_version is distinct from p_prompt_version
+          else false
+      end
+    order by l.id
+    limit p_limit;
+$$;
+
+create or replace function public.reclassification_candidate_count(
+    p_filter text,
+    p_min_confidence integer default 70,
+    p_prompt_version text default null
+)
+returns integer
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select count(*)::integer
+    from listings l
+    left join classifications c on c.listing_id = l.id
+    where l.is_active
+      and case p_filter
+          when 'all' then true
+          when 'unclassified' then c.id is null
+          when 'low_confidence' then c.id is null or c.confidence_score < p_min_confidence
+          when 'stale_prompt' then c.id is null or c.prompt_version is distinct from p_prompt_version
+          else false
+      end;
+$$;
+
+revoke execute on function public.reclassification_candidates(text, uuid, integer, integer, text) from public, anon, authenticated;
+revoke execute on function public.reclassification_candidate_count(text, integer, text) from public, anon, authenticated;
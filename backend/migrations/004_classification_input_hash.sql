@@ -0,0 +1,9 @@
+-- ============================================
+-- Classification input hash
+-- Normalised hash of the listing fields the classifier reads (price_raw and
+-- description) at classification time. Listing updates compare against it so
+-- only material changes trigger reclassification.
+-- Apply in the Supabase SQL editor (or psql) after 003_reclassification_runs.sql.
+-- ============================================
+
+alter table public.classifications add column if not exists input_hash text;
@@ -0,0 +1,130 @@
+-- ============================================
+-- Prompt and model versioning
+-- A classification is current when it was produced with the current prompt
+-- version and classification model. Local-model predictions are deliberate
+-- and never count as stale; rule-fallback results always do.
+-- Reclassification runs with filter stale_prompt now also pick up rows from
+-- another model, and version samples drive the side-by-side comparison report
+-- (POST /classifications/versions/compare).
+-- Apply in the Supabase SQL editor (or psql) after 004_classification_input_hash.sql.
+-- ============================================
+
+alter table public.reclassification_runs add column if not exists model text;
+
+drop function if exists public.reclassification_candidates(text, uuid, integer, integer, text);
+drop function if exists public.reclassification_candidate_count(text, integer, text);
+
+create or replace function public.classification_is_stale(
+    c public.classifications,
+    p_prompt_version text,
+    p_model text
+)
+returns boolean
+language sql
+immutable
+as $$
+    select coalesce(c.ai_model_used, '') not like 'local-%'
+       and (c.prompt_version is distinct from p_prompt_version
+            or (p_model is not null and c.ai_model_used is distinct from p_model));
+$$;
+
+create or replace function public.reclassification_candidates(
+    p_filter text,
+    p_after uuid default null,
+    p_limit integer default 50,
+    p_min_confidence integer default 70,
+    p_prompt_version text default null,
+    p_model text default null
+)
+returns table (id uuid, description text, price_raw text)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select l.id, l.description, l.price_raw
+    from listings l
+    left join classifications c on c.listing_id = l.id
+    where l.is_active
+      and (p_after is null or l.id > p_after)
+      and case p_filter
+          when 'all' then true
+          when 'unclassified' then c.id is null
+          when 'low_confidence' then c.id is null or c.confidence_score < p_min_confidence
+          when 'stale_prompt' then c.id is null or classification_is_stale(c, p_prompt_version, p_model)
+          else false
+      end
+    order by l.id
+    limit p_limit;
+$$;
+
+create or replace function public.reclassification_candidate_count(
+    p_filter text,
+    p_min_confidence integer default 70,
+    p_prompt_version text default null,
+    p_model text default null
+)
+returns integer
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select count(*)::integer
+    from listings l
+    left join classifications c on c.listing_id = l.id
+    where l.is_active
+      and case p_filter
+          when 'all' then true
+          when 'unclassified' then c.id is null
+          when 'low_confidence' then c.id is null or c.confidence_score < p_min_confidence
+          when 'stale_prompt' then c.id is null or classification_is_stale(c, p_prompt_version, p_model)
+          else false
+      end;
+$$;
+
+-- Classification counts per prompt version and model
+create or replace function public.classification_version_counts()
+returns table (prompt_version text, ai_model_used text, classifications bigint, avg_confidence numeric, last_classified_at timestamptz)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select c.prompt_version, c.ai_model_used, count(*), round(avg(c.confidence_score), 1), max(c.classified_at)
+    from classifications c
+    group by c.prompt_version, c.ai_model_used
+    order by count(*) desc;
+$$;
+
+-- Random sample of stale classifications (optionally from one prompt version) with listing text
+create or replace function public.stale_classification_sample(
+    p_prompt_version text,
+    p_model text,
+    p_limit integer default 50,
+    p_from_prompt_version text default null
+)
+returns table (
+    listing_id uuid, description text, price_raw text, status text, confidence_score integer,
+    ai_model_used text, prompt_version text
+)
+language sql
+volatile
+security definer
+set search_path = public
+as $$
+    select l.id, l.description, l.price_raw, c.status::text, c.confidence_score, c.ai_model_used, c.prompt_version
+    from classifications c
+    join listings l on l.id = c.listing_id
+    where l.is_active
+      and classification_is_stale(c, p_prompt_version, p_model)
+      and (p_from_prompt_version is null or c.prompt_version = p_from_prompt_version)
+    order by random()
+    limit p_limit;
+$$;
+
+revoke execute on function public.classification_is_stale(public.classifications, text, text) from public, anon, authenticated;
+revoke execute on function public.reclassification_candidates(text, uuid, integer, integer, text, text) from public, anon, authenticated;
+revoke execute on function public.reclassification_candidate_count(text, integer, text, text) from public, anon, authenticated;
+revoke execute on function public.classification_version_counts() from public, anon, authenticated;
+revoke execute on function public.stale_classification_sample(text, text, integer, text) from public, anon, authenticated;
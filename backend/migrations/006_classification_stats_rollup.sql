@@ -0,0 +1,165 @@
+-- ============================================
+-- Classification stats rollup
+-- Per-status counts, confidence sum and confidence buckets maintained by
+-- statement-level triggers on classifications, so GET /classifications/stats
+-- reads a handful of rows instead of scanning (and downloading) every
+-- classification.
+-- Apply in the Supabase SQL editor (or psql) after 005_classification_versions.sql.
+-- ============================================
+
+create table if not exists public.classification_stats_rollup (
+    status text primary key,
+    classifications bigint not null default 0,
+    scored bigint not null default 0,             -- rows with a confidence score
+    confidence_sum bigint not null default 0,
+    high_confidence bigint not null default 0,    -- >= 70
+    medium_confidence bigint not null default 0,  -- 50-69
+    low_confidence bigint not null default 0      -- < 50
+);
+
+-- Backend reads with the service role; no client access
+alter table public.classification_stats_rollup enable row level security;
+
+create or replace function public.classification_stats_rollup_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    -- Subtract replaced/deleted rows, then add inserted/updated rows (one grouped pass each)
+    if tg_op in ('UPDATE', 'DELETE') then
+        insert into classification_stats_rollup as r
+            (status, classifications, scored, confidence_sum, high_confidence, medium_confidence, low_confidence)
+        select status::text,
+               -count(*),
+               -count(confidence_score),
+               -coalesce(sum(confidence_score), 0),
+               -count(*) filter (where confidence_score >= 70),
+               -count(*) filter (where confidence_score >= 50 and confidence_score < 70),
+               -count(*) filter (where confidence_score < 50)
+        from old_rows
+        group by status
+        on conflict (status) do update set
+            classifications = r.classifications + excluded.classifications,
+            scored = r.scored + excluded.scored,
+            confidence_sum = r.confidence_sum + excluded.confidence_sum,
+            high_confidence = r.high_confidence + excluded.high_confidence,
+            medium_confidence = r.medium_confidence + excluded.medium_confidence,
+            low_confidence = r.low_confidence + excluded.low_confidence;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        insert into classification_stats_rollup as r
+            (status, classifications, scored, confidence_sum, high_confidence, medium_confidence, low_confidence)
+        select status::text,
+               count(*),
+               count(confidence_score),
+               coalesce(sum(confidence_score), 0),
+               count(*) filter (where confidence_score >= 70),
+               count(*) filter (where confidence_score >= 50 and confidence_score < 70),
+               count(*) filter (where confidence_score < 50)
+        from new_rows
+        group by status
+        on conflict (status) do update set
+            classifications = r.classifications + excluded.classifications,
+            scored = r.scored + excluded.scored,
+            confidence_sum = r.confidence_sum + excluded.confidence_sum,
+            high_confidence = r.high_confidence + excluded.high_confidence,
+            medium_confidence = r.medium_confidence + excluded.medium_confidence,
+            low_confidence = r.low_confidence + excluded.low_confidence;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists classification_stats_rollup_insert on public.classifications;
+drop trigger if exists classification_stats_rollup_update on public.classifications;
+drop trigger if exists classification_stats_rollup_delete on public.classifications;
+
+create trigger classification_stats_rollup_insert
+    after insert on public.classifications
+    referencing new table as new_rows
+    for each statement execute function public.classification_stats_rollup_trigger();
+
+create trigger classification_stats_rollup_update
+    after update on public.classifications
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.classification_stats_rollup_trigger();
+
+create trigger classification_stats_rollup_delete
+    after delete on public.classifications
+    referencing old table as old_rows
+    for each statement execute function public.classification_stats_rollup_trigger();
+
+-- Rebuild the rollup from classifications (run once here; again only if it is ever suspected to drift)
+create or replace function public.refresh_classification_stats_rollup()
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    lock table classifications in share row exclusive mode;
+    delete from classification_stats_rollup;
+    insert into classification_stats_rollup
+        (status, classifications, scored, confidence_sum, high_confidence, medium_confidence, low_confidence)
+    select status::text,
+           count(*),
+           count(confidence_score),
+           coalesce(sum(confidence_score), 0),
+           count(*) filter (where confidence_score >= 70),
+           count(*) filter (where confidence_score >= 50 and confidence_score < 70),
+           count(*) filter (where confidence_score < 50)
+    from classifications
+    group by status;
+end;
+$$;
+
+select public.refresh_classification_stats_rollup();
+
+-- Response body of GET /classifications/stats in one round trip
+create or replace function public.classification_stats()
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with totals as (
+        select
+            (select count(*) from listings where is_active) as total_listings,
+            coalesce(sum(classifications), 0) as total_classified,
+            coalesce(sum(scored), 0) as scored,
+            coalesce(sum(confidence_sum), 0) as confidence_sum,
+            coalesce(sum(high_confidence), 0) as high_confidence,
+            coalesce(sum(medium_confidence), 0) as medium_confidence,
+            coalesce(sum(low_confidence), 0) as low_confidence,
+            coalesce(sum(classifications) filter (where status = 'explicit'), 0) as explicit,
+            coalesce(sum(classifications) filter (where status = 'likely'), 0) as likely,
+            coalesce(sum(classifications) filter (where status = 'competitive'), 0) as competitive
+        from classification_stats_rollup
+    )
+    select json_build_object(
+        'total_listings', total_listings,
+        'total_classified', total_classified,
+        'unclassified', total_listings - total_classified,
+        'classification_rate', case when total_listings > 0
+            then round(total_classified * 100.0 / total_listings, 2) else 0 end,
+        'breakdown', json_build_object(
+            'explicit', explicit,
+            'likely', likely,
+            'competitive', competitive
+        ),
+        'average_confidence_score', case when scored > 0 then round(confidence_sum::numeric / scored, 2) else 0 end,
+        'confidence_distribution', json_build_object(
+            'high_confidence', high_confidence,
+            'medium_confidence', medium_confidence,
+            'low_confidence', low_confidence
+        )
+    )
+    from totals;
+$$;
+
+revoke execute on function public.classification_stats_rollup_trigger() from public, anon, authenticated;
+revoke execute on function public.refresh_classification_stats_rollup() from public, anon, authenticated;
+revoke execute on function public.classification_stats() from public, anon, authenticated;
@@ -0,0 +1,9 @@
+-- ============================================
+-- Listing URL lookups
+-- Duplicate checks resolve a batch of canonical listing URLs with one
+-- "listing_url in (...)" query; this index keeps that an index scan.
+-- Run canonicalize_listing_urls.py once so existing rows use canonical URLs.
+-- Apply in the Supabase SQL editor (or psql) after 006_classification_stats_rollup.sql.
+-- ============================================
+
+create index if not exists listings_listing_url_idx on public.listings (listing_url);
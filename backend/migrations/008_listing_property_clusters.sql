@@ -0,0 +1,18 @@
+-- ============================================
+-- Cross-portal property clusters
+-- Listings of the same property on different portals share a property_id
+-- (assigned by app/services/property_matcher.py). block_key (full postcode +
+-- street number) is the blocking index the matcher looks candidates up by.
+-- Run backfill_property_clusters.py once to cluster existing listings.
+-- Apply in the Supabase SQL editor (or psql) after 007_listing_url_index.sql.
+-- ============================================
+
+alter table public.listings
+    add column if not exists block_key text,
+    add column if not exists property_id uuid;
+
+create index if not exists listings_block_key_idx
+    on public.listings (block_key) where block_key is not null;
+
+create index if not exists listings_property_id_idx
+    on public.listings (property_id) where property_id is not null;
@@ -0,0 +1,68 @@
+-- ============================================
+-- Change-detecting listing upserts
+-- content_hash is a hash of a listing's material fields as last ingested
+-- (IngestionService.upsert_listings). Re-ingested listings with the same hash
+-- only get last_checked_at bumped (touch_listings, one statement per batch);
+-- changed ones get just their changed fields written (apply_listing_changes,
+-- one statement per batch).
+-- Apply in the Supabase SQL editor (or psql) after 008_listing_property_clusters.sql.
+-- ============================================
+
+alter table public.listings add column if not exists content_hash text;
+
+-- Mark listings as seen by a sync without rewriting them
+create or replace function public.touch_listings(p_ids uuid[])
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with touched as (
+        update listings set last_checked_at = now()
+        where id = any(p_ids)
+        returning 1
+    )
+    select count(*)::integer from touched;
+$$;
+
+-- Apply per-listing diffs: [{"id": ..., "content_hash": ..., <changed field>: <value>, ...}].
+-- Fields absent from an object keep their stored value. Address changes come with the
+-- re-matched block_key and property_id.
+create or replace function public.apply_listing_changes(p_changes jsonb)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with changes as (
+        select (c->>'id')::uuid as id, c
+        from jsonb_array_elements(p_changes) c
+    ),
+    updated as (
+        update listings l set
+            address = case when ch.c ? 'address' then ch.c->>'address' else l.address end,
+            postcode = case when ch.c ? 'postcode' then ch.c->>'postcode' else l.postcode end,
+            city = case when ch.c ? 'city' then ch.c->>'city' else l.city end,
+            region = case when ch.c ? 'region' then ch.c->>'region' else l.region end,
+            price_raw = case when ch.c ? 'price_raw' then ch.c->>'price_raw' else l.price_raw end,
+            price_numeric = case when ch.c ? 'price_numeric' then (ch.c->>'price_numeric')::numeric else l.price_numeric end,
+            description = case when ch.c ? 'description' then ch.c->>'description' else l.description end,
+            agent_name = case when ch.c ? 'agent_name' then ch.c->>'agent_name' else l.agent_name end,
+            agent_url = case when ch.c ? 'agent_url' then ch.c->>'agent_url' else l.agent_url end,
+            image_url = case when ch.c ? 'image_url' then ch.c->>'image_url' else l.image_url end,
+            is_active = case when ch.c ? 'is_active' then (ch.c->>'is_active')::boolean else l.is_active end,
+            block_key = case when ch.c ? 'block_key' then ch.c->>'block_key' else l.block_key end,
+            property_id = case when ch.c ? 'property_id' then (ch.c->>'property_id')::uuid else l.property_id end,
+            content_hash = ch.c->>'content_hash',
+            updated_at = case when ch.c - 'id' - 'content_hash' - 'block_key' - 'property_id' = '{}'::jsonb
+                then l.updated_at else now() end,
+            last_checked_at = now()
+        from changes ch
+        where l.id = ch.id
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
+
+revoke execute on function public.touch_listings(uuid[]) from public, anon, authenticated;
+revoke execute on function public.apply_listing_changes(jsonb) from public, anon, authenticated;
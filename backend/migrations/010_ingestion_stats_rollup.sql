@@ -0,0 +1,219 @@
+-- ============================================
+-- Ingestion stats rollup
+-- Listing counts per (source, is_active, is_classified) maintained by
+-- statement-level triggers on listings, so GET /ingestion/stats reads a handful
+-- of rows in one round trip instead of downloading the source of every listing
+-- and running separate count queries.
+-- listings.is_classified mirrors "has a classification row" (kept up to date by
+-- triggers on classifications), so classified/unclassified counts refer to the
+-- same listings as the totals and survive cascading listing deletes.
+-- classification_stats() (006) now takes its active listing total from this
+-- rollup too, instead of count(*) over listings on every call.
+-- Apply in the Supabase SQL editor (or psql) after 009_listing_content_hash.sql.
+-- ============================================
+
+alter table public.listings add column if not exists is_classified boolean not null default false;
+
+create table if not exists public.listing_stats_rollup (
+    source text not null,
+    is_active boolean not null,
+    is_classified boolean not null,
+    listings bigint not null default 0,
+    primary key (source, is_active, is_classified)
+);
+
+-- Backend reads with the service role; no client access
+alter table public.listing_stats_rollup enable row level security;
+
+create or replace function public.listing_stats_rollup_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    -- Subtract replaced/deleted rows, then add inserted/updated rows (one grouped pass each)
+    if tg_op in ('UPDATE', 'DELETE') then
+        insert into listing_stats_rollup as r (source, is_active, is_classified, listings)
+        select coalesce(source, 'unknown'), coalesce(is_active, false), is_classified, -count(*)
+        from old_rows
+        group by 1, 2, 3
+        on conflict (source, is_active, is_classified) do update set
+            listings = r.listings + excluded.listings;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        insert into listing_stats_rollup as r (source, is_active, is_classified, listings)
+        select coalesce(source, 'unknown'), coalesce(is_active, false), is_classified, count(*)
+        from new_rows
+        group by 1, 2, 3
+        on conflict (source, is_active, is_classified) do update set
+            listings = r.listings + excluded.listings;
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists listing_stats_rollup_insert on public.listings;
+drop trigger if exists listing_stats_rollup_update on public.listings;
+drop trigger if exists listing_stats_rollup_delete on public.listings;
+
+create trigger listing_stats_rollup_insert
+    after insert on public.listings
+    referencing new table as new_rows
+    for each statement execute function public.listing_stats_rollup_trigger();
+
+create trigger listing_stats_rollup_update
+    after update on public.listings
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.listing_stats_rollup_trigger();
+
+create trigger listing_stats_rollup_delete
+    after delete on public.listings
+    referencing old table as old_rows
+    for each statement execute function public.listing_stats_rollup_trigger();
+
+-- Keep listings.is_classified in step with classifications (only rows whose flag actually changes
+-- are updated, so re-classifying a listing does not touch it)
+create or replace function public.listing_classified_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op = 'INSERT' then
+        update listings set is_classified = true
+        where id in (select listing_id from new_rows) and not is_classified;
+    else
+        update listings l set is_classified = false
+        where l.id in (select listing_id from old_rows)
+          and l.is_classified
+          and not exists (select 1 from classifications c where c.listing_id = l.id);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists listing_classified_insert on public.classifications;
+drop trigger if exists listing_classified_delete on public.classifications;
+
+create trigger listing_classified_insert
+    after insert on public.classifications
+    referencing new table as new_rows
+    for each statement execute function public.listing_classified_trigger();
+
+create trigger listing_classified_delete
+    after delete on public.classifications
+    referencing old table as old_rows
+    for each statement execute function public.listing_classified_trigger();
+
+-- Rebuild is_classified and the rollup (run once here; again only if it is ever suspected to drift)
+create or replace function public.refresh_listing_stats_rollup()
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    lock table listings, classifications in share row exclusive mode;
+    update listings l set is_classified = exists (select 1 from classifications c where c.listing_id = l.id)
+    where l.is_classified is distinct from exists (select 1 from classifications c where c.listing_id = l.id);
+    delete from listing_stats_rollup;
+    insert into listing_stats_rollup (source, is_active, is_classified, listings)
+    select coalesce(source, 'unknown'), coalesce(is_active, false), is_classified, count(*)
+    from listings
+    group by 1, 2, 3;
+end;
+$$;
+
+select public.refresh_listing_stats_rollup();
+
+-- Response body of GET /ingestion/stats in one round trip
+create or replace function public.ingestion_stats()
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with totals as (
+        select
+            coalesce(sum(listings), 0) as total_listings,
+            coalesce(sum(listings) filter (where is_active), 0) as active_listings,
+            coalesce(sum(listings) filter (where is_classified), 0) as total_classified,
+            coalesce(sum(listings) filter (where is_active and is_classified), 0) as active_classified
+        from listing_stats_rollup
+    ),
+    by_source as (
+        select source,
+               sum(listings) as listings,
+               sum(listings) filter (where is_active) as active
+        from listing_stats_rollup
+        group by source
+        having sum(listings) > 0
+    )
+    select json_build_object(
+        'total_listings', total_listings,
+        'active_listings', active_listings,
+        'inactive_listings', total_listings - active_listings,
+        'total_classified', total_classified,
+        'unclassified', total_listings - total_classified,
+        'active_unclassified', active_listings - active_classified,
+        'classification_rate', case when total_listings > 0
+            then round(total_classified * 100.0 / total_listings, 2) else 0 end,
+        'listings_by_source', coalesce((select json_object_agg(source, listings order by source) from by_source), '{}'::json),
+        'active_listings_by_source', coalesce(
+            (select json_object_agg(source, coalesce(active, 0) order by source) from by_source), '{}'::json
+        )
+    )
+    from totals;
+$$;
+
+-- Response body of GET /classifications/stats, with total_listings from the rollup above
+create or replace function public.classification_stats()
+returns json
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    with totals as (
+        select
+            (select coalesce(sum(listings), 0) from listing_stats_rollup where is_active) as total_listings,
+            coalesce(sum(classifications), 0) as total_classified,
+            coalesce(sum(scored), 0) as scored,
+            coalesce(sum(confidence_sum), 0) as confidence_sum,
+            coalesce(sum(high_confidence), 0) as high_confidence,
+            coalesce(sum(medium_confidence), 0) as medium_confidence,
+            coalesce(sum(low_confidence), 0) as low_confidence,
+            coalesce(sum(classifications) filter (where status = 'explicit'), 0) as explicit,
+            coalesce(sum(classifications) filter (where status = 'likely'), 0) as likely,
+            coalesce(sum(classifications) filter (where status = 'competitive'), 0) as competitive
+        from classification_stats_rollup
+    )
+    select json_build_object(
+        'total_listings', total_listings,
+        'total_classified', total_classified,
+        'unclassified', total_listings - total_classified,
+        'classification_rate', case when total_listings > 0
+            then round(total_classified * 100.0 / total_listings, 2) else 0 end,
+        'breakdown', json_build_object(
+            'explicit', explicit,
+            'likely', likely,
+            'competitive', competitive
+        ),
+        'average_confidence_score', case when scored > 0 then round(confidence_sum::numeric / scored, 2) else 0 end,
+        'confidence_distribution', json_build_object(
+            'high_confidence', high_confidence,
+            'medium_confidence', medium_confidence,
+            'low_confidence', low_confidence
+        )
+    )
+    from totals;
+$$;
+
+revoke execute on function public.listing_stats_rollup_trigger() from public, anon, authenticated;
+revoke execute on function public.listing_classified_trigger() from public, anon, authenticated;
+revoke execute on function public.refresh_listing_stats_rollup() from public, anon, authenticated;
+revoke execute on function public.ingestion_stats() from public, anon, authenticated;
+revoke execute on function public.classification_stats() from public, anon, authenticated;
@@ -0,0 +1,56 @@
+-- ============================================
+-- Listing freshness checks
+-- The freshness checker (app/services/freshness_service.py) claims the active
+-- listings least recently checked, revalidates them against their source and
+-- deactivates the ones that are gone. Claiming bumps last_checked_at in the same
+-- statement, so concurrent workers never check the same listings and a listing
+-- whose check was inconclusive goes to the back of the queue.
+-- Apply in the Supabase SQL editor (or psql) after 010_ingestion_stats_rollup.sql.
+-- ============================================
+
+create index if not exists listings_freshness_idx
+    on public.listings (last_checked_at nulls first)
+    where is_active;
+
+-- Claim up to p_limit active listings last checked before p_checked_before (oldest first)
+create or replace function public.claim_stale_listings(p_limit integer, p_checked_before timestamptz)
+returns table (id uuid, listing_url text, source text, agent_url text, last_checked_at timestamptz)
+language sql
+security definer
+set search_path = public
+as $$
+    with stale as (
+        select l.id, l.last_checked_at
+        from listings l
+        where l.is_active
+          and (l.last_checked_at is null or l.last_checked_at < p_checked_before)
+        order by l.last_checked_at nulls first
+        limit p_limit
+        for update skip locked
+    ),
+    claimed as (
+        update listings l set last_checked_at = now()
+        from stale s
+        where l.id = s.id
+        returning l.id, l.listing_url, l.source, l.agent_url, s.last_checked_at
+    )
+    select id, listing_url, source, agent_url, last_checked_at from claimed;
+$$;
+
+-- Mark listings that are no longer on the market as inactive (one statement per batch)
+create or replace function public.deactivate_listings(p_ids uuid[])
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    with deactivated as (
+        update listings set is_active = false, updated_at = now()
+        where id = any(p_ids) and is_active
+        returning 1
+    )
+    select count(*)::integer from deactivated;
+$$;
+
+revoke execute on function public.claim_stale_listings(integer, timestamptz) from public, anon, authenticated;
+revoke execute on function public.deactivate_listings(uuid[]) from public, anon, authenticated;
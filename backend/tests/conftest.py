@@ -0,0 +1,23 @@
+"""
+Test configuration: settings are read from the environment at import time, so
+placeholders are set before any app module is imported. Nothing here talks to
+Supabase or OpenAI; tests replace those calls.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+for name, value in {
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_ANON_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.test",
+    "SUPABASE_SERVICE_ROLE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZSJ9.test",
+    "SUPABASE_DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "OPENAI_API_KEY": "sk-test",
+    "JWT_SECRET": "test-secret",
+    "MAIL_FROM": "noreply@example.com",
+    "OPENAI_RATE_LIMIT_DB_PATH": os.path.join(tempfile.gettempdir(), "fps-test-rate-limit.db"),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,130 @@
+import asyncio
+import json
+from types import SimpleNamespace
+import httpx
+import pytest
+from openai import BadRequestError
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.classification_service import ClassificationUsage, classification_service
+from app.services.rate_limiter import llm_rate_limiter
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0)
+    breaker.record_failure(RuntimeError("boom"))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    return breaker
+
+
+@pytest.fixture
+def service(monkeypatch):
+    async def no_wait(*args, **kwargs):
+        return 0.0
+
+    monkeypatch.setattr(llm_rate_limiter, "acquire", no_wait)
+    monkeypatch.setattr(llm_rate_limiter, "record_usage", no_wait)
+    monkeypatch.setattr(classification_service, "max_retries", 1)
+    monkeypatch.setattr(classification_service, "circuit_breaker", _half_open_breaker())
+    monkeypatch.setattr(classification_service, "_record_run", lambda *args, **kwargs: None)
+    return classification_service
+
+
+def test_only_one_probe_while_half_open():
+    breaker = _half_open_breaker()
+    assert breaker.before_call() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.before_call() is False
+
+
+def test_released_probe_lets_next_call_probe():
+    breaker = _half_open_breaker()
+    assert breaker.before_call() is True
+    breaker.release_probe()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.before_call() is True
+
+
+def test_4xx_during_half_open_probe_releases_probe(service, monkeypatch):
+    async def bad_request(*args):
+        request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+        raise BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+
+    monkeypatch.setattr(service, "_create_completion", bad_request)
+    with pytest.raises(BadRequestError):
+        asyncio.run(service._request_json("prompt", 10))
+
+    # A 4xx says nothing about the service's health: still half-open, next call may probe
+    assert service.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+    assert service.circuit_breaker.before_call() is True
+
+
+def test_cancelled_probe_releases_probe(service, monkeypatch):
+    async def hang(*args):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(service, "_create_completion", hang)
+
+    async def cancel_probe():
+        task = asyncio.create_task(service._request_json("prompt", 10))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert service.circuit_breaker.state == CircuitBreaker.HALF_OPEN
+    assert service.circuit_breaker.before_call() is True
+
+
+def _response(total_tokens: int) -> SimpleNamespace:
+    message = SimpleNamespace(content=json.dumps({"status": "explicit"}))
+    usage = SimpleNamespace(prompt_tokens=total_tokens - 10, completion_tokens=10, total_tokens=total_tokens)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def test_cancelled_hedge_loser_releases_its_reservation(service, monkeypatch):
+    reconciled = []
+    sent = []
+
+    async def record_usage(estimated_tokens, actual_tokens):
+        reconciled.append(actual_tokens)
+
+    async def create(**kwargs):
+        sent.append(len(sent))
+        if len(sent) == 1:
+            await asyncio.sleep(5)  # the primary stalls; the hedge answers
+        return _response(100)
+
+    monkeypatch.setattr(llm_rate_limiter, "record_usage", record_usage)
+    monkeypatch.setattr(service, "hedge_after", 0.01)
+    monkeypatch.setattr(service, "request_timeout", 2)
+    monkeypatch.setattr(service, "client", SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+    usage = ClassificationUsage()
+
+    assert asyncio.run(service._request_json("prompt", 10, usage)) == {"status": "explicit"}
+    # The loser's reservation is released, the winner's reconciled with its usage
+    assert len(sent) == 2
+    assert reconciled == [0, 100]
+    assert (usage.model_calls, usage.prompt_tokens) == (1, 90)
+
+
+def test_answered_hedge_loser_is_reconciled_and_counted(monkeypatch):
+    reconciled = []
+
+    async def record_usage(estimated_tokens, actual_tokens):
+        reconciled.append((estimated_tokens, actual_tokens))
+
+    monkeypatch.setattr(llm_rate_limiter, "record_usage", record_usage)
+
+    async def settle():
+        loser = asyncio.get_running_loop().create_future()
+        loser.set_result(_response(80))
+        hedge_usages = []
+        await classification_service._settle_hedge_losers({loser}, 120, hedge_usages)
+        return hedge_usages
+
+    hedge_usages = asyncio.run(settle())
+    assert reconciled == [(120, 80)]
+    assert [usage.total_tokens for usage in hedge_usages] == [80]
@@ -0,0 +1,103 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.classification_service import classification_service
+from app.services.classification_telemetry import ClassificationTelemetry, classification_telemetry
+from app.services.rate_limiter import llm_rate_limiter
+
+
+class _FakeTable:
+    """Stands in for classification_runs: rejects rows marked poison, or everything while down."""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+        self.down = False
+        self.calls = 0
+
+    def insert(self, rows: List[Dict[str, Any]]) -> None:
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("database unreachable")
+        if any(row.get("poison") for row in rows):
+            raise ValueError("invalid input syntax")
+        self.rows.extend(rows)
+
+
+def _telemetry(table: _FakeTable, **kwargs) -> ClassificationTelemetry:
+    telemetry = ClassificationTelemetry(flush_delay=0.01, **kwargs)
+    telemetry._insert = table.insert  # type: ignore[method-assign]
+    return telemetry
+
+
+def test_poison_row_is_dropped_and_the_rest_written():
+    table = _FakeTable()
+    telemetry = _telemetry(table)
+
+    async def run():
+        for i in range(5):
+            telemetry.record({"n": i, "poison": i == 0})
+        await telemetry.flush()
+
+    asyncio.run(run())
+    assert [row["n"] for row in table.rows] == [1, 2, 3, 4]
+    assert telemetry._buffer == []
+
+
+def test_outage_retries_on_a_timer_without_new_traffic():
+    table = _FakeTable()
+    table.down = True
+    telemetry = _telemetry(table)
+
+    async def run():
+        for i in range(10):
+            telemetry.record({"n": i})
+        await telemetry.flush()
+        # Batch insert plus a few single-row probes, not one call per row
+        assert table.calls <= 4
+        assert len(telemetry._buffer) == 10
+        table.down = False
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert sorted(row["n"] for row in table.rows) == list(range(10))
+
+
+def test_rows_are_dropped_after_max_attempts():
+    table = _FakeTable()
+    table.down = True
+    telemetry = _telemetry(table, max_attempts=2, max_retry_delay=0.01)
+
+    async def run():
+        telemetry.record({"n": 0})
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert telemetry._buffer == []
+    assert table.rows == []
+
+
+def test_answered_hedge_loser_is_recorded_as_its_own_call(monkeypatch):
+    recorded: List[Dict[str, Any]] = []
+
+    async def no_wait(*args, **kwargs):
+        return 0.0
+
+    def usage(total_tokens: int) -> SimpleNamespace:
+        return SimpleNamespace(prompt_tokens=total_tokens - 10, completion_tokens=10, total_tokens=total_tokens)
+
+    async def create_completion(prompt, estimated_tokens, hedge_usages):
+        hedge_usages.append(usage(80))
+        message = SimpleNamespace(content=json.dumps({"status": "explicit"}))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage(100))
+
+    monkeypatch.setattr(llm_rate_limiter, "acquire", no_wait)
+    monkeypatch.setattr(llm_rate_limiter, "record_usage", no_wait)
+    monkeypatch.setattr(classification_service, "circuit_breaker", CircuitBreaker("test", 100, 60))
+    monkeypatch.setattr(classification_service, "_create_completion", create_completion)
+    monkeypatch.setattr(classification_telemetry, "record", recorded.append)
+
+    asyncio.run(classification_service._request_json("prompt", 10, listing_id="l-1"))
+    assert sorted(row["prompt_tokens"] for row in recorded) == [70, 90]
+    assert all(row["listing_id"] == "l-1" and row["success"] for row in recorded)
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Dict, List
+import httpx
+from app.services import zoopla_service as zoopla_service_module
+from app.services.freshness_service import freshness_service
+from app.services.zoopla_auth import zoopla_auth_service
+from app.services.zoopla_service import zoopla_service
+
+
+INTERNAL_HOSTS = {"intranet.agent-homes.co.uk": ["10.0.0.5"]}
+requested: List[str] = []
+
+
+def _page_status(request: httpx.Request) -> httpx.Response:
+    requested.append(str(request.url))
+    if request.url.path.startswith("/redirect"):
+        return httpx.Response(302, headers={"location": request.url.params["to"]})
+    return httpx.Response(404 if request.url.path.startswith("/gone") else 200)
+
+
+def _run_batch(monkeypatch, listings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    deactivated: List[List[str]] = []
+    requested.clear()
+
+    async def resolve(host: str, port: int) -> List[str]:
+        return INTERNAL_HOSTS.get(host, ["151.101.1.1"])
+
+    monkeypatch.setattr(freshness_service, "_resolve", resolve)
+    monkeypatch.setattr(freshness_service, "_claim", lambda limit: listings)
+    monkeypatch.setattr(freshness_service, "_deactivate", lambda ids: deactivated.append(ids) or len(ids))
+
+    async def run() -> Dict[str, int]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_page_status)) as client:
+            return await freshness_service.check_batch(client, limit=len(listings))
+
+    return {"counts": asyncio.run(run()), "deactivated": deactivated}
+
+
+def test_malformed_url_is_inconclusive(monkeypatch):
+    result = _run_batch(monkeypatch, [
+        {"id": "1", "source": "rightmove", "listing_url": "https://www.rightmove.co.uk/gone/1"},
+        {"id": "2", "source": "rightmove", "listing_url": "https://www.rightmove.co.uk/live/2"},
+        {"id": "3", "source": "rightmove", "listing_url": "https://www.rightmove.co.\x00uk/3"},
+        {"id": "4", "source": "rightmove", "listing_url": "not a url"},
+    ])
+    assert result["counts"] == {"checked": 4, "active": 1, "deactivated": 1, "inconclusive": 2}
+    assert result["deactivated"] == [["1"]]
+
+
+def test_only_portal_and_agent_hosts_on_public_addresses_are_fetched(monkeypatch):
+    internal_redirect = "https://www.rightmove.co.uk/redirect?to=http://169.254.169.254/latest/meta-data"
+    result = _run_batch(monkeypatch, [
+        {"id": "1", "source": "other", "listing_url": "http://127.0.0.1:8000/admin", "agent_url": None},
+        {"id": "2", "source": "other", "listing_url": "http://169.254.169.254/gone", "agent_url": "http://169.254.169.254"},
+        {"id": "3", "source": "other", "listing_url": "https://evil.example/gone/3", "agent_url": "https://agent-homes.co.uk"},
+        {"id": "4", "source": "agent", "listing_url": "https://www.agent-homes.co.uk/gone/4", "agent_url": "https://agent-homes.co.uk"},
+        {"id": "5", "source": "agent", "listing_url": "https://intranet.agent-homes.co.uk/gone/5", "agent_url": "https://agent-homes.co.uk"},
+        {"id": "6", "source": "rightmove", "listing_url": internal_redirect},
+        {"id": "7", "source": "rightmove", "listing_url": "https://www.rightmove.co.uk/redirect?to=/gone/7"},
+    ])
+    assert result["deactivated"] == [["4", "7"]]
+    assert result["counts"]["inconclusive"] == 5
+    assert {httpx.URL(url).host for url in requested} == {"www.rightmove.co.uk", "www.agent-homes.co.uk"}
+
+
+def test_unexpected_error_does_not_abort_batch(monkeypatch):
+    async def broken(client, listing):
+        if listing["id"] == "2":
+            raise RuntimeError("boom")
+        return False
+
+    monkeypatch.setattr(freshness_service, "check_listing", broken)
+    result = _run_batch(monkeypatch, [
+        {"id": "1", "source": "rightmove", "listing_url": "https://www.rightmove.co.uk/gone/1"},
+        {"id": "2", "source": "rightmove", "listing_url": "https://www.rightmove.co.uk/gone/2"},
+    ])
+    assert result["counts"]["inconclusive"] == 1
+    assert result["deactivated"] == [["1"]]
+
+
+def test_non_json_zoopla_response_is_inconclusive(monkeypatch):
+    async def token(force_refresh: bool = False) -> str:
+        return "token"
+
+    real_client = httpx.AsyncClient
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text="<html>maintenance</html>"))
+    monkeypatch.setattr(zoopla_service, "enabled", True)
+    monkeypatch.setattr(zoopla_auth_service, "get_access_token", token)
+    monkeypatch.setattr(zoopla_service_module.httpx, "AsyncClient", lambda **kwargs: real_client(transport=transport))
+
+    exists = asyncio.run(zoopla_service.listing_exists("https://www.zoopla.co.uk/property/12345"))
+    assert exists is None
@@ -0,0 +1,75 @@
+import asyncio
+import io
+import threading
+from typing import Any, Dict, List
+from app.core.config import settings
+from app.services.classification_service import classification_service
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.ingestion_service import ingestion_service
+from app.services.reclassification_queue import reclassification_queue
+
+
+def _csv(rows: int) -> io.BytesIO:
+    lines = ["listing_url,title"] + [f"https://portal.example/{i},Flat {i}" for i in range(rows)]
+    return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+
+def test_bulk_job_queues_classification_and_parses_off_the_loop(monkeypatch):
+    parsed_in: List[str] = []
+    queued: List[str] = []
+    real_iter_rows = ingestion_service.iter_upload_rows
+
+    def iter_rows(fileobj, file_format):
+        for item in real_iter_rows(fileobj, file_format):
+            parsed_in.append(threading.current_thread().name)
+            yield item
+
+    def plan(listings: List[Dict[str, Any]], update_existing: bool, claimed_urls) -> Dict[str, Any]:
+        return {"listings": listings}
+
+    def apply(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"status": "created", "listing_id": listing["listing_url"]} for listing in plan["listings"]]
+
+    async def no_model(*args, **kwargs):
+        raise AssertionError("ingestion must not call the model inline")
+
+    monkeypatch.setattr(ingestion_service, "prepare_bulk_row", lambda row: (dict(row), None))
+    monkeypatch.setattr(ingestion_service, "plan_upsert", plan)
+    monkeypatch.setattr(ingestion_service, "apply_upsert", apply)
+    monkeypatch.setattr(classification_service, "classify_many", no_model)
+    monkeypatch.setattr(reclassification_queue, "enqueue", queued.append)
+
+    pipeline = IngestionPipeline(alerts=False)
+    report = asyncio.run(pipeline.run(iter_rows(_csv(450), "csv"), max_rows=400))
+
+    assert report["total_rows"] == 400
+    assert report["truncated"] is True
+    assert report["created"] == 400
+    assert report["classification_queued"] == 400
+    assert len(queued) == 400
+    assert parsed_in and threading.main_thread().name not in parsed_in
+
+
+def test_failed_stage_batch_is_reported_row_by_row(monkeypatch):
+    def plan(listings: List[Dict[str, Any]], update_existing: bool, claimed_urls) -> Dict[str, Any]:
+        if any(listing["listing_url"].endswith("/7") for listing in listings):
+            raise RuntimeError("connection reset")
+        return {"listings": listings}
+
+    def apply(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [{"status": "created", "listing_id": listing["listing_url"]} for listing in plan["listings"]]
+
+    monkeypatch.setattr(settings, "INGESTION_BULK_CHUNK_SIZE", 5)
+    monkeypatch.setattr(ingestion_service, "prepare_bulk_row", lambda row: (dict(row), None))
+    monkeypatch.setattr(ingestion_service, "plan_upsert", plan)
+    monkeypatch.setattr(ingestion_service, "apply_upsert", apply)
+    monkeypatch.setattr(reclassification_queue, "enqueue", lambda listing_id: None)
+
+    pipeline = IngestionPipeline(alerts=False)
+    report = asyncio.run(pipeline.run(ingestion_service.iter_upload_rows(_csv(20), "csv")))
+
+    assert report["total_rows"] == 20
+    assert [entry["row"] for entry in report["rows"]] == list(range(1, 21))
+    failed = [entry for entry in report["rows"] if entry["status"] == "failed"]
+    assert failed and all(entry["error"] == "Duplicate check failed: connection reset" for entry in failed)
+    assert report["created"] + report["failed"] == 20
@@ -0,0 +1,72 @@
+from typing import Any, Dict, List
+from app.services import ingestion_service as ingestion_service_module
+from app.services.ingestion_service import ingestion_service
+from app.services.property_matcher import property_matcher
+
+
+class _Response:
+    def __init__(self, data: Any):
+        self.data = data
+
+
+class _FakeSupabase:
+    """Stored listings for the re-ingest lookup; records the apply_listing_changes payload."""
+
+    def __init__(self, stored: List[Dict[str, Any]]):
+        self.stored = stored
+        self.changes: List[Dict[str, Any]] = []
+
+    def table(self, name: str) -> "_FakeSupabase":
+        return self
+
+    def select(self, columns: str) -> "_FakeSupabase":
+        return self
+
+    def in_(self, column: str, values: List[str]) -> "_FakeSupabase":
+        return self
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> "_FakeSupabase":
+        if name == "apply_listing_changes":
+            self.changes.extend(params["p_changes"])
+        return self
+
+    def execute(self) -> _Response:
+        return _Response(self.stored)
+
+
+def _reingest(monkeypatch, fake: _FakeSupabase, listing: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """upsert_listings for a listing already stored as l1 with a different content hash."""
+    monkeypatch.setattr(ingestion_service_module, "supabase", fake)
+    monkeypatch.setattr(
+        ingestion_service, "find_existing_urls",
+        lambda urls, columns=None: {url: {"id": "l1", "listing_url": url, "content_hash": "old-hash"} for url in urls}
+    )
+    return ingestion_service.upsert_listings([listing])
+
+
+def test_corrected_address_is_matched_to_a_property_again(monkeypatch):
+    stored = {"id": "l1", "address": "12 Marchmont Road, Edinburgh", "postcode": "EH9 1HX", "price_numeric": 250000}
+    other_portal = {"id": "l2", "property_id": "p-marchmont-14", "block_key": "EH91HX:14",
+                    "address": "14 Marchmont Rd, Edinburgh", "price_numeric": 250000}
+    fake = _FakeSupabase([stored])
+    monkeypatch.setattr(property_matcher, "_fetch_blocks", lambda keys: {"EH91HX:14": [other_portal]})
+
+    corrected = {"listing_url": "https://www.espc.com/property/1", "address": "14 Marchmont Road, Edinburgh",
+                 "postcode": "EH9 1HX", "price_numeric": 250000}
+    results = _reingest(monkeypatch, fake, corrected)
+
+    assert results[0]["changed_fields"] == ["address"]
+    assert fake.changes[0]["block_key"] == "EH91HX:14"
+    assert fake.changes[0]["property_id"] == "p-marchmont-14"
+
+
+def test_update_without_address_change_keeps_property(monkeypatch):
+    stored = {"id": "l1", "address": "12 Marchmont Road, Edinburgh", "postcode": "EH9 1HX", "price_raw": "£250,000"}
+    fake = _FakeSupabase([stored])
+
+    repriced = {"listing_url": "https://www.espc.com/property/1", "address": "12 Marchmont Road, Edinburgh",
+                "postcode": "EH9 1HX", "price_raw": "£245,000"}
+    _reingest(monkeypatch, fake, repriced)
+
+    assert "property_id" not in fake.changes[0]
+    assert "block_key" not in fake.changes[0]
@@ -0,0 +1,55 @@
+from typing import Any, Dict, List
+from app.services import property_matcher as property_matcher_module
+from app.services.property_matcher import property_matcher
+
+
+class _Query:
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = rows
+
+    def select(self, columns: str) -> "_Query":
+        return self
+
+    def eq(self, column: str, value: Any) -> "_Query":
+        return _Query([row for row in self.rows if str(row.get(column)) == str(value)])
+
+    def neq(self, column: str, value: Any) -> "_Query":
+        return _Query([row for row in self.rows if str(row.get(column)) != str(value)])
+
+    def execute(self) -> Any:
+        return type("Response", (), {"data": self.rows})()
+
+
+class _FakeSupabase:
+    def __init__(self, listings: List[Dict[str, Any]]):
+        self.listings = listings
+
+    def table(self, name: str) -> _Query:
+        assert name == "listings"
+        return _Query(self.listings)
+
+
+def _listing(listing_id: str, created_at: str, property_id: str = "p1") -> Dict[str, Any]:
+    return {"id": listing_id, "property_id": property_id, "created_at": created_at, "is_active": True}
+
+
+def test_earlier_listing_of_property_suppresses(monkeypatch):
+    earlier = _listing("a", "2026-10-01T09:00:00+00:00")
+    new = _listing("b", "2026-10-19T09:00:00.5+00:00")
+    monkeypatch.setattr(property_matcher_module, "supabase", _FakeSupabase([earlier, new]))
+    assert property_matcher.has_other_listings(new) is True
+    assert property_matcher.has_other_listings(earlier) is False
+
+
+def test_two_listings_arrive_together(monkeypatch):
+    # One bulk insert: both rows get the same created_at; exactly one of them alerts
+    first = _listing("a", "2026-10-19T09:00:00.123+00:00")
+    second = _listing("b", "2026-10-19T09:00:00.123+00:00")
+    monkeypatch.setattr(property_matcher_module, "supabase", _FakeSupabase([first, second]))
+    suppressed = [property_matcher.has_other_listings(listing) for listing in (first, second)]
+    assert suppressed.count(False) == 1
+
+
+def test_listing_without_property_is_never_suppressed(monkeypatch):
+    monkeypatch.setattr(property_matcher_module, "supabase", _FakeSupabase([]))
+    assert property_matcher.has_other_listings({"id": "a", "property_id": None}) is False
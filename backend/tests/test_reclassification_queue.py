@@ -0,0 +1,149 @@
+import asyncio
+import json
+from typing import Any, Dict, List
+import httpx
+from openai import BadRequestError
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.classification_service import classification_service
+from app.services.rate_limiter import llm_rate_limiter
+from app.services.reclassification_queue import ReclassificationQueue
+
+
+def _queue(monkeypatch, failures: Dict[str, int]) -> Dict[str, Any]:
+    """
+    Queue draining through the real classify(): the model call for a listing raises an
+    API error until it has failed failures[description] times, then answers "explicit".
+    """
+    queue = ReclassificationQueue(delay=0.01, batch_size=2, max_attempts=3)
+    calls: List[str] = []
+    saved: Dict[str, Any] = {}
+
+    async def no_wait(*args, **kwargs):
+        return 0.0
+
+    async def create_completion(prompt: str, *args) -> Any:
+        description = next(name for name in ("flat-a", "flat-b") if name in prompt)
+        calls.append(description)
+        if failures.get(description, 0) > 0:
+            failures[description] -= 1
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise BadRequestError("bad request", response=httpx.Response(400, request=request), body=None)
+        content = json.dumps({"status": "explicit", "confidence_score": 90, "reason": "Fixed price"})
+        message = type("Message", (), {"content": content})()
+        return type("Response", (), {"choices": [type("Choice", (), {"message": message})()], "usage": None})()
+
+    def save_outcomes(outcomes, listings=None):
+        saved.update({listing_id: outcome for listing_id, outcome in outcomes.items() if not outcome.error})
+
+    monkeypatch.setattr(llm_rate_limiter, "acquire", no_wait)
+    monkeypatch.setattr(llm_rate_limiter, "record_usage", no_wait)
+    monkeypatch.setattr(classification_service, "max_retries", 1)
+    monkeypatch.setattr(classification_service, "circuit_breaker", CircuitBreaker("test", 100, 60))
+    monkeypatch.setattr(classification_service, "_record_run", lambda *args, **kwargs: None)
+    monkeypatch.setattr(classification_service, "_local_first_pass", lambda description, price_text: None)
+    monkeypatch.setattr(classification_service, "_create_completion", create_completion)
+    monkeypatch.setattr(classification_service, "save_outcomes", save_outcomes)
+    monkeypatch.setattr(
+        queue, "_load_changed",
+        lambda ids: [{"id": listing_id, "description": f"flat-{listing_id}", "price_raw": "£200,000"} for listing_id in ids]
+    )
+    return {"queue": queue, "calls": calls, "saved": saved}
+
+
+def test_api_error_outcome_is_retried_not_saved(monkeypatch):
+    state = _queue(monkeypatch, {"flat-b": 1})
+    queue = state["queue"]
+
+    async def run():
+        queue.enqueue("a")
+        queue.enqueue("b")
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert sorted(state["saved"]) == ["a", "b"]
+    assert all(outcome.confidence_score == 90 for outcome in state["saved"].values())
+    assert sorted(state["calls"]) == ["flat-a", "flat-b", "flat-b"]
+    snapshot = queue.snapshot()
+    assert (snapshot["retried"], snapshot["failed"], snapshot["pending"]) == (1, 0, 0)
+
+
+def test_listings_are_dropped_after_max_attempts(monkeypatch):
+    state = _queue(monkeypatch, {"flat-a": 99})
+    queue = state["queue"]
+
+    async def run():
+        queue.enqueue("a")
+        await asyncio.sleep(0.3)
+
+    asyncio.run(run())
+    assert state["calls"] == ["flat-a"] * 3
+    assert state["saved"] == {}
+    assert queue.snapshot()["failed"] == 1
+    assert queue.snapshot()["pending"] == 0
+
+
+class _FakeClassifications:
+    """supabase stand-in holding the classification of one portal copy of property p-1."""
+
+    def __init__(self, stored: List[Dict[str, Any]]):
+        self.stored = stored
+        self.upserted: List[Dict[str, Any]] = []
+        self._rows: List[Dict[str, Any]] = []
+
+    def table(self, name):
+        self._rows = []
+        return self
+
+    def select(self, *args):
+        self._rows = list(self.stored)
+        return self
+
+    def in_(self, column, values):
+        if column == "input_hash":
+            self._rows = [row for row in self._rows if row["input_hash"] in values]
+        else:
+            self._rows = [row for row in self._rows if row["listings"]["property_id"] in values]
+        return self
+
+    def eq(self, column, value):
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.upserted.extend(rows)
+        self._rows = rows
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": self._rows})()
+
+
+def test_new_listing_copies_classification_of_same_property(monkeypatch):
+    from app.services import reclassification_queue as module
+    from app.services.classification_service import PROMPT_VERSION, classification_input_hash
+    state = _queue(monkeypatch, {})
+    fake = _FakeClassifications([{
+        "listing_id": "other-portal", "status": "explicit", "confidence_score": 88,
+        "classification_reason": "Fixed price", "ai_model_used": "gpt-4o-mini",
+        "input_hash": classification_input_hash("flat-c", "£200,000"), "listings": {"property_id": "p-1"},
+    }])
+    monkeypatch.setattr(module, "supabase", fake)
+    listing = {"id": "c", "property_id": "p-1", "description": "flat-c", "price_raw": "£200,000"}
+
+    outcome = asyncio.run(state["queue"].classify_new(listing))
+    assert (outcome.status, outcome.confidence_score, outcome.error) == ("explicit", 88, False)
+    assert state["calls"] == []
+    assert [(row["listing_id"], row["prompt_version"]) for row in fake.upserted] == [("c", PROMPT_VERSION)]
+
+
+def test_new_listing_whose_classification_failed_is_queued(monkeypatch):
+    state = _queue(monkeypatch, {"flat-a": 1})
+    queue = state["queue"]
+
+    async def run():
+        outcome = await queue.classify_new({"id": "a", "description": "flat-a", "price_raw": "£200,000"})
+        assert outcome.error and state["saved"] == {}
+        await asyncio.sleep(0.2)
+
+    asyncio.run(run())
+    assert list(state["saved"]) == ["a"]
+    assert state["calls"] == ["flat-a", "flat-a"]
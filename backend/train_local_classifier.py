@@ -0,0 +1,42 @@
+"""
+Train the local listing classifier from stored AI classifications.
+
+Usage (from backend/):
+    pip install -r requirements-train.txt
+    python train_local_classifier.py [--output data/local_classifier.json] [--min-confidence 70]
+
+Fits TF-IDF + logistic regression on price text + description, prints the held-out
+accuracy against the AI labels, and writes the model the API loads
+(LOCAL_CLASSIFIER_PATH). Reload a running API with POST /classifications/local-model/reload.
+scikit-learn is only needed here, so it lives in requirements-train.txt rather than
+requirements.txt.
+"""
+import argparse
+import json
+from app.core.config import settings
+from app.services.local_classifier import fetch_training_rows, train_local_classifier, save_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local listing classifier")
+    parser.add_argument("--output", default=settings.LOCAL_CLASSIFIER_PATH, help="Model file to write")
+    parser.add_argument("--min-confidence", type=int, default=70, help="Only train on AI labels at or above this confidence")
+    parser.add_argument("--test-size", type=float, default=0.2, help="Held-out fraction used for evaluation")
+    parser.add_argument(
+        "--threshold", type=float, default=settings.LOCAL_CLASSIFIER_MIN_PROBABILITY,
+        help="Probability threshold to report coverage/accuracy at"
+    )
+    args = parser.parse_args()
+
+    print(f"Loading AI classifications (confidence >= {args.min_confidence})...")
+    rows = fetch_training_rows(args.min_confidence)
+    print(f"Training on {len(rows)} labelled listings...")
+    model = train_local_classifier(rows, test_size=args.test_size, threshold=args.threshold)
+    print(json.dumps(model["report"], indent=2))
+
+    save_model(model, args.output)
+    print(f"Saved model version {model['version']} ({len(model['terms'])} terms) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
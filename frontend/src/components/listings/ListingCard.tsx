@@ -1,6 +1,6 @@
 'use client';
 
-import React from 'react';
+import React, { useState } from 'react';
 import Link from 'next/link';
 import { Card, CardContent, CardFooter } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
@@ -21,6 +21,7 @@ import {
   TooltipProvider,
   TooltipTrigger,
 } from "@/components/ui/tooltip";
+import { photoVariantUrl } from '@/lib/utils';
 
 interface ListingCardProps {
   listing: {
@@ -47,6 +48,10 @@ interface ListingCardProps {
 }
 
 export default function ListingCard({ listing }: ListingCardProps) {
+  // Photos uploaded before variants existed have none: fall back to the original
+  const [variantsFailed, setVariantsFailed] = useState(false);
+  const thumbUrl = listing.image_url && !variantsFailed ? photoVariantUrl(listing.image_url, 'thumb') : null;
+  const mediumUrl = listing.image_url && !variantsFailed ? photoVariantUrl(listing.image_url, 'medium') : null;
   const classification = listing.classifications?.[0];
   const status = classification?.status?.toLowerCase() || '';
   const probability = listing.success_probability?.probability?.toLowerCase() || '';
@@ -128,7 +133,10 @@ export default function ListingCard({ listing }: ListingCardProps) {
       <div className="relative w-full aspect-[16/10] bg-gradient-to-br from-slate-100 to-slate-200 dark:from-slate-800 dark:to-slate-900 overflow-hidden">
         {listing.image_url ? (
           <img
-            src={listing.image_url}
+            src={thumbUrl ?? listing.image_url}
+            srcSet={thumbUrl && mediumUrl ? `${thumbUrl} 320w, ${mediumUrl} 960w` : undefined}
+            onError={thumbUrl ? () => setVariantsFailed(true) : undefined}
+            loading="lazy"
             alt={listing.address}
             className="object-cover w-full h-full"
             sizes="(max-width: 768px) 100vw, 400px"
@@ -4,3 +4,14 @@ import { twMerge } from 'tailwind-merge';
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs));
 }
+
+/**
+ * URL of a resized WebP variant ("thumb" 320px, "medium" 960px) stored next to an
+ * uploaded listing photo, or null for images hosted elsewhere (portal/feed images).
+ */
+export function photoVariantUrl(url: string, variant: 'thumb' | 'medium'): string | null {
+  if (!url.includes('/listing-photos/')) return null;
+  const [base, query] = url.split('?', 2);
+  const stem = base.replace(/\.[^./]+$/, '');
+  return `${stem}_${variant}.webp${query ? `?${query}` : ''}`;
+}